@@ -0,0 +1,226 @@
+import itertools
+import re
+import threading
+from typing import Dict, List, Any, Optional
+import logging
+
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("cl100k_base")
+except ImportError:
+    _ENCODING = None
+
+logger = logging.getLogger("LLM_Client")
+
+# 每条消息在角色、分隔符上的固定开销
+MESSAGE_OVERHEAD_TOKENS = 4
+# 图片内容按固定的token数估算
+IMAGE_TOKENS = 85
+_CJK = re.compile(r"[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uff00-\uffef]")
+
+SUMMARY_PROMPT = """请把下面的对话内容压缩成一段简洁的摘要，保留用户的目标、已确认的事实、
+关键数据和尚未解决的问题，不要添加对话中没有的信息。摘要不超过{limit}字。
+
+{previous}对话内容：
+{transcript}"""
+
+
+def count_tokens(text: str) -> int:
+    """统计文本的token数；安装了tiktoken时精确计算，否则按中文每字1个、其他字符每4个1个估算
+
+    Args:
+        text: 文本
+
+    Returns:
+        token数
+    """
+    if not text:
+        return 0
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text))
+    cjk = len(_CJK.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def message_tokens(message: Dict[str, Any]) -> int:
+    """一条消息的token数，多模态content中的图片按固定值计"""
+    content = message.get("content")
+    if isinstance(content, list):
+        tokens = sum(count_tokens(part.get("text", "")) if part.get("type") == "text" else IMAGE_TOKENS
+                     for part in content)
+    else:
+        tokens = count_tokens(content or "")
+    function_call = message.get("function_call")
+    if function_call:
+        tokens += count_tokens(function_call.get("name", "")) + count_tokens(function_call.get("arguments", ""))
+    for tool_call in message.get("tool_calls") or []:
+        function = tool_call.get("function", {})
+        tokens += count_tokens(function.get("name", "")) + count_tokens(function.get("arguments", "")) + \
+            MESSAGE_OVERHEAD_TOKENS
+    return tokens + count_tokens(message.get("name", "")) + MESSAGE_OVERHEAD_TOKENS
+
+
+class ConversationMemory:
+    """带token预算的对话记忆
+
+    每条消息追加时计算一次token数并累加，总量超过预算后把最早的消息移出上下文，
+    降到预算的low_watermark比例以下；移出的消息交给后台任务合并进滚动摘要，
+    当前这一轮不等待摘要完成。系统提示词、最近keep_recent条消息和最近的函数调用结果始终保留，
+    因此长会话每一轮发送的上下文大小基本恒定。带tool_calls的assistant消息与其后的工具结果
+    作为一组整体保留或移出，不会留下缺少对应调用的工具结果。
+    """
+
+    def __init__(self, client, system_prompt: str = None, max_tokens: int = 4000,
+                 low_watermark: float = 0.6, keep_recent: int = 6, pinned_tool_results: int = 2,
+                 summarize: bool = True, summary_max_tokens: int = 400):
+        """初始化对话记忆
+
+        Args:
+            client: 共享的LLMClient，用于后台生成摘要
+            system_prompt: 系统提示词，始终放在上下文最前面
+            max_tokens: 对话历史(不含系统提示词)的token预算
+            low_watermark: 超出预算后移出旧消息，直到总量降到max_tokens的该比例以下
+            keep_recent: 始终保留的最近消息数
+            pinned_tool_results: 始终保留的最近函数调用结果数
+            summarize: 是否为移出的消息生成摘要，False时直接丢弃
+            summary_max_tokens: 摘要的最大token数
+        """
+        self.client = client
+        self.system_prompt = system_prompt
+        self.max_tokens = max_tokens
+        self.low_watermark = low_watermark
+        self.keep_recent = keep_recent
+        self.pinned_tool_results = pinned_tool_results
+        self.summarize = summarize
+        self.summary_max_tokens = summary_max_tokens
+
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+        # (消息编号, 消息, token数)
+        self._entries: List[tuple] = []
+        self._tokens = 0
+        self._summary: Optional[str] = None
+        self._summary_tokens = 0
+        self._pending: List[Dict[str, Any]] = []
+        self._summarizing = False
+
+    def append(self, message: Dict[str, Any]):
+        """追加一条消息，必要时移出旧消息并在后台生成摘要
+
+        Args:
+            message: OpenAI格式的消息
+        """
+        tokens = message_tokens(message)
+        with self._lock:
+            self._entries.append((next(self._ids), message, tokens))
+            self._tokens += tokens
+            if self._tokens + self._summary_tokens > self.max_tokens:
+                self._evict()
+            start = self.summarize and self._pending and not self._summarizing
+            if start:
+                self._summarizing = True
+        if start:
+            self.client.spawn(self._summarize())
+
+    def _pinned(self) -> set:
+        """不能移出的消息编号：最近keep_recent条和最近的函数调用结果"""
+        pinned = {entry_id for entry_id, _, _ in self._entries[-self.keep_recent:]} if self.keep_recent else set()
+        tool_results = [entry_id for entry_id, message, _ in self._entries if message.get("role") in ("function", "tool")]
+        if self.pinned_tool_results:
+            pinned.update(tool_results[-self.pinned_tool_results:])
+        return pinned
+
+    def _groups(self) -> List[List[tuple]]:
+        """把带tool_calls的assistant消息与其后的工具结果合成一组，其他消息各自一组"""
+        groups = []
+        for entry in self._entries:
+            if entry[1].get("role") == "tool" and groups and groups[-1][0][1].get("tool_calls"):
+                groups[-1].append(entry)
+            else:
+                groups.append([entry])
+        return groups
+
+    def _evict(self):
+        """从最早的消息开始按组移出，直到总量降到低水位(调用方持有锁)"""
+        target = self.max_tokens * self.low_watermark
+        pinned = self._pinned()
+        kept = []
+        for group in self._groups():
+            if self._tokens + self._summary_tokens > target and not any(entry[0] in pinned for entry in group):
+                for _, message, tokens in group:
+                    self._tokens -= tokens
+                    self._pending.append(message)
+            else:
+                kept.extend(group)
+        if len(kept) < len(self._entries):
+            logger.debug(f"对话记忆移出{len(self._entries) - len(kept)}条消息，剩余{self._tokens} tokens")
+        self._entries = kept
+        if not self.summarize:
+            self._pending.clear()
+
+    async def _summarize(self):
+        """把待摘要的消息与已有摘要合并成新摘要，期间新移出的消息留到下一轮"""
+        while True:
+            with self._lock:
+                batch, self._pending = self._pending, []
+                previous = self._summary
+                if not batch:
+                    self._summarizing = False
+                    return
+            transcript = "\n".join(f"{message.get('role')}: {_text(message)}" for message in batch)
+            prompt = SUMMARY_PROMPT.format(
+                limit=self.summary_max_tokens,
+                previous=f"已有摘要：\n{previous}\n\n" if previous else "",
+                transcript=transcript
+            )
+            try:
+                response = await self.client.achat([{"role": "user", "content": prompt}],
+                                                   temperature=0.3, max_tokens=self.summary_max_tokens)
+                summary = response.choices[0].message.content or previous
+            except Exception as e:
+                # 摘要失败时放回队列，下次移出消息时再试
+                logger.warning(f"生成对话摘要失败: {str(e)}")
+                with self._lock:
+                    self._pending[:0] = batch
+                    self._summarizing = False
+                return
+            with self._lock:
+                self._summary = summary
+                self._summary_tokens = count_tokens(summary) + MESSAGE_OVERHEAD_TOKENS
+
+    def messages(self) -> List[Dict[str, Any]]:
+        """本轮要发送的上下文：系统提示词、对话摘要、保留的消息
+
+        Returns:
+            消息列表(新列表，可以继续追加)
+        """
+        with self._lock:
+            messages = [{"role": "system", "content": self.system_prompt}] if self.system_prompt else []
+            if self._summary:
+                messages.append({"role": "system", "content": f"此前对话的摘要：{self._summary}"})
+            messages.extend(message for _, message, _ in self._entries)
+            return messages
+
+    @property
+    def total_tokens(self) -> int:
+        """当前上下文中对话历史与摘要的token数(不含系统提示词)"""
+        return self._tokens + self._summary_tokens
+
+    def clear(self):
+        """清空对话历史与摘要"""
+        with self._lock:
+            self._entries, self._pending = [], []
+            self._tokens = self._summary_tokens = 0
+            self._summary = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def _text(message: Dict[str, Any]) -> str:
+    """消息中的文本部分，图片替换为占位符"""
+    content = message.get("content")
+    if isinstance(content, list):
+        return " ".join(part.get("text", "") if part.get("type") == "text" else "[图片]" for part in content)
+    calls = [f"调用{call['function']['name']}({call['function']['arguments']})" for call in message.get("tool_calls") or []]
+    return " ".join(filter(None, [content] + calls))
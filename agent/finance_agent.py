@@ -1,4 +1,4 @@
-from openai import OpenAI
+from llm_client import get_client
 import json
 from datetime import datetime
 from typing import Dict, List, Optional
@@ -7,10 +7,7 @@ import matplotlib.pyplot as plt
 
 class FinanceAgent:
     def __init__(self):
-        self.client = OpenAI(
-            api_key="sk-XvWvy8rf8ewno0vVFmtgOMidGb5i3h1qNQmer7bE2buY6hlK",
-            base_url="https://tbnx.plus7.plus/v1"
-        )
+        self.client = get_client()
         self.transactions = []
         self.budgets = {}
         self.investment_portfolio = {}
@@ -59,6 +56,10 @@ class FinanceAgent:
         
     def get_financial_advice(self, income: float, savings_goal: float) -> str:
         """获取理财建议"""
+        return self.client.run(self.aget_financial_advice(income, savings_goal))
+
+    async def aget_financial_advice(self, income: float, savings_goal: float) -> str:
+        """获取理财建议(异步)"""
         context = {
             "monthly_income": income,
             "savings_goal": savings_goal,
@@ -79,10 +80,10 @@ class FinanceAgent:
 3. 投资组合建议
 4. 理财目标规划"""
 
-        response = self.client.chat.completions.create(
-            model="deepseek-chat",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.7
+        response = await self.client.achat(
+            [{"role": "user", "content": prompt}],
+            temperature=0.7,
+            use_cache=True
         )
         
         return response.choices[0].message.content
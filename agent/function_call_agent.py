@@ -1,16 +1,31 @@
-from openai import OpenAI
+from llm_client import get_client, StreamedMessage
+from conversation_memory import ConversationMemory
+from safe_calculator import SafeCalculator, CalculationError
+import asyncio
+import inspect
 import json
 from typing import List, Dict, Any
 
 class SimpleAgent:
-    def __init__(self, name="AI Assistant", system_prompt=None):
+    def __init__(self, name="AI Assistant", system_prompt=None, max_steps=5, tool_timeout=10.0, tool_timeouts=None):
+        """初始化智能体
+
+        Args:
+            name: 助手名称
+            system_prompt: 系统提示词
+            max_steps: 一次对话中最多进行的工具调用轮数，用完后要求模型直接回答
+            tool_timeout: 单个工具的默认执行超时(秒)
+            tool_timeouts: 按工具名单独设置的超时(秒)
+        """
         self.name = name
-        self.conversation_history = []
         self.system_prompt = system_prompt or f"你是一个名叫 {self.name} 的助手。"
-        self.client = OpenAI(
-            api_key="sk-XvWvy8rf8ewno0vVFmtgOMidGb5i3h1qNQmer7bE2buY6hlK",
-            base_url="https://tbnx.plus7.plus/v1"
-        )
+        self.max_steps = max_steps
+        self.tool_timeout = tool_timeout
+        self.tool_timeouts = tool_timeouts or {}
+        self.client = get_client()
+        self.calculator = SafeCalculator()
+        # 按token预算截断并摘要的对话历史，系统提示词始终保留
+        self.conversation_history = ConversationMemory(self.client, system_prompt=self.system_prompt)
         self.available_functions = {
             "get_current_weather": self.get_current_weather,
             "calculate": self.calculate,
@@ -21,12 +36,16 @@ class SimpleAgent:
         # 这里是模拟实现，实际应用中需要接入天气 API
         return f"模拟天气数据：{location} 的温度是 20 {unit}"
     
-    def calculate(self, expression: str) -> str:
-        """计算数学表达式"""
+    def calculate(self, expression: str, variables: Dict[str, Any] = None) -> str:
+        """计算数学表达式，变量取值为数组时逐元素批量计算"""
+        variables = variables or {}
         try:
-            result = eval(expression)
+            if any(isinstance(value, list) for value in variables.values()):
+                result = self.calculator.evaluate_batch(expression, **variables).tolist()
+            else:
+                result = self.calculator.evaluate(expression, **variables)
             return f"计算结果：{result}"
-        except Exception as e:
+        except CalculationError as e:
             return f"计算错误：{str(e)}"
 
     def get_functions_config(self) -> List[Dict[str, Any]]:
@@ -53,13 +72,23 @@ class SimpleAgent:
             },
             {
                 "name": "calculate",
-                "description": "计算数学表达式",
+                "description": "计算数学表达式，支持 + - * / // % **、sqrt、exp、log、sin、cos、abs、round、min、max 等函数和常量 pi、e",
                 "parameters": {
                     "type": "object",
                     "properties": {
                         "expression": {
                             "type": "string",
-                            "description": "数学表达式，如 1 + 2 * 3"
+                            "description": "数学表达式，如 1 + 2 * 3 或 price * (1 + rate) ** years"
+                        },
+                        "variables": {
+                            "type": "object",
+                            "description": "表达式中变量的取值，值为数字或数字数组；为数组时对每组取值批量计算",
+                            "additionalProperties": {
+                                "anyOf": [
+                                    {"type": "number"},
+                                    {"type": "array", "items": {"type": "number"}}
+                                ]
+                            }
                         }
                     },
                     "required": ["expression"]
@@ -67,62 +96,102 @@ class SimpleAgent:
             }
         ]
 
+    def get_tools_config(self) -> List[Dict[str, Any]]:
+        """获取tools协议的工具配置"""
+        return [{"type": "function", "function": function} for function in self.get_functions_config()]
+
+    async def execute_tool(self, tool_call: Dict[str, Any]) -> str:
+        """在线程池中执行一个工具调用，超时或出错时把错误信息作为结果返回给模型
+
+        Args:
+            tool_call: assistant消息中的一个tool_call
+
+        Returns:
+            工具结果文本
+        """
+        function_name = tool_call["function"]["name"]
+        if function_name not in self.available_functions:
+            return f"错误：函数 {function_name} 不可用"
+        timeout = self.tool_timeouts.get(function_name, self.tool_timeout)
+        try:
+            function_args = json.loads(tool_call["function"]["arguments"])
+            function = self.available_functions[function_name]
+            if inspect.iscoroutinefunction(function):
+                result = await asyncio.wait_for(function(**function_args), timeout)
+            else:
+                result = await asyncio.wait_for(asyncio.to_thread(function, **function_args), timeout)
+            return str(result)
+        except asyncio.TimeoutError:
+            return f"错误：函数 {function_name} 执行超时({timeout} 秒)"
+        except Exception as e:
+            return f"错误：函数 {function_name} 执行失败: {str(e)}"
+
     def think(self, user_input):
+        """同步对话入口，在共享客户端的事件循环中执行athink"""
+        return self.client.run(self.athink(user_input))
+
+    async def athink(self, user_input):
+        """异步对话入口，多个会话(各自的SimpleAgent实例)可在同一进程中并发执行"""
+        return "".join([delta async for delta in self.athink_stream(user_input)])
+
+    def think_stream(self, user_input):
+        """同步流式对话，逐段产出回复文本"""
+        return self.client.iterate(self.athink_stream(user_input))
+
+    async def athink_stream(self, user_input):
+        """异步流式对话，模型生成的文本增量立即产出
+
+        模型一轮返回的多个工具调用并发执行，结果一起交回模型，直到模型不再调用工具；
+        工具调用轮数达到max_steps后，最后一轮禁止调用工具，要求模型直接回答。
+        模型在最后一轮仍返回工具调用时不再执行，向用户说明哪些调用未执行。
+        """
         try:
             self.conversation_history.append({"role": "user", "content": user_input})
             
-            messages = [
-                {"role": "system", "content": self.system_prompt}
-            ] + self.conversation_history
-
-            response = self.client.chat.completions.create(
-                model="deepseek-chat",
-                messages=messages,
-                functions=self.get_functions_config(),
-                temperature=0.7
-            )
-
-            message = response.choices[0].message
-
-            # 处理函数调用
-            if hasattr(message, 'function_call') and message.function_call:
-                function_name = message.function_call.name
-                function_args = json.loads(message.function_call.arguments)
-                
-                if function_name in self.available_functions:
-                    function_response = self.available_functions[function_name](**function_args)
-                    
-                    # 将函数调用结果添加到对话历史
-                    self.conversation_history.append({
-                        "role": "function",
-                        "name": function_name,
-                        "content": function_response
-                    })
-                    
-                    # 让模型处理函数返回结果
-                    messages.append({
-                        "role": "function",
-                        "name": function_name,
-                        "content": function_response
-                    })
-                    
-                    final_response = self.client.chat.completions.create(
-                        model="deepseek-chat",
-                        messages=messages,
-                        temperature=0.7
-                    )
-                    
-                    ai_response = final_response.choices[0].message.content
-                else:
-                    ai_response = f"抱歉，函数 {function_name} 不可用"
-            else:
-                ai_response = message.content
+            messages = self.conversation_history.messages()
+
+            for step in range(self.max_steps + 1):
+                message = StreamedMessage()
+                async for chunk in self.client.astream(
+                    messages,
+                    tools=self.get_tools_config(),
+                    tool_choice="auto" if step < self.max_steps else "none",
+                    temperature=0.7
+                ):
+                    delta = message.add(chunk)
+                    if delta:
+                        yield delta
+
+                answer = message.content
+                tool_calls = message.tool_calls
+                if not tool_calls:
+                    break
+                if step == self.max_steps:
+                    names = "、".join(tool_call["function"]["name"] for tool_call in tool_calls)
+                    notice = f"[已达到工具调用轮数上限({self.max_steps}轮)，未执行的工具调用：{names}]"
+                    if answer:
+                        notice = "\n" + notice
+                    yield notice
+                    answer = (answer or "") + notice
+                    break
+
+                # 先记录模型的工具调用，再并发执行并按调用顺序记录结果
+                assistant_message = {"role": "assistant", "content": message.content or None, "tool_calls": tool_calls}
+                self.conversation_history.append(assistant_message)
+                messages.append(assistant_message)
+
+                results = await asyncio.gather(*(self.execute_tool(tool_call) for tool_call in tool_calls))
+                for tool_call, result in zip(tool_calls, results):
+                    tool_message = {"role": "tool", "tool_call_id": tool_call["id"], "content": result}
+                    self.conversation_history.append(tool_message)
+                    messages.append(tool_message)
 
-            self.conversation_history.append({"role": "assistant", "content": ai_response})
-            return ai_response
+            # 只记录非空的最终回答，工具调用轮的内容已随tool_calls记录
+            if answer:
+                self.conversation_history.append({"role": "assistant", "content": answer})
             
         except Exception as e:
-            return f"抱歉，发生了错误: {str(e)}"
+            yield f"抱歉，发生了错误: {str(e)}"
 
     def run(self):
         print(f"{self.name} 已启动，输入 '退出' 结束对话")
@@ -133,8 +202,11 @@ class SimpleAgent:
                 print(f"{self.name}: 再见！")
                 break
 
-            response = self.think(user_input)
-            print(f"{self.name}: {response}")
+            # 逐段打印，首个token到达即可看到输出
+            print(f"{self.name}: ", end="", flush=True)
+            for delta in self.think_stream(user_input):
+                print(delta, end="", flush=True)
+            print()
 
 
 if __name__ == "__main__":
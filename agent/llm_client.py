@@ -0,0 +1,468 @@
+import asyncio
+import atexit
+import concurrent.futures
+import os
+import queue
+import random
+import threading
+import time
+import uuid
+from typing import Dict, List, Any, AsyncIterator, Awaitable, Callable, Iterator, Optional, Tuple, TypeVar
+import logging
+
+import httpx
+from openai import AsyncOpenAI, APIConnectionError, InternalServerError, RateLimitError
+from openai.types.chat import ChatCompletion, ChatCompletionChunk, ChatCompletionMessage
+from openai.types.chat.chat_completion import Choice
+from openai.types.chat.chat_completion_chunk import Choice as ChunkChoice, ChoiceDelta
+
+from response_cache import ResponseCache
+
+logger = logging.getLogger("LLM_Client")
+
+T = TypeVar("T")
+
+# 默认接入点，可通过环境变量覆盖
+DEFAULT_BASE_URL = os.environ.get("LLM_BASE_URL", "https://tbnx.plus7.plus/v1")
+DEFAULT_API_KEY = os.environ.get("LLM_API_KEY")
+DEFAULT_MODEL = os.environ.get("LLM_MODEL", "deepseek-chat")
+# 响应缓存的SQLite文件，未设置时不启用缓存(缓存会把提示词和回复写入磁盘)
+DEFAULT_CACHE_PATH = os.environ.get("LLM_CACHE_PATH")
+
+# 可以重试的错误：连接失败/超时、限流、服务端5xx
+RETRYABLE_ERRORS = (APIConnectionError, RateLimitError, InternalServerError)
+# 流结束标记
+_DONE = object()
+
+
+class StreamedMessage:
+    """把流式响应的增量块拼接成完整消息
+
+    文本增量原样返回给调用方用于即时输出；函数调用的名称和参数JSON分块到达，
+    逐块累积，流结束后再整体解析。tools协议下一轮可以有多个工具调用，按index分别累积。
+    """
+
+    def __init__(self):
+        self._content: List[str] = []
+        self._function_name: List[str] = []
+        self._function_arguments: List[str] = []
+        # index -> (调用id, 函数名片段, 参数JSON片段)
+        self._tool_calls: Dict[int, Tuple[List[str], List[str], List[str]]] = {}
+        self.finish_reason: Optional[str] = None
+
+    def add(self, chunk: Any) -> str:
+        """累积一个ChatCompletionChunk
+
+        Args:
+            chunk: 流式响应块
+
+        Returns:
+            本块的文本增量，没有文本时为空串
+        """
+        if not chunk.choices:
+            return ""
+        choice = chunk.choices[0]
+        if choice.finish_reason:
+            self.finish_reason = choice.finish_reason
+        delta = choice.delta
+        function_call = getattr(delta, "function_call", None)
+        if function_call:
+            if function_call.name:
+                self._function_name.append(function_call.name)
+            if function_call.arguments:
+                self._function_arguments.append(function_call.arguments)
+        for tool_call in getattr(delta, "tool_calls", None) or []:
+            call_id, name, arguments = self._tool_calls.setdefault(tool_call.index, ([], [], []))
+            if tool_call.id:
+                call_id.append(tool_call.id)
+            if tool_call.function:
+                if tool_call.function.name:
+                    name.append(tool_call.function.name)
+                if tool_call.function.arguments:
+                    arguments.append(tool_call.function.arguments)
+        text = delta.content or ""
+        if text:
+            self._content.append(text)
+        return text
+
+    @property
+    def content(self) -> str:
+        """已收到的完整文本"""
+        return "".join(self._content)
+
+    @property
+    def function_call(self) -> Optional[Tuple[str, str]]:
+        """(函数名, 参数JSON)，模型没有调用函数时为None"""
+        if not self._function_name:
+            return None
+        return "".join(self._function_name), "".join(self._function_arguments) or "{}"
+
+    @property
+    def tool_calls(self) -> List[Dict[str, Any]]:
+        """按index排序的工具调用，格式与assistant消息中的tool_calls相同，没有工具调用时为空列表"""
+        return [
+            {
+                "id": "".join(call_id) or f"call_{index}",
+                "type": "function",
+                "function": {"name": "".join(name), "arguments": "".join(arguments) or "{}"}
+            }
+            for index, (call_id, name, arguments) in sorted(self._tool_calls.items())
+        ]
+
+
+class LLMClient:
+    """多个智能体共享的大模型客户端
+
+    底层是一个AsyncOpenAI客户端和带连接池的httpx传输，运行在专用的事件循环线程上：
+    同步调用(chat)和任意事件循环中的异步调用(achat)都提交到这个循环执行，
+    因此同一进程内的所有会话复用同一组长连接。
+    并发请求数由信号量限制，可重试的错误按带抖动的指数退避重试。
+    调用时传入use_cache=True且配置了响应缓存时，先查缓存，命中则不发起请求，
+    未命中时把完整结束(finish_reason为stop)的文本响应写入缓存。缓存按模型和temperature区分，
+    是否缓存由每次调用显式决定；相似度匹配(semantic_cache=True)同样只在调用方显式开启时使用，
+    本项目的智能体都不开启，因为它们的提示词由模板拼接用户数据。
+    缓存的读写在线程池中执行，不占用事件循环。
+    """
+
+    def __init__(self, api_key: str = None, base_url: str = None, model: str = None,
+                 max_concurrency: int = 16, max_connections: int = 64, max_keepalive: int = 16,
+                 timeout: float = 120.0, connect_timeout: float = 10.0,
+                 max_retries: int = 3, backoff_base: float = 0.5, backoff_max: float = 10.0,
+                 cache: ResponseCache = None):
+        """初始化客户端
+
+        Args:
+            api_key: API密钥，默认读取环境变量LLM_API_KEY，两者都未提供时抛出ValueError
+            base_url: 接入点，默认读取环境变量LLM_BASE_URL
+            model: 默认模型名
+            max_concurrency: 同时进行的请求数上限，超出的请求排队等待
+            max_connections: 连接池的最大连接数
+            max_keepalive: 连接池保留的空闲长连接数
+            timeout: 单次请求的读写超时(秒)
+            connect_timeout: 建立连接的超时(秒)
+            max_retries: 可重试错误的最大重试次数
+            backoff_base: 退避的基础间隔(秒)，第n次重试的上限为backoff_base * 2^n
+            backoff_max: 单次退避的最长间隔(秒)
+            cache: 响应缓存，None表示不缓存
+        """
+        api_key = api_key or DEFAULT_API_KEY
+        if not api_key:
+            raise ValueError("未配置大模型API密钥，请设置环境变量LLM_API_KEY或传入api_key")
+        self.model = model or DEFAULT_MODEL
+        self.cache = cache
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="llm-client-loop", daemon=True)
+        self._thread.start()
+
+        async def setup():
+            # 连接池、信号量都要在客户端所属的事件循环中创建
+            http_client = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive),
+                timeout=httpx.Timeout(timeout, connect=connect_timeout)
+            )
+            client = AsyncOpenAI(api_key=api_key, base_url=base_url or DEFAULT_BASE_URL,
+                                 http_client=http_client, max_retries=0)
+            return client, asyncio.Semaphore(max_concurrency)
+
+        self._client, self._semaphore = self.run(setup())
+
+    def run(self, coro: Awaitable[T]) -> T:
+        """在客户端的事件循环中执行协程并阻塞等待结果，供同步代码调用
+
+        Args:
+            coro: 协程
+
+        Returns:
+            协程的返回值
+        """
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("不能在客户端事件循环内同步等待，请改用await")
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    def spawn(self, coro: Awaitable[T]) -> "concurrent.futures.Future[T]":
+        """把协程放到客户端的事件循环中后台执行，不等待结果，任何线程中都可调用
+
+        Args:
+            coro: 协程
+
+        Returns:
+            可查询结果的Future
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    async def submit(self, coro: Awaitable[T]) -> T:
+        """在任意事件循环中await一个在客户端事件循环上执行的协程
+
+        Args:
+            coro: 协程
+
+        Returns:
+            协程的返回值
+        """
+        if asyncio.get_running_loop() is self._loop:
+            return await coro
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, self._loop))
+
+    async def _pump(self, source: AsyncIterator[Any], put: Callable[[Tuple[Any, Optional[BaseException]]], None]):
+        """在客户端事件循环中逐项读取异步迭代器，交给put转发给消费方"""
+        try:
+            async for item in source:
+                put((item, None))
+        except asyncio.CancelledError:
+            # 消费方已停止迭代
+            raise
+        except Exception as e:
+            put((None, e))
+            return
+        put((_DONE, None))
+
+    def iterate(self, source: AsyncIterator[T]) -> Iterator[T]:
+        """在客户端事件循环中消费异步迭代器，以同步生成器的形式逐项产出
+
+        消费方提前停止迭代时取消后台任务，底层的流式连接随之关闭。
+
+        Args:
+            source: 异步迭代器(如流式响应或智能体的异步生成器)
+
+        Returns:
+            同步生成器
+        """
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("不能在客户端事件循环内同步迭代，请改用async for")
+        items: queue.Queue = queue.Queue()
+        future = asyncio.run_coroutine_threadsafe(self._pump(source, items.put), self._loop)
+        try:
+            while True:
+                item, error = items.get()
+                if error is not None:
+                    raise error
+                if item is _DONE:
+                    return
+                yield item
+        finally:
+            future.cancel()
+
+    async def aiterate(self, source: AsyncIterator[T]) -> AsyncIterator[T]:
+        """在任意事件循环中async for一个在客户端事件循环上执行的异步迭代器
+
+        Args:
+            source: 异步迭代器
+
+        Returns:
+            异步迭代器
+        """
+        if asyncio.get_running_loop() is self._loop:
+            async for item in source:
+                yield item
+            return
+        loop = asyncio.get_running_loop()
+        items: asyncio.Queue = asyncio.Queue()
+        future = asyncio.run_coroutine_threadsafe(
+            self._pump(source, lambda entry: loop.call_soon_threadsafe(items.put_nowait, entry)), self._loop)
+        try:
+            while True:
+                item, error = await items.get()
+                if error is not None:
+                    raise error
+                if item is _DONE:
+                    return
+                yield item
+        finally:
+            future.cancel()
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        """第attempt次重试前的等待时间：优先遵循Retry-After，否则为full jitter指数退避"""
+        response = getattr(error, "response", None)
+        retry_after = response.headers.get("retry-after") if response is not None else None
+        if retry_after:
+            try:
+                return min(float(retry_after), self.backoff_max)
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _cacheable(self, use_cache: bool, kwargs: Dict[str, Any]) -> bool:
+        """只缓存纯文本对话：带函数/工具定义或要求多个候选的请求不走缓存"""
+        return bool(use_cache and self.cache is not None
+                    and not any(kwargs.get(name) for name in ("functions", "tools"))
+                    and kwargs.get("n", 1) == 1)
+
+    async def _cache_get(self, messages: List[Dict[str, Any]], semantic: bool, kwargs: Dict[str, Any]) -> Optional[str]:
+        """在线程池中查缓存，SQLite查询和向量扫描不阻塞其他会话"""
+        return await asyncio.to_thread(self.cache.get, messages, kwargs["model"], kwargs.get("temperature"), semantic)
+
+    async def _cache_put(self, messages: List[Dict[str, Any]], response: str, kwargs: Dict[str, Any]):
+        """在线程池中写缓存，写入失败只记录日志"""
+        try:
+            await asyncio.to_thread(self.cache.put, messages, kwargs["model"], kwargs.get("temperature"), response)
+        except Exception as e:
+            logger.warning(f"写入响应缓存失败: {str(e)}")
+
+    async def _create(self, messages: List[Dict[str, Any]], use_cache: bool = False, semantic_cache: bool = False,
+                      **kwargs) -> Any:
+        """限流并带重试地调用chat.completions.create，可先查响应缓存"""
+        kwargs.setdefault("model", self.model)
+        cacheable = self._cacheable(use_cache, kwargs)
+        if cacheable:
+            cached = await self._cache_get(messages, semantic_cache, kwargs)
+            if cached is not None:
+                return ChatCompletion(
+                    id=f"cache-{uuid.uuid4().hex}", object="chat.completion", created=int(time.time()),
+                    model=kwargs["model"],
+                    choices=[Choice(index=0, finish_reason="stop",
+                                    message=ChatCompletionMessage(role="assistant", content=cached))]
+                )
+        response = await self._request(messages, **kwargs)
+        if cacheable and response.choices:
+            choice = response.choices[0]
+            if choice.finish_reason == "stop" and choice.message.content:
+                await self._cache_put(messages, choice.message.content, kwargs)
+        return response
+
+    async def _request(self, messages: List[Dict[str, Any]], **kwargs) -> Any:
+        """限流并带重试的一次非流式请求"""
+        async with self._semaphore:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    return await self._client.chat.completions.create(messages=messages, **kwargs)
+                except RETRYABLE_ERRORS as e:
+                    if attempt == self.max_retries:
+                        raise
+                    delay = self._backoff(attempt, e)
+                    logger.warning(f"请求失败({type(e).__name__})，{delay:.2f} 秒后第{attempt + 1}次重试")
+                    await asyncio.sleep(delay)
+
+    async def _stream(self, messages: List[Dict[str, Any]], use_cache: bool = False, semantic_cache: bool = False,
+                      **kwargs) -> AsyncIterator[Any]:
+        """限流地以stream=True调用chat.completions.create，逐块产出响应
+
+        只有在收到第一个块之前失败才重试，已经输出的内容不会重复。
+        缓存命中时把缓存的文本作为一个块产出。
+        """
+        kwargs.setdefault("model", self.model)
+        cacheable = self._cacheable(use_cache, kwargs)
+        if cacheable:
+            cached = await self._cache_get(messages, semantic_cache, kwargs)
+            if cached is not None:
+                yield ChatCompletionChunk(
+                    id=f"cache-{uuid.uuid4().hex}", object="chat.completion.chunk", created=int(time.time()),
+                    model=kwargs["model"],
+                    choices=[ChunkChoice(index=0, finish_reason="stop",
+                                         delta=ChoiceDelta(role="assistant", content=cached))]
+                )
+                return
+        message = StreamedMessage()
+        async with self._semaphore:
+            for attempt in range(self.max_retries + 1):
+                started = False
+                try:
+                    stream = await self._client.chat.completions.create(messages=messages, stream=True, **kwargs)
+                    async with stream:
+                        async for chunk in stream:
+                            started = True
+                            if cacheable:
+                                message.add(chunk)
+                            yield chunk
+                    break
+                except RETRYABLE_ERRORS as e:
+                    if started or attempt == self.max_retries:
+                        raise
+                    delay = self._backoff(attempt, e)
+                    logger.warning(f"流式请求失败({type(e).__name__})，{delay:.2f} 秒后第{attempt + 1}次重试")
+                    await asyncio.sleep(delay)
+        if cacheable and message.finish_reason == "stop" and message.content:
+            await self._cache_put(messages, message.content, kwargs)
+
+    async def astream(self, messages: List[Dict[str, Any]], use_cache: bool = False, semantic_cache: bool = False,
+                      **kwargs) -> AsyncIterator[Any]:
+        """异步流式对话补全，逐个产出ChatCompletionChunk
+
+        Args:
+            messages: 消息列表
+            use_cache: 是否使用响应缓存(按模型和temperature区分)
+            semantic_cache: 精确匹配未命中时是否按最后一条用户消息的相似度查找缓存(默认关闭，需显式开启)
+            **kwargs: temperature、functions等其他参数
+
+        Returns:
+            ChatCompletionChunk的异步迭代器
+        """
+        async for chunk in self.aiterate(self._stream(messages, use_cache, semantic_cache, **kwargs)):
+            yield chunk
+
+    def stream(self, messages: List[Dict[str, Any]], use_cache: bool = False, semantic_cache: bool = False,
+               **kwargs) -> Iterator[Any]:
+        """同步流式对话补全
+
+        Args:
+            messages: 消息列表
+            use_cache: 是否使用响应缓存(按模型和temperature区分)
+            semantic_cache: 精确匹配未命中时是否按最后一条用户消息的相似度查找缓存(默认关闭，需显式开启)
+            **kwargs: temperature、functions等其他参数
+
+        Returns:
+            ChatCompletionChunk的生成器
+        """
+        return self.iterate(self._stream(messages, use_cache, semantic_cache, **kwargs))
+
+    async def achat(self, messages: List[Dict[str, Any]], use_cache: bool = False, semantic_cache: bool = False,
+                    **kwargs) -> Any:
+        """异步对话补全，参数与chat.completions.create相同(model可省略)
+
+        Args:
+            messages: 消息列表
+            use_cache: 是否使用响应缓存(按模型和temperature区分)
+            semantic_cache: 精确匹配未命中时是否按最后一条用户消息的相似度查找缓存(默认关闭，需显式开启)
+            **kwargs: temperature、functions等其他参数
+
+        Returns:
+            ChatCompletion响应
+        """
+        return await self.submit(self._create(messages, use_cache, semantic_cache, **kwargs))
+
+    def chat(self, messages: List[Dict[str, Any]], use_cache: bool = False, semantic_cache: bool = False,
+             **kwargs) -> Any:
+        """同步对话补全，可从多个线程同时调用
+
+        Args:
+            messages: 消息列表
+            use_cache: 是否使用响应缓存(按模型和temperature区分)
+            semantic_cache: 精确匹配未命中时是否按最后一条用户消息的相似度查找缓存(默认关闭，需显式开启)
+            **kwargs: temperature、functions等其他参数
+
+        Returns:
+            ChatCompletion响应
+        """
+        return self.run(self._create(messages, use_cache, semantic_cache, **kwargs))
+
+    def close(self):
+        """关闭连接池并停止事件循环"""
+        if not self._loop.is_running():
+            return
+        self.run(self._client.close())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        if self.cache is not None:
+            logger.info(f"响应缓存统计: {self.cache.stats()}")
+            self.cache.close()
+
+
+_shared_client: Optional[LLMClient] = None
+_shared_lock = threading.Lock()
+
+
+def get_client() -> LLMClient:
+    """返回进程内共享的LLMClient，首次调用时创建
+
+    Returns:
+        共享客户端
+    """
+    global _shared_client
+    with _shared_lock:
+        if _shared_client is None:
+            _shared_client = LLMClient(cache=ResponseCache(DEFAULT_CACHE_PATH) if DEFAULT_CACHE_PATH else None)
+            atexit.register(_shared_client.close)
+        return _shared_client
@@ -1,4 +1,5 @@
-from openai import OpenAI
+from llm_client import get_client, StreamedMessage
+from conversation_memory import ConversationMemory
 import base64
 import speech_recognition as sr
 from PIL import Image
@@ -6,21 +7,23 @@ import io
 
 class MultiModalAgent:
     def __init__(self):
-        self.client = OpenAI(
-            api_key="sk-XvWvy8rf8ewno0vVFmtgOMidGb5i3h1qNQmer7bE2buY6hlK",
-            base_url="https://tbnx.plus7.plus/v1"
-        )
-        self.conversation_history = []
+        self.client = get_client()
+        # 按token预算截断并摘要的对话历史，系统提示词始终保留
+        self.conversation_history = ConversationMemory(
+            self.client, system_prompt="你是一个多模态助手，可以处理文本、图像和语音输入。")
         
     def process_image(self, image_path: str) -> str:
         """处理图像输入"""
+        return self.client.run(self.aprocess_image(image_path))
+
+    async def aprocess_image(self, image_path: str) -> str:
+        """处理图像输入(异步)"""
         try:
             with open(image_path, "rb") as image_file:
                 image_data = base64.b64encode(image_file.read()).decode('utf-8')
             
-            response = self.client.chat.completions.create(
-                model="deepseek-chat",
-                messages=[
+            response = await self.client.achat(
+                [
                     {
                         "role": "user",
                         "content": [
@@ -50,22 +53,33 @@ class MultiModalAgent:
 
     def process_text(self, text: str) -> str:
         """处理文本输入"""
+        return self.client.run(self.aprocess_text(text))
+
+    async def aprocess_text(self, text: str) -> str:
+        """处理文本输入(异步)，多个会话(各自的实例)可在同一进程中并发执行"""
+        return "".join([delta async for delta in self.aprocess_text_stream(text)])
+
+    def process_text_stream(self, text: str):
+        """流式处理文本输入，逐段产出回复文本"""
+        return self.client.iterate(self.aprocess_text_stream(text))
+
+    async def aprocess_text_stream(self, text: str):
+        """流式处理文本输入(异步)，模型生成的文本增量立即产出"""
         try:
             self.conversation_history.append({"role": "user", "content": text})
             
-            response = self.client.chat.completions.create(
-                model="deepseek-chat",
-                messages=[
-                    {"role": "system", "content": "你是一个多模态助手，可以处理文本、图像和语音输入。"}
-                ] + self.conversation_history,
+            message = StreamedMessage()
+            async for chunk in self.client.astream(
+                self.conversation_history.messages(),
                 temperature=0.7
-            )
+            ):
+                delta = message.add(chunk)
+                if delta:
+                    yield delta
             
-            ai_response = response.choices[0].message.content
-            self.conversation_history.append({"role": "assistant", "content": ai_response})
-            return ai_response
+            self.conversation_history.append({"role": "assistant", "content": message.content})
         except Exception as e:
-            return f"文本处理错误：{str(e)}"
+            yield f"文本处理错误：{str(e)}"
 
     def run(self):
         print("多模态助手已启动")
@@ -83,16 +97,19 @@ class MultiModalAgent:
 
             if user_input.startswith("image:"):
                 image_path = user_input[6:].strip()
-                response = self.process_image(image_path)
+                deltas = [self.process_image(image_path)]
             elif user_input.startswith("audio:"):
                 audio_path = user_input[6:].strip()
-                response = self.process_audio(audio_path)
+                deltas = [self.process_audio(audio_path)]
             else:
-                response = self.process_text(user_input)
+                # 文本对话逐段打印，首个token到达即可看到输出
+                deltas = self.process_text_stream(user_input)
 
             print("\n助手回复：")
             print("----------------------------------------")
-            print(response)
+            for delta in deltas:
+                print(delta, end="", flush=True)
+            print()
             print("----------------------------------------")
 
 if __name__ == "__main__":
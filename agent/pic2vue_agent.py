@@ -1,26 +1,26 @@
 import base64
 
-from openai import OpenAI
+from llm_client import get_client
 
 
 class Pic2VueAgent:
     def __init__(self):
-        self.client = OpenAI(
-            api_key="sk-XvWvy8rf8ewno0vVFmtgOMidGb5i3h1qNQmer7bE2buY6hlK",
-            base_url="https://tbnx.plus7.plus/v1"
-        )
+        self.client = get_client()
 
     def image_to_vue(self, image_path: str, component_name: str = "GeneratedComponent") -> str:
         """将图片转换为 Vue 组件"""
+        return self.client.run(self.aimage_to_vue(image_path, component_name))
+
+    async def aimage_to_vue(self, image_path: str, component_name: str = "GeneratedComponent") -> str:
+        """将图片转换为 Vue 组件(异步)，多张图片可并发转换"""
         try:
             # 读取图片并转换为 base64
             with open(image_path, "rb") as image_file:
                 image_data = base64.b64encode(image_file.read()).decode('utf-8')
 
             # 调用 Vision API 分析图片
-            vision_response = self.client.chat.completions.create(
-                model="deepseek-chat",
-                messages=[
+            vision_response = await self.client.achat(
+                [
                     {
                         "role": "user",
                         "content": [
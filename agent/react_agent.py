@@ -1,10 +1,69 @@
-from openai import OpenAI
+from llm_client import get_client, StreamedMessage
+from conversation_memory import ConversationMemory
 import json
+import re
+
+
+class JsonFieldStream:
+    """从流式到达的JSON文本中增量提取一个字符串字段的值
+
+    字段的键出现后，其值中已完整到达的部分(转义序列与代理对不会被截断)立即解码返回，
+    遇到结束引号后不再产出。
+    """
+
+    def __init__(self, field):
+        self._key = re.compile(r'"%s"\s*:\s*"' % re.escape(field))
+        self._buffer = ""
+        self._start = None
+        self._done = False
+        self.started = False
+
+    def feed(self, delta):
+        """追加一段文本，返回字段值中新解码出的部分"""
+        self._buffer += delta
+        if self._done:
+            return ""
+        if self._start is None:
+            match = self._key.search(self._buffer)
+            if match is None:
+                return ""
+            self._start = match.end()
+            self.started = True
+
+        buffer, i = self._buffer, self._start
+        end = i
+        try:
+            while i < len(buffer):
+                if buffer[i] == '"':
+                    self._done = True
+                    break
+                if buffer[i] != "\\":
+                    i += 1
+                elif i + 1 >= len(buffer):
+                    break
+                elif buffer[i + 1] != "u":
+                    i += 2
+                elif i + 6 > len(buffer):
+                    break
+                elif 0xD800 <= int(buffer[i + 2:i + 6], 16) < 0xDC00:
+                    # 高代理项须与其后的低代理项一起解码
+                    if i + 12 > len(buffer):
+                        break
+                    i += 12
+                else:
+                    i += 6
+                end = i
+            text = json.loads('"' + buffer[self._start:end] + '"')
+        except ValueError:
+            self._done = True
+            return ""
+        self._start = end
+        return text
+
 
 class SimpleAgent:
     def __init__(self, name="AI Assistant", system_prompt=None):
         self.name = name
-        self.conversation_history = []
         self.system_prompt = system_prompt or f"""你是一个名叫 {self.name} 的助手。
 你需要按照以下步骤思考和回答：
 1. 思考 (Thought)：分析用户的问题和需求
@@ -19,44 +78,78 @@ class SimpleAgent:
     "observation": "行动后的观察",
     "response": "最终回答"
 }}"""
-        self.client = OpenAI(
-            api_key="sk-XvWvy8rf8ewno0vVFmtgOMidGb5i3h1qNQmer7bE2buY6hlK",
-            base_url="https://tbnx.plus7.plus/v1"
-        )
+        self.client = get_client()
+        # 按token预算截断并摘要的对话历史，系统提示词始终保留
+        self.conversation_history = ConversationMemory(self.client, system_prompt=self.system_prompt)
 
     def think(self, user_input):
+        """同步对话入口，在共享客户端的事件循环中执行athink"""
+        return self.client.run(self.athink(user_input))
+
+    async def athink(self, user_input):
+        """异步对话入口，多个会话(各自的SimpleAgent实例)可在同一进程中并发执行"""
         try:
             self.conversation_history.append({"role": "user", "content": user_input})
 
-            messages = [
-                {"role": "system", "content": self.system_prompt}
-            ] + self.conversation_history
+            messages = self.conversation_history.messages()
 
-            response = self.client.chat.completions.create(
-                model="deepseek-chat",
-                messages=messages,
+            response = await self.client.achat(
+                messages,
                 temperature=0.7
             )
 
-            ai_response = response.choices[0].message.content
-            
-            # 尝试解析 JSON 响应
-            try:
-                thought_process = json.loads(ai_response)
-                formatted_response = f"""思考过程：{thought_process['thought']}
-执行动作：{thought_process['action']}
-观察结果：{thought_process['observation']}
-最终回答：{thought_process['response']}"""
-                self.conversation_history.append({"role": "assistant", "content": formatted_response})
-                return formatted_response
-            except json.JSONDecodeError:
-                # 如果无法解析为 JSON，直接返回原始响应
-                self.conversation_history.append({"role": "assistant", "content": ai_response})
-                return ai_response
+            return self._record(response.choices[0].message.content)
 
         except Exception as e:
             return f"抱歉，发生了错误: {str(e)}"
 
+    def think_stream(self, user_input):
+        """同步流式对话，逐段产出最终回答"""
+        return self.client.iterate(self.athink_stream(user_input))
+
+    async def athink_stream(self, user_input):
+        """异步流式对话，只把JSON中response字段的文本增量立即产出，结束后按athink的方式解析并记入对话历史
+
+        模型没有按JSON格式输出(流中没有出现response字段)时，结束后整体产出解析结果。
+        """
+        try:
+            self.conversation_history.append({"role": "user", "content": user_input})
+
+            messages = self.conversation_history.messages()
+
+            message = StreamedMessage()
+            answer = JsonFieldStream("response")
+            async for chunk in self.client.astream(
+                messages,
+                temperature=0.7
+            ):
+                delta = message.add(chunk)
+                text = answer.feed(delta) if delta else ""
+                if text:
+                    yield text
+
+            formatted_response = self._record(message.content)
+            if not answer.started:
+                yield formatted_response
+
+        except Exception as e:
+            yield f"抱歉，发生了错误: {str(e)}"
+
+    def _record(self, ai_response):
+        """解析 JSON 格式的思考过程并记入对话历史，返回格式化后的回答"""
+        try:
+            thought_process = json.loads(ai_response)
+            formatted_response = f"""思考过程：{thought_process['thought']}
+执行动作：{thought_process['action']}
+观察结果：{thought_process['observation']}
+最终回答：{thought_process['response']}"""
+            self.conversation_history.append({"role": "assistant", "content": formatted_response})
+            return formatted_response
+        except json.JSONDecodeError:
+            # 如果无法解析为 JSON，直接返回原始响应
+            self.conversation_history.append({"role": "assistant", "content": ai_response})
+            return ai_response
+
     def run(self):
         print(f"{self.name} 已启动，输入 '退出' 结束对话")
 
@@ -66,8 +159,11 @@ class SimpleAgent:
                 print(f"{self.name}: 再见！")
                 break
 
-            response = self.think(user_input)
-            print(f"{self.name}: {response}")
+            # 逐段打印最终回答，首个token到达即可看到输出
+            print(f"{self.name}: ", end="", flush=True)
+            for delta in self.think_stream(user_input):
+                print(delta, end="", flush=True)
+            print()
 
 
 if __name__ == "__main__":
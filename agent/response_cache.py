@@ -0,0 +1,277 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Dict, List, Any, Callable, Optional
+import logging
+
+import numpy as np
+
+logger = logging.getLogger("LLM_Client")
+
+_WHITESPACE = re.compile(r"\s+")
+_PUNCTUATION = re.compile(r"[\W_]+")
+# 数字和英文标识符(表名、字段名等)，相似度命中要求两者完全一致
+_LITERAL = re.compile(r"\d+(?:\.\d+)?|[A-Za-z_][A-Za-z0-9_]*")
+
+
+def normalize_messages(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """规范化消息：只保留角色、名称和内容，文本去掉首尾空白并合并连续空白"""
+    normalized = []
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, str):
+            content = _WHITESPACE.sub(" ", content).strip()
+        entry = {"role": message.get("role"), "content": content}
+        if message.get("name"):
+            entry["name"] = message["name"]
+        normalized.append(entry)
+    return normalized
+
+
+def hashed_ngram_embedding(text: str, dim: int = 512) -> np.ndarray:
+    """字符2-gram与3-gram的哈希向量(L2归一化)，不依赖外部模型，忽略大小写、空白和标点，
+    用于识别措辞略有差异的重复提问
+
+    Args:
+        text: 文本
+        dim: 向量维度
+
+    Returns:
+        float32向量
+    """
+    text = _PUNCTUATION.sub("", text.lower())
+    grams = [text[i:i + n] for n in (2, 3) for i in range(len(text) - n + 1)]
+    vector = np.zeros(dim, dtype=np.float32)
+    if grams:
+        # crc32在不同进程间稳定，内置hash()带随机盐不能用于持久化
+        buckets = np.fromiter((zlib.crc32(gram.encode("utf-8")) % dim for gram in grams), dtype=np.int64, count=len(grams))
+        vector = np.bincount(buckets, minlength=dim).astype(np.float32)
+        vector /= np.linalg.norm(vector)
+    return vector
+
+
+class ResponseCache:
+    """两级大模型响应缓存，持久化在SQLite中
+
+    第一级按规范化消息、模型和温度的哈希精确匹配。第二级(调用时传入semantic=True才启用)
+    只比较最后一条用户消息：系统提示词、此前的对话、模型和温度必须完全一致，
+    用户消息的向量余弦相似度超过阈值，且其中的数字和英文标识符完全一致才视为命中，
+    避免金额、表名不同的提问被错误复用。提示词由模板拼接用户数据的调用不应启用第二级。
+    缓存项超过ttl过期，总数超过max_entries时按最近访问时间淘汰。
+    """
+
+    def __init__(self, path: str, ttl: float = 7 * 86400, max_entries: int = 10000,
+                 similarity_threshold: float = 0.98, embed: Callable[[str], np.ndarray] = None):
+        """初始化缓存
+
+        Args:
+            path: SQLite数据库文件路径
+            ttl: 缓存项的有效期(秒)
+            max_entries: 最多保留的缓存项数
+            similarity_threshold: 相似度命中阈值，None表示只用精确匹配
+            embed: 文本向量化函数，默认为字符n-gram哈希向量
+        """
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.similarity_threshold = similarity_threshold
+        self.embed = embed or hashed_ngram_embedding
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        # WAL下每次命中更新访问时间不必等待fsync，命中延迟从几十毫秒降到亚毫秒
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(responses)")}
+        if columns and "literals" not in columns:
+            # 旧格式的缓存按整段提示词计算向量，不能用于新的相似度匹配，直接丢弃
+            self._conn.execute("DROP TABLE responses")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                scope TEXT NOT NULL,
+                literals TEXT NOT NULL,
+                response TEXT NOT NULL,
+                embedding BLOB,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0
+            )""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses(accessed_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_created ON responses(created_at)")
+        self._conn.commit()
+
+        # 相似度索引：按需从数据库加载的向量矩阵
+        self._index: Optional[Dict[str, Any]] = None
+        self._stats = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "stores": 0}
+
+    @staticmethod
+    def _hash(payload: Any) -> str:
+        text = json.dumps(payload, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def _key(self, normalized: List[Dict[str, Any]], model: str, temperature: Any) -> str:
+        """精确匹配的键：全部消息、模型和温度"""
+        return self._hash({"model": model, "temperature": temperature, "messages": normalized})
+
+    def _scope(self, normalized: List[Dict[str, Any]], model: str, temperature: Any) -> Optional[str]:
+        """相似度匹配的范围：最后一条用户消息之前的全部消息、模型和温度，最后一条不是文本用户消息时为None"""
+        if not normalized or normalized[-1]["role"] != "user" or not isinstance(normalized[-1]["content"], str):
+            return None
+        return self._hash({"model": model, "temperature": temperature, "context": normalized[:-1]})
+
+    def _load_index(self, cutoff: float) -> Dict[str, Any]:
+        """把未过期缓存项的向量读入内存(调用方持有锁)"""
+        if self._index is None:
+            rows = self._conn.execute(
+                "SELECT key, scope, literals, embedding FROM responses WHERE embedding IS NOT NULL AND created_at >= ?",
+                (cutoff,)).fetchall()
+            vectors = [np.frombuffer(row[3], dtype=np.float32) for row in rows]
+            self._index = {
+                "keys": [row[0] for row in rows],
+                "scopes": np.array([row[1] for row in rows], dtype=object),
+                "literals": np.array([row[2] for row in rows], dtype=object),
+                "matrix": np.vstack(vectors) if vectors else None,
+            }
+        return self._index
+
+    def get(self, messages: List[Dict[str, Any]], model: str, temperature: Any = None,
+            semantic: bool = False) -> Optional[str]:
+        """查找缓存的响应文本
+
+        Args:
+            messages: 消息列表
+            model: 模型名
+            temperature: 温度
+            semantic: 精确匹配未命中时是否按最后一条用户消息的相似度查找
+
+        Returns:
+            响应文本，未命中时为None
+        """
+        normalized = normalize_messages(messages)
+        key = self._key(normalized, model, temperature)
+        scope = self._scope(normalized, model, temperature)
+        now = time.time()
+        cutoff = now - self.ttl
+        with self._lock:
+            row = self._conn.execute("SELECT response FROM responses WHERE key = ? AND created_at >= ?",
+                                     (key, cutoff)).fetchone()
+            tier = "exact_hits"
+            if row is None and semantic and scope is not None and self.similarity_threshold is not None:
+                key, row = self._similar(normalized[-1]["content"], scope, cutoff)
+                tier = "semantic_hits"
+            if row is None:
+                self._stats["misses"] += 1
+                return None
+            self._conn.execute("UPDATE responses SET accessed_at = ?, hits = hits + 1 WHERE key = ?", (now, key))
+            self._conn.commit()
+            self._stats[tier] += 1
+            return row[0]
+
+    def _similar(self, text: str, scope: str, cutoff: float):
+        """相似度查找：上下文相同、数字和英文标识符完全一致的缓存项中，
+        最后一条用户消息余弦相似度最高且超过阈值的一项(调用方持有锁)"""
+        index = self._load_index(cutoff)
+        if index["matrix"] is None:
+            return None, None
+        candidates = np.flatnonzero((index["scopes"] == scope) & (index["literals"] == _literals(text)))
+        if candidates.size == 0:
+            return None, None
+        scores = index["matrix"][candidates] @ self.embed(text)
+        best = int(np.argmax(scores))
+        if scores[best] < self.similarity_threshold:
+            return None, None
+        logger.debug(f"响应缓存相似度命中: {scores[best]:.4f}")
+        key = index["keys"][candidates[best]]
+        row = self._conn.execute("SELECT response FROM responses WHERE key = ? AND created_at >= ?",
+                                 (key, cutoff)).fetchone()
+        return key, row
+
+    def put(self, messages: List[Dict[str, Any]], model: str, temperature: Any, response: str):
+        """写入一条响应，并按TTL与容量淘汰旧缓存项
+
+        Args:
+            messages: 消息列表
+            model: 模型名
+            temperature: 温度
+            response: 响应文本
+        """
+        normalized = normalize_messages(messages)
+        key = self._key(normalized, model, temperature)
+        scope = self._scope(normalized, model, temperature)
+        text = normalized[-1]["content"] if scope is not None else ""
+        embedding = None
+        if scope is not None and self.similarity_threshold is not None:
+            embedding = self.embed(text).astype(np.float32)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, scope, literals, response, embedding, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, scope or "", _literals(text), response, embedding.tobytes() if embedding is not None else None,
+                 now, now))
+            cutoff = now - self.ttl
+            evicted = [row[0] for row in self._conn.execute(
+                "SELECT key FROM responses WHERE created_at < ?", (cutoff,))]
+            overflow = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0] - len(evicted) - self.max_entries
+            if overflow > 0:
+                evicted += [row[0] for row in self._conn.execute(
+                    "SELECT key FROM responses WHERE created_at >= ? ORDER BY accessed_at LIMIT ?", (cutoff, overflow))]
+            self._conn.executemany("DELETE FROM responses WHERE key = ?", [(evicted_key,) for evicted_key in evicted])
+            self._conn.commit()
+            self._stats["stores"] += 1
+            if self._index is not None:
+                self._update_index(key, scope, _literals(text), embedding, set(evicted))
+
+    def _update_index(self, key: str, scope: str, literals: str, embedding: Optional[np.ndarray], evicted: set):
+        """把新写入的一项加入内存索引并去掉被淘汰的项(调用方持有锁)"""
+        index = self._index
+        # 同一key覆盖写入时先去掉旧的一项
+        dropped = evicted | {key}
+        keep = np.array([existing not in dropped for existing in index["keys"]], dtype=bool)
+        if not keep.all():
+            index["keys"] = [existing for existing, kept in zip(index["keys"], keep) if kept]
+            index["scopes"], index["literals"] = index["scopes"][keep], index["literals"][keep]
+            index["matrix"] = index["matrix"][keep] if keep.any() else None
+        if embedding is not None and key not in evicted:
+            index["keys"].append(key)
+            index["scopes"] = np.append(index["scopes"], np.array([scope], dtype=object))
+            index["literals"] = np.append(index["literals"], np.array([literals], dtype=object))
+            index["matrix"] = embedding[None, :] if index["matrix"] is None else np.vstack([index["matrix"], embedding])
+
+    def stats(self) -> Dict[str, Any]:
+        """本进程内的命中统计
+
+        Returns:
+            各级命中数、未命中数、命中率与当前缓存项数
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        lookups = stats["exact_hits"] + stats["semantic_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["exact_hits"] + stats["semantic_hits"]) / lookups, 4) if lookups else 0.0
+        return stats
+
+    def clear(self):
+        """删除全部缓存项"""
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+            self._index = None
+
+    def close(self):
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
+
+
+def _literals(text: str) -> str:
+    """用户消息中依次出现的全部数字和英文标识符(不区分大小写)"""
+    return ",".join(literal.lower() for literal in _LITERAL.findall(text))
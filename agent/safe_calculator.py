@@ -0,0 +1,255 @@
+import ast
+import functools
+import math
+import threading
+import time
+from typing import Dict, Any, Callable, Tuple
+
+import numpy as np
+
+
+class CalculationError(ValueError):
+    """表达式不合法或超出计算限制"""
+
+
+# 允许的运算符
+_BINARY_OPERATORS = (ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow)
+_UNARY_OPERATORS = (ast.UAdd, ast.USub)
+# round的小数位数上限，更大的位数对float没有意义，对int会构造巨大的10的幂
+MAX_ROUND_DIGITS = 308
+
+
+def _checked_round(function: Callable) -> Callable:
+    """限制小数位数的round，避免round(1, -10**7)这类调用绕过CPU时间检查"""
+    def checked(value, ndigits=None):
+        if ndigits is None:
+            return function(value)
+        # 向量化计算中乘方的结果是float64，取值为整数时同样接受
+        if np.ndim(ndigits) != 0 or not float(ndigits).is_integer():
+            raise CalculationError("round的小数位数必须是整数")
+        if abs(ndigits) > MAX_ROUND_DIGITS:
+            raise CalculationError(f"round的小数位数超出范围(绝对值不超过 {MAX_ROUND_DIGITS})")
+        return function(value, int(ndigits))
+    return checked
+
+
+# 函数名 -> (标量实现, 向量化实现)
+FUNCTIONS: Dict[str, Tuple[Callable, Callable]] = {
+    "abs": (abs, np.abs),
+    "round": (_checked_round(round), _checked_round(np.round)),
+    "min": (min, lambda *args: functools.reduce(np.minimum, args)),
+    "max": (max, lambda *args: functools.reduce(np.maximum, args)),
+    "sqrt": (math.sqrt, np.sqrt),
+    "exp": (math.exp, np.exp),
+    "log": (math.log, np.log),
+    "log2": (math.log2, np.log2),
+    "log10": (math.log10, np.log10),
+    "sin": (math.sin, np.sin),
+    "cos": (math.cos, np.cos),
+    "tan": (math.tan, np.tan),
+    "asin": (math.asin, np.arcsin),
+    "acos": (math.acos, np.arccos),
+    "atan": (math.atan, np.arctan),
+    "floor": (math.floor, np.floor),
+    "ceil": (math.ceil, np.ceil),
+}
+CONSTANTS = {"pi": math.pi, "e": math.e}
+
+
+class _Validator(ast.NodeTransformer):
+    """只放行白名单内的语法节点，并把乘方改写为带检查的_pow调用"""
+
+    def generic_visit(self, node):
+        if not isinstance(node, (ast.Expression, ast.BinOp, ast.UnaryOp, ast.Call, ast.Name, ast.Constant,
+                                 ast.Load) + _BINARY_OPERATORS + _UNARY_OPERATORS):
+            raise CalculationError(f"不支持的语法：{type(node).__name__}")
+        return super().generic_visit(node)
+
+    def visit_Constant(self, node):
+        if type(node.value) not in (int, float):
+            raise CalculationError(f"不支持的常量：{node.value!r}")
+        return node
+
+    def visit_Name(self, node):
+        if node.id.startswith("_"):
+            raise CalculationError(f"不支持的名称：{node.id}")
+        return node
+
+    def visit_Call(self, node):
+        if not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS:
+            raise CalculationError(f"不支持的函数：{ast.unparse(node.func)}")
+        if node.keywords:
+            raise CalculationError("函数不支持关键字参数")
+        node.args = [self.visit(arg) for arg in node.args]
+        node.func = ast.copy_location(ast.Name(id=f"_{node.func.id}", ctx=ast.Load()), node.func)
+        return node
+
+    def visit_BinOp(self, node):
+        node = self.generic_visit(node)
+        if isinstance(node.op, ast.Pow):
+            return ast.copy_location(
+                ast.Call(func=ast.Name(id="_pow", ctx=ast.Load()), args=[node.left, node.right], keywords=[]), node)
+        return node
+
+
+@functools.lru_cache(maxsize=1024)
+def compile_expression(expression: str):
+    """校验并编译表达式，按表达式字符串缓存编译结果
+
+    Args:
+        expression: 算术表达式
+
+    Returns:
+        编译后的代码对象
+    """
+    try:
+        tree = ast.parse(expression.strip(), mode="eval")
+        tree = ast.fix_missing_locations(_Validator().visit(tree))
+        return compile(tree, "<expression>", "eval")
+    except SyntaxError as e:
+        raise CalculationError(f"表达式语法错误：{e.msg}")
+    except (RecursionError, MemoryError):
+        raise CalculationError("表达式嵌套过深")
+
+
+class SafeCalculator:
+    """安全的算术表达式计算器
+
+    表达式解析为语法树后只允许数字、变量、四则运算、取模、乘方和白名单内的数学函数，
+    不能访问属性、下标或内置函数，编译结果按表达式缓存。乘方在计算前估算结果位数，
+    每次乘方和函数调用都检查本线程已用的CPU时间，结果超过max_magnitude视为溢出。
+    传入数组变量时用NumPy逐元素向量化计算。
+    """
+
+    def __init__(self, max_length: int = 500, max_magnitude: float = 1e100, cpu_time_limit: float = 0.1,
+                 max_elements: int = 1_000_000):
+        """初始化计算器
+
+        Args:
+            max_length: 表达式的最大长度
+            max_magnitude: 结果(及乘方中间结果)绝对值的上限
+            cpu_time_limit: 单次计算的CPU时间上限(秒)
+            max_elements: 向量化计算的最大元素数
+        """
+        self.max_length = max_length
+        self.max_magnitude = max_magnitude
+        self.cpu_time_limit = cpu_time_limit
+        self.max_elements = max_elements
+        # 整数乘方结果的位数上限，与max_magnitude对应
+        self._max_bits = int(math.log2(max_magnitude)) + 1
+        self._deadline = threading.local()
+
+        self._scalar_namespace = {"__builtins__": {}, "_pow": self._pow, **CONSTANTS}
+        self._vector_namespace = {"__builtins__": {}, "_pow": self._vector_pow, **CONSTANTS}
+        for name, (scalar, vector) in FUNCTIONS.items():
+            self._scalar_namespace[f"_{name}"] = self._guard(scalar)
+            self._vector_namespace[f"_{name}"] = self._guard(vector)
+
+    def _check_time(self):
+        if time.thread_time() > self._deadline.value:
+            raise CalculationError(f"计算超时(CPU时间超过 {self.cpu_time_limit} 秒)")
+
+    def _guard(self, function: Callable) -> Callable:
+        def guarded(*args):
+            self._check_time()
+            return function(*args)
+        return guarded
+
+    def _pow(self, base, exponent):
+        """先估算结果大小再计算的乘方"""
+        self._check_time()
+        if isinstance(base, int) and isinstance(exponent, int):
+            if exponent > 0 and abs(base) > 1 and exponent * (abs(base).bit_length() - 1) > self._max_bits:
+                raise CalculationError("乘方结果过大")
+        elif isinstance(base, (int, float)) and isinstance(exponent, (int, float)):
+            if base != 0 and abs(base) != 1 and exponent * math.log2(abs(base)) > self._max_bits:
+                raise CalculationError("乘方结果过大")
+        return base ** exponent
+
+    def _vector_pow(self, base, exponent):
+        """按float64计算的乘方，避免整数常量按int64计算时溢出或负指数报错"""
+        self._check_time()
+        return np.power(np.asarray(base, dtype=np.float64), exponent)
+
+    def _compile(self, expression: str):
+        if len(expression) > self.max_length:
+            raise CalculationError(f"表达式过长(超过 {self.max_length} 个字符)")
+        return compile_expression(expression)
+
+    @staticmethod
+    def _check_variables(variables: Dict[str, Any]):
+        """变量名必须是不以下划线开头的标识符，避免覆盖内部的受检函数"""
+        for name in variables:
+            if not name.isidentifier() or name.startswith("_"):
+                raise CalculationError(f"不合法的变量名：{name}")
+
+    def _run(self, code, namespace: Dict[str, Any]):
+        self._deadline.value = time.thread_time() + self.cpu_time_limit
+        try:
+            return eval(code, namespace)
+        except CalculationError:
+            raise
+        except NameError as e:
+            raise CalculationError(f"未知的变量：{e.name}")
+        except ZeroDivisionError:
+            raise CalculationError("除数不能为零")
+        except OverflowError:
+            raise CalculationError("计算结果溢出")
+        except (RecursionError, MemoryError):
+            raise CalculationError("表达式嵌套过深或计算所需内存过多")
+        except (TypeError, ValueError) as e:
+            raise CalculationError(f"计算错误：{str(e)}")
+
+    def evaluate(self, expression: str, **variables: float):
+        """计算标量表达式
+
+        Args:
+            expression: 算术表达式，如 "(1 + 2) * sqrt(x)"
+            **variables: 表达式中的变量取值
+
+        Returns:
+            计算结果(int或float)
+        """
+        code = self._compile(expression)
+        self._check_variables(variables)
+        for name, value in variables.items():
+            if type(value) not in (int, float):
+                raise CalculationError(f"变量 {name} 不是数字")
+        result = self._run(code, {**self._scalar_namespace, **variables})
+        if not isinstance(result, (int, float)):
+            raise CalculationError("计算结果不是实数")
+        if isinstance(result, float) and math.isnan(result):
+            raise CalculationError("计算结果不是数字")
+        if abs(result) > self.max_magnitude:
+            raise CalculationError("计算结果溢出")
+        return result
+
+    def evaluate_batch(self, expression: str, **variables) -> np.ndarray:
+        """对数组变量逐元素向量化计算，数组按NumPy规则广播
+
+        Args:
+            expression: 算术表达式
+            **variables: 变量取值，数字或数字数组
+
+        Returns:
+            结果数组(float64)
+        """
+        code = self._compile(expression)
+        self._check_variables(variables)
+        try:
+            arrays = {name: np.asarray(value, dtype=np.float64) for name, value in variables.items()}
+        except (TypeError, ValueError):
+            raise CalculationError("变量取值必须是数字或数字数组")
+        try:
+            shape = np.broadcast_shapes(*(array.shape for array in arrays.values()))
+        except ValueError:
+            raise CalculationError("变量数组的长度不一致")
+        if math.prod(shape) > self.max_elements:
+            raise CalculationError(f"元素过多(超过 {self.max_elements} 个)")
+        with np.errstate(all="ignore"):
+            result = np.asarray(self._run(code, {**self._vector_namespace, **arrays}), dtype=np.float64)
+        if np.isnan(result).any():
+            raise CalculationError("部分计算结果不是数字")
+        if (np.abs(result) > self.max_magnitude).any():
+            raise CalculationError("计算结果溢出")
+        return result
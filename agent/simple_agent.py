@@ -1,36 +1,39 @@
-from openai import OpenAI
+from llm_client import get_client, StreamedMessage
+from conversation_memory import ConversationMemory
 import json
 from typing import List, Dict, Any
 import base64
+import inspect
 
 class SimpleAgent:
     def __init__(self, name="AI Assistant", system_prompt=None):
         self.name = name
-        self.conversation_history = []
         self.system_prompt = system_prompt or f"你是一个名叫 {self.name} 的助手。"
-        self.client = OpenAI(
-            api_key="sk-XvWvy8rf8ewno0vVFmtgOMidGb5i3h1qNQmer7bE2buY6hlK",
-            base_url="https://tbnx.plus7.plus/v1"
-        )
+        self.client = get_client()
+        # 按token预算截断并摘要的对话历史，系统提示词始终保留
+        self.conversation_history = ConversationMemory(self.client, system_prompt=self.system_prompt)
         self.available_functions = {
             "get_current_weather": self.get_current_weather,
             "calculate": self.calculate,
         }
         self.available_functions.update({
-            "image_to_vue": self.image_to_vue,
+            "image_to_vue": self.aimage_to_vue,
         })
     
     def image_to_vue(self, image_path: str, component_name: str = "GeneratedComponent") -> str:
         """将图片转换为 Vue 组件"""
+        return self.client.run(self.aimage_to_vue(image_path, component_name))
+
+    async def aimage_to_vue(self, image_path: str, component_name: str = "GeneratedComponent") -> str:
+        """将图片转换为 Vue 组件(异步)"""
         try:
             # 读取图片并转换为 base64
             with open(image_path, "rb") as image_file:
                 image_data = base64.b64encode(image_file.read()).decode('utf-8')
             
             # 调用 Vision API 分析图片
-            vision_response = self.client.chat.completions.create(
-                model="deepseek-chat",
-                messages=[
+            vision_response = await self.client.achat(
+                [
                     {
                         "role": "user",
                         "content": [
@@ -103,29 +106,46 @@ class SimpleAgent:
         ]
 
     def think(self, user_input):
+        """同步对话入口，在共享客户端的事件循环中执行athink"""
+        return self.client.run(self.athink(user_input))
+
+    async def athink(self, user_input):
+        """异步对话入口，多个会话(各自的SimpleAgent实例)可在同一进程中并发执行"""
+        return "".join([delta async for delta in self.athink_stream(user_input)])
+
+    def think_stream(self, user_input):
+        """同步流式对话，逐段产出回复文本"""
+        return self.client.iterate(self.athink_stream(user_input))
+
+    async def athink_stream(self, user_input):
+        """异步流式对话，模型生成的文本增量立即产出
+
+        函数调用的参数JSON分块到达，流结束后拼接完整再解析执行，然后流式输出模型对函数结果的回复。
+        """
         try:
             self.conversation_history.append({"role": "user", "content": user_input})
             
-            messages = [
-                {"role": "system", "content": self.system_prompt}
-            ] + self.conversation_history
+            messages = self.conversation_history.messages()
 
-            response = self.client.chat.completions.create(
-                model="deepseek-chat",
-                messages=messages,
+            message = StreamedMessage()
+            async for chunk in self.client.astream(
+                messages,
                 functions=self.get_functions_config(),
                 temperature=0.7
-            )
-
-            message = response.choices[0].message
+            ):
+                delta = message.add(chunk)
+                if delta:
+                    yield delta
 
             # 处理函数调用
-            if hasattr(message, 'function_call') and message.function_call:
-                function_name = message.function_call.name
-                function_args = json.loads(message.function_call.arguments)
+            if message.function_call:
+                function_name, arguments = message.function_call
+                function_args = json.loads(arguments)
                 
                 if function_name in self.available_functions:
                     function_response = self.available_functions[function_name](**function_args)
+                    if inspect.isawaitable(function_response):
+                        function_response = await function_response
                     
                     # 将函数调用结果添加到对话历史
                     self.conversation_history.append({
@@ -141,23 +161,26 @@ class SimpleAgent:
                         "content": function_response
                     })
                     
-                    final_response = self.client.chat.completions.create(
-                        model="deepseek-chat",
-                        messages=messages,
+                    final_message = StreamedMessage()
+                    async for chunk in self.client.astream(
+                        messages,
                         temperature=0.7
-                    )
+                    ):
+                        delta = final_message.add(chunk)
+                        if delta:
+                            yield delta
                     
-                    ai_response = final_response.choices[0].message.content
+                    ai_response = final_message.content
                 else:
                     ai_response = f"抱歉，函数 {function_name} 不可用"
+                    yield ai_response
             else:
                 ai_response = message.content
 
             self.conversation_history.append({"role": "assistant", "content": ai_response})
-            return ai_response
             
         except Exception as e:
-            return f"抱歉，发生了错误: {str(e)}"
+            yield f"抱歉，发生了错误: {str(e)}"
 
     def run(self):
         print(f"{self.name} 已启动，输入 '退出' 结束对话")
@@ -168,8 +191,11 @@ class SimpleAgent:
                 print(f"{self.name}: 再见！")
                 break
 
-            response = self.think(user_input)
-            print(f"{self.name}: {response}")
+            # 逐段打印，首个token到达即可看到输出
+            print(f"{self.name}: ", end="", flush=True)
+            for delta in self.think_stream(user_input):
+                print(delta, end="", flush=True)
+            print()
 
 
 if __name__ == "__main__":
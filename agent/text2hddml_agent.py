@@ -1,4 +1,4 @@
-from openai import OpenAI
+from llm_client import get_client
 import os
 import argparse
 import xml.etree.ElementTree as ET
@@ -7,13 +7,14 @@ import json
 class Text2HDDMLAgent:
     def __init__(self):
         """初始化 Text2HDDML 转换代理"""
-        self.client = OpenAI(
-            api_key="sk-XvWvy8rf8ewno0vVFmtgOMidGb5i3h1qNQmer7bE2buY6hlK",
-            base_url="https://tbnx.plus7.plus/v1"
-        )
+        self.client = get_client()
         
     def generate_hddml(self, description: str) -> str:
         """将自然语言描述转换为 HDDML"""
+        return self.client.run(self.agenerate_hddml(description))
+
+    async def agenerate_hddml(self, description: str) -> str:
+        """将自然语言描述转换为 HDDML(异步)，多个描述可并发转换"""
         prompt = f"""请将以下数据结构描述转换为 HDDML (Hierarchical Data Definition Markup Language) 格式：
 
 {description}
@@ -32,10 +33,10 @@ HDDML 是一种用于定义层次化数据结构的标记语言，类似于 XML
   </entity>
 </hddml>"""
 
-        response = self.client.chat.completions.create(
-            model="deepseek-chat",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.3
+        response = await self.client.achat(
+            [{"role": "user", "content": prompt}],
+            temperature=0.3,
+            use_cache=True
         )
         
         hddml_content = response.choices[0].message.content
@@ -1,40 +1,52 @@
-from openai import OpenAI
+from llm_client import get_client, StreamedMessage
+from conversation_memory import ConversationMemory
 
 
 class Text2SQLAgent:
     def __init__(self):
-        self.client = OpenAI(
-            api_key="sk-XvWvy8rf8ewno0vVFmtgOMidGb5i3h1qNQmer7bE2buY6hlK",
-            base_url="https://tbnx.plus7.plus/v1"
-        )
-        self.conversation_history = []
+        self.client = get_client()
         self.system_prompt = """你是一个专业的 SQL 转换助手。职责：
 1. 将自然语言精确转换为 SQL
 2. 解释查询逻辑
 3. 提供优化建议
 4. 对复杂查询提供注释
 5. 主动询问所需的表结构信息"""
+        # 按token预算截断并摘要的对话历史，系统提示词始终保留
+        self.conversation_history = ConversationMemory(self.client, system_prompt=self.system_prompt)
 
     def generate_sql(self, user_input: str) -> str:
+        """同步生成 SQL，在共享客户端的事件循环中执行agenerate_sql"""
+        return self.client.run(self.agenerate_sql(user_input))
+
+    async def agenerate_sql(self, user_input: str) -> str:
+        """异步生成 SQL，多个会话(各自的实例)可在同一进程中并发执行"""
+        return "".join([delta async for delta in self.agenerate_sql_stream(user_input)])
+
+    def generate_sql_stream(self, user_input: str):
+        """同步流式生成 SQL，逐段产出回复文本"""
+        return self.client.iterate(self.agenerate_sql_stream(user_input))
+
+    async def agenerate_sql_stream(self, user_input: str):
+        """异步流式生成 SQL，模型生成的文本增量立即产出"""
         try:
             self.conversation_history.append({"role": "user", "content": user_input})
 
-            messages = [
-                           {"role": "system", "content": self.system_prompt}
-                       ] + self.conversation_history
+            messages = self.conversation_history.messages()
 
-            response = self.client.chat.completions.create(
-                model="deepseek-chat",
-                messages=messages,
-                temperature=0.7
-            )
+            message = StreamedMessage()
+            async for chunk in self.client.astream(
+                messages,
+                temperature=0.7,
+                use_cache=True
+            ):
+                delta = message.add(chunk)
+                if delta:
+                    yield delta
 
-            sql_response = response.choices[0].message.content
-            self.conversation_history.append({"role": "assistant", "content": sql_response})
-            return sql_response
+            self.conversation_history.append({"role": "assistant", "content": message.content})
 
         except Exception as e:
-            return f"生成 SQL 时发生错误: {str(e)}"
+            yield f"生成 SQL 时发生错误: {str(e)}"
 
     def run(self):
         print("SQL 转换助手已启动，输入 '退出' 结束程序")
@@ -45,10 +57,11 @@ class Text2SQLAgent:
                 print("再见！")
                 break
 
-            response = self.generate_sql(user_input)
             print("\nSQL 转换结果：")
             print("----------------------------------------")
-            print(response)
+            for delta in self.generate_sql_stream(user_input):
+                print(delta, end="", flush=True)
+            print()
             print("----------------------------------------")
 
 
@@ -0,0 +1,437 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Any, Callable, Iterable, Optional, Tuple
+import logging
+
+import numpy as np
+import pandas as pd
+
+from compact_graph import CompactFinancialKnowledgeGraph
+from knowledge_graph import FinancialKnowledgeGraph
+from risk_rules import CircularTransactionRule, SharedAddressRule
+
+logger = logging.getLogger("KG_Risk_Control")
+
+# 命令行可用的图规模(总边数)
+SIZE_PRESETS = {'10k': 10_000, '1m': 1_000_000, '10m': 10_000_000}
+BACKENDS = ('compact', 'networkx')
+# 合成交易的起始时间与时间跨度(秒)
+BASE_TIMESTAMP = 1_700_000_000
+TIME_SPAN = 30 * 86400
+# 结果文件格式版本，字段含义变化时递增
+RESULT_FORMAT_VERSION = 1
+
+
+def generate_synthetic_graph(num_edges: int, seed: int = 0, accounts_per_edge: float = 0.2,
+                             power_law_exponent: float = 2.1, address_rate: float = 0.5,
+                             cycle_rate: float = 0.001, ring_rate: float = 0.0005) -> Dict[str, Any]:
+    """生成带有已知欺诈模式的合成金融图谱数据
+
+    背景转账的两端按幂律权重抽样，少数账户承担大部分交易(度数呈幂律分布)；
+    在其上植入时间递增、金额逐跳略减的环形转账，以及多个账户共用同一地址的团伙。
+    普通账户各自拥有独立地址，因此共享地址只来自植入的团伙。
+
+    Args:
+        num_edges: 总边数(转账边与地址边之和)
+        seed: 随机种子
+        accounts_per_edge: 账户数与边数之比
+        power_law_exponent: 度分布的幂律指数
+        address_rate: 拥有独立地址的普通账户比例
+        cycle_rate: 每条边对应的植入环路数
+        ring_rate: 每条边对应的植入地址团伙数
+
+    Returns:
+        {'accounts', 'addresses', 'sources', 'targets', 'relation_types', 'amounts', 'timestamps', 'truth'}，
+        端点为实体下标数组，truth记录植入的环路与团伙
+    """
+    rng = np.random.default_rng(seed)
+    num_accounts = max(100, int(num_edges * accounts_per_edge))
+    num_cycles = max(5, int(num_edges * cycle_rate))
+    num_rings = max(5, int(num_edges * ring_rate))
+
+    # 植入环路：成员互不相同，时间递增，金额逐跳减少0-3%
+    cycle_lengths = rng.integers(3, 7, num_cycles)
+    cycles = [rng.choice(num_accounts, length, replace=False) for length in cycle_lengths]
+    cycle_src = np.concatenate([members for members in cycles])
+    cycle_dst = np.concatenate([np.roll(members, -1) for members in cycles])
+    cycle_ts, cycle_amounts = [], []
+    for length in cycle_lengths:
+        start = BASE_TIMESTAMP + rng.integers(0, TIME_SPAN - 86400)
+        cycle_ts.append(start + np.cumsum(rng.integers(60, 3600, length)))
+        cycle_amounts.append(rng.lognormal(9, 1) * np.cumprod(1 - rng.uniform(0, 0.03, length)))
+
+    # 地址：普通账户各一个独立地址，团伙成员共用一个地址
+    owners = np.flatnonzero(rng.random(num_accounts) < address_rate)
+    ring_sizes = rng.integers(3, 9, num_rings)
+    rings = [rng.choice(num_accounts, size, replace=False) for size in ring_sizes]
+    address_src = np.concatenate([owners] + rings)
+    address_dst = np.concatenate([np.arange(len(owners))] +
+                                 [np.full(size, len(owners) + r) for r, size in enumerate(ring_sizes)])
+    num_addresses = len(owners) + num_rings
+
+    # 背景转账：端点按幂律权重抽样，去掉自环
+    background = max(0, num_edges - len(cycle_src) - len(address_src))
+    weights = rng.pareto(power_law_exponent - 1, num_accounts) + 1
+    weights /= weights.sum()
+    src = rng.choice(num_accounts, background, p=weights)
+    dst = rng.choice(num_accounts, background, p=weights)
+    dst = np.where(dst == src, (dst + 1) % num_accounts, dst)
+
+    transfers = background + len(cycle_src)
+    return {
+        'accounts': [f"acc_{i}" for i in range(num_accounts)],
+        'addresses': [f"addr_{j}" for j in range(num_addresses)],
+        'sources': np.concatenate([src, cycle_src, address_src]),
+        # 地址实体的下标排在全部账户之后
+        'targets': np.concatenate([dst, cycle_dst, address_dst + num_accounts]),
+        'relation_types': np.repeat(['transfer', 'has_address'], [transfers, len(address_src)]),
+        'amounts': np.concatenate([np.round(rng.lognormal(7, 1.5, background), 2),
+                                   np.round(np.concatenate(cycle_amounts), 2), np.zeros(len(address_src))]),
+        'timestamps': np.concatenate([BASE_TIMESTAMP + rng.integers(0, TIME_SPAN, background),
+                                      np.concatenate(cycle_ts), np.zeros(len(address_src), dtype=np.int64)]),
+        'truth': {
+            'cycles': [[f"acc_{i}" for i in members] for members in cycles],
+            'rings': [[f"acc_{i}" for i in members] for members in rings],
+        }
+    }
+
+
+def build_graph(data: Dict[str, Any], backend: str):
+    """用generate_synthetic_graph的结果构建指定后端的图谱
+
+    Args:
+        data: 合成图谱数据
+        backend: 'compact'或'networkx'
+
+    Returns:
+        CompactFinancialKnowledgeGraph或FinancialKnowledgeGraph
+    """
+    node_ids = data['accounts'] + data['addresses']
+    node_types = ['account'] * len(data['accounts']) + ['address'] * len(data['addresses'])
+    ids = np.asarray(node_ids, dtype=object)
+    sources, targets = ids[data['sources']], ids[data['targets']]
+    if backend == 'compact':
+        return CompactFinancialKnowledgeGraph.from_arrays(
+            node_ids, node_types, sources, targets, data['relation_types'],
+            edge_attributes={'amount': data['amounts'], 'timestamp': data['timestamps']}
+        )
+    if backend != 'networkx':
+        raise ValueError(f"不支持的存储后端: {backend}")
+
+    kg = FinancialKnowledgeGraph()
+    kg.entity_types = {'account', 'address'}
+    kg.relation_types = {'transfer', 'has_address'}
+    kg.graph.add_nodes_from((node, {'entity_type': kind}) for node, kind in zip(node_ids, node_types))
+    kg.graph.add_edges_from(
+        (u, v, {'relation_type': rel, 'amount': float(amount), 'timestamp': int(ts)} if rel == 'transfer'
+         else {'relation_type': rel})
+        for u, v, rel, amount, ts in zip(sources, targets, data['relation_types'].tolist(),
+                                          data['amounts'], data['timestamps'])
+    )
+    kg.invalidate()
+    return kg
+
+
+def _current_rss() -> int:
+    """当前进程的常驻内存(字节)；没有/proc时退化为历史峰值"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux以KB为单位，macOS以字节为单位
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class _PeakRss:
+    """在with块执行期间由后台线程定期采样RSS，记录峰值"""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.start = self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, _current_rss())
+
+    def __enter__(self) -> '_PeakRss':
+        self.start = self.peak = _current_rss()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, _current_rss())
+
+
+def _summarize(latencies: List[float]) -> Dict[str, Any]:
+    """延迟样本(秒)的百分位数与吞吐"""
+    samples = np.asarray(latencies, dtype=np.float64) * 1000
+    total = float(samples.sum()) / 1000
+    return {
+        'samples': len(samples),
+        'total_s': round(total, 4),
+        'throughput_per_s': round(len(samples) / total, 2) if total > 0 else None,
+        'latency_ms': {
+            'mean': round(float(samples.mean()), 4),
+            'p50': round(float(np.percentile(samples, 50)), 4),
+            'p90': round(float(np.percentile(samples, 90)), 4),
+            'p99': round(float(np.percentile(samples, 99)), 4),
+            'max': round(float(samples.max()), 4),
+        },
+    }
+
+
+def _measure(benchmark: str, calls: Iterable[Callable[[], Any]]) -> Tuple[Dict[str, Any], List[Any]]:
+    """逐个执行调用并计时，返回统计结果与各调用的返回值"""
+    latencies, outputs = [], []
+    with _PeakRss() as rss:
+        for call in calls:
+            start = time.perf_counter()
+            outputs.append(call())
+            latencies.append(time.perf_counter() - start)
+    result = {'benchmark': benchmark}
+    result.update(_summarize(latencies))
+    result['peak_rss_mb'] = round(rss.peak / 2 ** 20, 1)
+    result['rss_delta_mb'] = round((rss.peak - rss.start) / 2 ** 20, 1)
+    return result, outputs
+
+
+def _recall(outputs: List[Dict[str, Any]], accounts: List[str], expected: set) -> Optional[float]:
+    """植入模式中的账户被规则命中的比例"""
+    hits = [output.get('triggered', False) for output, account in zip(outputs, accounts) if account in expected]
+    return round(sum(hits) / len(hits), 4) if hits else None
+
+
+def benchmark_graph(kg, data: Dict[str, Any], backend: str, samples: int = 200, seed: int = 0,
+                    load_repeats: int = 3,
+                    cycle_rule: CircularTransactionRule = None,
+                    address_rule: SharedAddressRule = None) -> List[Dict[str, Any]]:
+    """在一张图谱上运行全部基准项
+
+    评估的账户至多一半取自植入模式(环路起点与团伙成员)，其余随机抽取；
+    find_path同样至多一半在环路相邻成员之间(必有路径)，其余为随机账户对。
+
+    Args:
+        kg: 已构建的图谱
+        data: 生成该图谱的合成数据
+        backend: 存储后端名称，写入结果
+        samples: 每个基准项的调用次数
+        seed: 抽样随机种子
+        load_repeats: save后重复load的次数
+        cycle_rule: 环形交易规则，None时使用带时间窗口和资金守恒约束的默认配置
+        address_rule: 共享地址规则
+
+    Returns:
+        结果记录列表
+    """
+    rng = np.random.default_rng(seed)
+    truth = data['truth']
+    accounts = data['accounts']
+    cycle_rule = cycle_rule or CircularTransactionRule(time_window=86400, amount_tolerance=0.1)
+    address_rule = address_rule or SharedAddressRule()
+
+    def pick(candidates: List[str], count: int) -> List[str]:
+        return [candidates[i] for i in rng.choice(len(candidates), min(count, len(candidates)), replace=False)]
+
+    cycle_anchors = [members[0] for members in truth['cycles']]
+    ring_members = sorted({account for members in truth['rings'] for account in members})
+    cycle_sample = pick(cycle_anchors, samples // 2)
+    cycle_sample += pick(accounts, samples - len(cycle_sample))
+    ring_sample = pick(ring_members, samples // 2)
+    ring_sample += pick(accounts, samples - len(ring_sample))
+    path_pairs = [(members[0], members[1]) for members in truth['cycles'][:samples // 2]]
+    path_pairs += [tuple(pick(accounts, 2)) for _ in range(samples - len(path_pairs))]
+
+    results = []
+
+    def record(result: Dict[str, Any], **extra):
+        result.update(extra)
+        results.append(result)
+        logger.info(f"[{backend}] {result['benchmark']}: p50 {result['latency_ms']['p50']} ms, "
+                    f"p99 {result['latency_ms']['p99']} ms, 峰值RSS {result['peak_rss_mb']} MB")
+
+    result, outputs = _measure('circular_transaction_rule', [
+        lambda account=account: cycle_rule.evaluate({'knowledge_graph': kg, 'account_id': account})
+        for account in cycle_sample
+    ])
+    record(result, recall=_recall(outputs, cycle_sample, set(cycle_anchors)))
+
+    result, outputs = _measure('shared_address_prepare', [lambda: address_rule.prepare(kg)])
+    record(result)
+    shared = outputs[0]
+    result, outputs = _measure('shared_address_rule', [
+        lambda account=account: address_rule.evaluate(dict(shared, knowledge_graph=kg, account_id=account))
+        for account in ring_sample
+    ])
+    record(result, recall=_recall(outputs, ring_sample, set(ring_members)))
+
+    result, outputs = _measure('find_path', [
+        lambda pair=pair: kg.find_path(pair[0], pair[1], max_depth=3, max_paths=10)
+        for pair in path_pairs
+    ])
+    record(result, paths_found=sum(1 for paths in outputs if paths))
+
+    directory = tempfile.mkdtemp(prefix='kg_benchmark_')
+    try:
+        if backend == 'compact':
+            path = os.path.join(directory, 'graph')
+            result, _ = _measure('save', [lambda: kg.save_binary(path)])
+            record(result)
+            result, _ = _measure('load', [lambda: CompactFinancialKnowledgeGraph.load_binary(path)] * load_repeats)
+        else:
+            path = os.path.join(directory, 'graph.json')
+            result, _ = _measure('save', [lambda: kg.save(path)])
+            record(result)
+            result, _ = _measure('load', [lambda: FinancialKnowledgeGraph.load(path)] * load_repeats)
+        record(result)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return results
+
+
+def run_benchmarks(sizes: Iterable[int], backends: Iterable[str] = BACKENDS, samples: int = 200,
+                   seed: int = 0, max_networkx_edges: int = 1_000_000) -> Dict[str, Any]:
+    """对每个规模和存储后端生成图谱并运行基准
+
+    Args:
+        sizes: 图规模(总边数)列表
+        backends: 存储后端列表
+        samples: 每个基准项的调用次数
+        seed: 随机种子，相同种子生成相同的图谱与抽样
+        max_networkx_edges: networkx后端只在不超过该边数的规模上运行
+
+    Returns:
+        {'meta': 运行环境, 'results': 结果记录列表}，可直接序列化为JSON
+    """
+    results = []
+    for num_edges in sizes:
+        data = generate_synthetic_graph(num_edges, seed=seed)
+        for backend in backends:
+            if backend == 'networkx' and num_edges > max_networkx_edges:
+                logger.warning(f"跳过networkx后端: {num_edges}条边超过max_networkx_edges={max_networkx_edges}")
+                continue
+            build, outputs = _measure('build', [lambda: build_graph(data, backend)])
+            kg = outputs[0]
+            case = [build] + benchmark_graph(kg, data, backend, samples=samples, seed=seed)
+            for result in case:
+                result.update(backend=backend, edges=num_edges,
+                              nodes=len(data['accounts']) + len(data['addresses']))
+            results.extend(case)
+            del kg, outputs
+    return {
+        'meta': {
+            'format_version': RESULT_FORMAT_VERSION,
+            'created_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'samples': samples,
+            'seed': seed,
+        },
+        'results': results,
+    }
+
+
+def compare_results(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float = 0.2,
+                    noise_floor_ms: float = 10.0) -> List[str]:
+    """与基线结果比较，找出性能回退
+
+    p99延迟或峰值RSS上升、吞吐下降超过tolerance视为回退；
+    两次的p99都低于noise_floor_ms时只是计时噪声，不比较延迟。
+
+    Args:
+        current: 本次run_benchmarks的结果
+        baseline: 基线结果(同一格式)
+        tolerance: 允许的相对变化
+        noise_floor_ms: 延迟比较的下限
+
+    Returns:
+        回退说明列表，为空表示没有回退
+    """
+    def key(result: Dict[str, Any]) -> Tuple:
+        return result['backend'], result['edges'], result['benchmark']
+
+    previous = {key(result): result for result in baseline.get('results', [])}
+    regressions = []
+    for result in current['results']:
+        old = previous.get(key(result))
+        if old is None:
+            continue
+        name = '/'.join(str(part) for part in key(result))
+        new_p99, old_p99 = result['latency_ms']['p99'], old['latency_ms']['p99']
+        if max(new_p99, old_p99) >= noise_floor_ms and new_p99 > old_p99 * (1 + tolerance):
+            regressions.append(f"{name}: p99 {old_p99} -> {new_p99} ms")
+        if old.get('throughput_per_s') and result.get('throughput_per_s') and \
+                max(result['latency_ms']['mean'], old['latency_ms']['mean']) >= noise_floor_ms and \
+                result['throughput_per_s'] < old['throughput_per_s'] * (1 - tolerance):
+            regressions.append(f"{name}: 吞吐 {old['throughput_per_s']} -> {result['throughput_per_s']} /s")
+        if result['peak_rss_mb'] > old['peak_rss_mb'] * (1 + tolerance):
+            regressions.append(f"{name}: 峰值RSS {old['peak_rss_mb']} -> {result['peak_rss_mb']} MB")
+    return regressions
+
+
+def _parse_size(text: str) -> int:
+    """解析'10k'、'1m'或纯数字形式的边数"""
+    text = text.lower()
+    if text in SIZE_PRESETS:
+        return SIZE_PRESETS[text]
+    units = {'k': 1_000, 'm': 1_000_000}
+    if text[-1:] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='风控规则与图谱存储后端的基准测试')
+    parser.add_argument('--sizes', nargs='+', default=['10k'], help='图规模(总边数)，如10k 1m 10m')
+    parser.add_argument('--backends', nargs='+', default=list(BACKENDS), choices=BACKENDS, help='存储后端')
+    parser.add_argument('--samples', type=int, default=200, help='每个基准项的调用次数')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子')
+    parser.add_argument('--max-networkx-edges', type=int, default=1_000_000,
+                        help='networkx后端运行的最大边数')
+    parser.add_argument('--output', type=str, help='结果JSON文件路径，不指定时输出到标准输出')
+    parser.add_argument('--baseline', type=str, help='基线结果JSON文件，有回退时以状态码1退出')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='与基线比较时允许的相对变化')
+    args = parser.parse_args()
+
+    report = run_benchmarks([_parse_size(size) for size in args.sizes], args.backends,
+                            samples=args.samples, seed=args.seed, max_networkx_edges=args.max_networkx_edges)
+
+    table = pd.json_normalize(report['results'])
+    columns = ['backend', 'edges', 'benchmark', 'samples', 'latency_ms.p50', 'latency_ms.p99',
+               'throughput_per_s', 'peak_rss_mb', 'recall']
+    print(table[[column for column in columns if column in table]].to_string(index=False), file=sys.stderr)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        logger.info(f"基准结果已保存到: {args.output}")
+    else:
+        json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = compare_results(report, json.load(f), args.tolerance)
+        for regression in regressions:
+            logger.warning(f"性能回退: {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
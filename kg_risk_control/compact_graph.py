@@ -0,0 +1,940 @@
+import heapq
+import json
+import os
+import numpy as np
+from array import array
+from collections import deque
+from typing import Dict, List, Any, Tuple, Set, Optional, Sequence, Iterable, Iterator
+import logging
+
+logger = logging.getLogger("KG_Risk_Control")
+
+# 未合并进CSR的增量边超过 max(DELTA_REBUILD_MIN, 已构建边数 * DELTA_REBUILD_RATIO) 时才整体重建索引
+DELTA_REBUILD_MIN = 4096
+DELTA_REBUILD_RATIO = 0.1
+
+# 查找路径时，最大深度不小于该值才先做反向BFS剪枝
+BIDIRECTIONAL_MIN_DEPTH = 4
+
+# k_shortest_paths的默认最大深度，Yen算法每次分叉搜索都限制在该跳数邻域内
+K_SHORTEST_MAX_DEPTH = 6
+
+# 二进制存储格式版本，目录中meta.json记录该版本号；版本1没有带缺失掩码的整数列，仍可直接读取
+BINARY_FORMAT_VERSION = 2
+READABLE_FORMAT_VERSIONS = (1, 2)
+
+
+def _is_int(value: Any) -> bool:
+    return isinstance(value, (int, np.integer)) and not isinstance(value, bool)
+
+
+def _to_column(values: Sequence[Any]) -> np.ndarray:
+    """把一列属性值转换为紧凑的NumPy列
+
+    全为整数时用int64，含浮点数的数值列(可含None)用float64(None记为NaN)，否则退化为object列。
+    含缺失值的整数列保留为object列：转成float64会改变超过2**53的整数(如纳秒时间戳)并把取值变为浮点数。
+    """
+    ints = sum(1 for v in values if _is_int(v))
+    missing = sum(1 for v in values if v is None)
+    if ints == len(values):
+        try:
+            return np.asarray(values, dtype=np.int64)
+        except OverflowError:
+            pass
+    elif (ints == 0 or ints + missing < len(values)) and all(
+            v is None or (isinstance(v, (int, float, np.number)) and not isinstance(v, bool)) for v in values):
+        return np.asarray([np.nan if v is None else v for v in values], dtype=np.float64)
+    column = np.empty(len(values), dtype=object)
+    column[:] = list(values)
+    return column
+
+
+def _column_value(column: np.ndarray, index: int) -> Any:
+    """从列中取出单个值并还原为Python对象，缺失值返回None"""
+    value = column[index]
+    if column.dtype == np.float64 and np.isnan(value):
+        return None
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def _save_column(directory: str, name: str, values: Sequence[Any]) -> Dict[str, str]:
+    """把一列属性写为.npy文件，返回记录在meta.json中的列描述
+
+    数值列直接保存；全为字符串或全为整数(可含None)的列保存为定长Unicode/int64数组加缺失掩码；
+    其余列退化为JSON。
+    """
+    column = values if isinstance(values, np.ndarray) and values.dtype != object else _to_column(list(values))
+    if column.dtype != object:
+        np.save(os.path.join(directory, f"{name}.npy"), column)
+        return {'name': name, 'kind': 'numeric'}
+    if all(v is None or isinstance(v, str) for v in column):
+        mask = np.fromiter((v is None for v in column), dtype=bool, count=len(column))
+        np.save(os.path.join(directory, f"{name}.npy"), np.asarray(['' if v is None else v for v in column], dtype=str))
+        np.save(os.path.join(directory, f"{name}.mask.npy"), mask)
+        return {'name': name, 'kind': 'string'}
+    if all(v is None or _is_int(v) for v in column):
+        try:
+            ints = np.asarray([0 if v is None else v for v in column], dtype=np.int64)
+        except OverflowError:
+            ints = None
+        if ints is not None:
+            np.save(os.path.join(directory, f"{name}.npy"), ints)
+            np.save(os.path.join(directory, f"{name}.mask.npy"),
+                    np.fromiter((v is None for v in column), dtype=bool, count=len(column)))
+            return {'name': name, 'kind': 'int'}
+    with open(os.path.join(directory, f"{name}.json"), 'w', encoding='utf-8') as f:
+        json.dump(column.tolist(), f, ensure_ascii=False, default=str)
+    return {'name': name, 'kind': 'json'}
+
+
+def _load_column(directory: str, spec: Dict[str, str], mmap_mode: Optional[str]) -> np.ndarray:
+    """按列描述读回一列；数值列在mmap_mode下按需映射，不读入内存"""
+    path = os.path.join(directory, spec['name'])
+    if spec['kind'] == 'numeric':
+        return np.load(f"{path}.npy", mmap_mode=mmap_mode)
+    if spec['kind'] in ('string', 'int'):
+        column = np.load(f"{path}.npy").astype(object)
+        column[np.load(f"{path}.mask.npy")] = None
+        return column
+    with open(f"{path}.json", 'r', encoding='utf-8') as f:
+        values = json.load(f)
+    column = np.empty(len(values), dtype=object)
+    column[:] = values
+    return column
+
+
+def _column_list(column: np.ndarray) -> List[Any]:
+    """把一列转换为Python列表，缺失值为None"""
+    values = column.tolist()
+    if column.dtype == np.float64:
+        return [None if v != v else v for v in values]
+    return values
+
+
+class CompactFinancialKnowledgeGraph:
+    """紧凑存储的金融知识图谱
+
+    节点ID被驻留为连续整数，实体/关系类型编码为小整数，边以CSR(出边)和CSC(入边)
+    邻接数组存储，属性按列存储。对外提供与FinancialKnowledgeGraph相同的
+    add_entity/add_relation/get_entity/get_relations/find_path接口。
+
+    与基于networkx.DiGraph的实现不同，同一对实体之间允许存在多条边(如多笔转账)；
+    find_path按实体序列去重，每一跳返回最近添加的那条边的属性。
+    """
+
+    def __init__(self):
+        """初始化紧凑知识图谱"""
+        self.entity_types = set()
+        self.relation_types = set()
+
+        # 节点驻留表与按列存储的节点属性
+        self._node_index: Dict[str, int] = {}
+        self._node_ids: List[str] = []
+        self._node_type = array('H')
+        self._node_attrs: Dict[str, List[Any]] = {}
+
+        # 类型编码表
+        self._type_codes: Dict[str, int] = {}
+        self._type_names: List[str] = []
+        self._relation_codes: Dict[str, int] = {}
+        self._relation_names: List[str] = []
+
+        # 边表：已构建部分为NumPy数组，新增边先写入pending缓冲，查询前合并
+        self._src = np.empty(0, dtype=np.int64)
+        self._dst = np.empty(0, dtype=np.int64)
+        self._rel = np.empty(0, dtype=np.uint16)
+        self._edge_attrs: Dict[str, np.ndarray] = {}
+        self._pending_src = array('q')
+        self._pending_dst = array('q')
+        self._pending_rel = array('H')
+        self._pending_attrs: Dict[str, List[Any]] = {}
+
+        # CSR/CSC索引只覆盖已构建的边；pending边通过增量邻接表查询，积累到阈值后整体重建
+        self._out_indptr: Optional[np.ndarray] = None
+        self._out_eids: Optional[np.ndarray] = None
+        self._in_indptr: Optional[np.ndarray] = None
+        self._in_eids: Optional[np.ndarray] = None
+        self._delta_out: Dict[int, List[int]] = {}
+        self._delta_in: Dict[int, List[int]] = {}
+
+    @property
+    def num_nodes(self) -> int:
+        """实体数量"""
+        return len(self._node_ids)
+
+    @property
+    def num_edges(self) -> int:
+        """关系数量"""
+        return len(self._src) + len(self._pending_src)
+
+    @property
+    def node_ids(self) -> List[str]:
+        """按整数ID排列的实体ID列表"""
+        return self._node_ids
+
+    def _intern(self, entity_id: str) -> int:
+        """返回实体的整数ID，不存在时创建一个类型未知的占位实体"""
+        index = self._node_index.get(entity_id)
+        if index is None:
+            index = len(self._node_ids)
+            self._node_index[entity_id] = index
+            self._node_ids.append(entity_id)
+            self._node_type.append(self._code(self._type_codes, self._type_names, 'unknown'))
+            for column in self._node_attrs.values():
+                column.append(None)
+        return index
+
+    @staticmethod
+    def _code(codes: Dict[str, int], names: List[str], name: str) -> int:
+        """返回类型名对应的小整数编码"""
+        code = codes.get(name)
+        if code is None:
+            code = len(names)
+            codes[name] = code
+            names.append(name)
+        return code
+
+    def add_entity(self, entity_id: str, entity_type: str, attributes: Dict = None):
+        """添加实体到图谱
+
+        Args:
+            entity_id: 实体ID
+            entity_type: 实体类型
+            attributes: 实体属性
+        """
+        index = self._intern(entity_id)
+        self.entity_types.add(entity_type)
+        self._node_type[index] = self._code(self._type_codes, self._type_names, entity_type)
+
+        for key, value in (attributes or {}).items():
+            if key == 'entity_type':
+                continue
+            column = self._node_attrs.get(key)
+            if column is None:
+                column = self._node_attrs[key] = [None] * self.num_nodes
+            column[index] = value
+
+    def add_relation(self, source_id: str, target_id: str, relation_type: str, attributes: Dict = None):
+        """添加关系到图谱
+
+        Args:
+            source_id: 源实体ID
+            target_id: 目标实体ID
+            relation_type: 关系类型
+            attributes: 关系属性
+        """
+        self.relation_types.add(relation_type)
+        pending = len(self._pending_src)
+        eid = self.num_edges
+        source = self._intern(source_id)
+        target = self._intern(target_id)
+        self._pending_src.append(source)
+        self._pending_dst.append(target)
+        self._pending_rel.append(self._code(self._relation_codes, self._relation_names, relation_type))
+
+        attributes = attributes or {}
+        for key in attributes.keys() - self._pending_attrs.keys():
+            if key != 'relation_type':
+                self._pending_attrs[key] = [None] * pending
+        for key, column in self._pending_attrs.items():
+            column.append(attributes.get(key))
+
+        self._delta_out.setdefault(source, []).append(eid)
+        self._delta_in.setdefault(target, []).append(eid)
+
+    @classmethod
+    def from_arrays(cls, node_ids: Sequence[str], node_types: Sequence[str],
+                    sources: Sequence[str], targets: Sequence[str], relation_types: Sequence[str],
+                    node_attributes: Dict[str, Sequence[Any]] = None,
+                    edge_attributes: Dict[str, Sequence[Any]] = None) -> 'CompactFinancialKnowledgeGraph':
+        """从数组批量构建图谱，不经过逐条add_entity/add_relation
+
+        Args:
+            node_ids: 实体ID数组
+            node_types: 与node_ids对齐的实体类型数组
+            sources: 边的源实体ID数组
+            targets: 边的目标实体ID数组
+            relation_types: 与边对齐的关系类型数组
+            node_attributes: 属性名 -> 与node_ids对齐的属性值数组
+            edge_attributes: 属性名 -> 与边对齐的属性值数组
+
+        Returns:
+            紧凑知识图谱对象
+        """
+        kg = cls()
+        node_ids = list(node_ids)
+        kg._node_ids = node_ids
+        kg._node_index = {entity_id: i for i, entity_id in enumerate(node_ids)}
+        if len(kg._node_index) != len(node_ids):
+            raise ValueError("node_ids中存在重复的实体ID")
+
+        type_names, type_codes = np.unique(np.asarray(node_types, dtype=object).astype(str), return_inverse=True)
+        kg._type_names = [str(name) for name in type_names]
+        kg._type_codes = {name: code for code, name in enumerate(kg._type_names)}
+        kg._node_type = array('H', type_codes.astype(np.uint16).tobytes())
+        kg.entity_types = set(kg._type_names)
+        kg._node_attrs = {key: list(values) for key, values in (node_attributes or {}).items()}
+
+        # 边端点中出现但未在node_ids中声明的实体补为unknown类型
+        index = kg._node_index
+        src = np.fromiter((index[s] if s in index else kg._intern(s) for s in sources), dtype=np.int64)
+        dst = np.fromiter((index[t] if t in index else kg._intern(t) for t in targets), dtype=np.int64)
+        if len(src) != len(dst) or len(src) != len(relation_types):
+            raise ValueError("sources、targets与relation_types长度必须一致")
+
+        rel_names, rel_codes = np.unique(np.asarray(relation_types, dtype=object).astype(str), return_inverse=True)
+        kg._relation_names = [str(name) for name in rel_names]
+        kg._relation_codes = {name: code for code, name in enumerate(kg._relation_names)}
+        kg.relation_types = set(kg._relation_names)
+
+        kg._src, kg._dst, kg._rel = src, dst, rel_codes.astype(np.uint16)
+        kg._edge_attrs = {key: _to_column(list(values)) for key, values in (edge_attributes or {}).items()}
+        for key, column in kg._edge_attrs.items():
+            if len(column) != len(src):
+                raise ValueError(f"边属性{key}的长度与边数量不一致")
+
+        logger.info(f"批量构建紧凑图谱: {kg.num_nodes}个实体, {kg.num_edges}条关系")
+        return kg
+
+    @classmethod
+    def from_graph(cls, kg) -> 'CompactFinancialKnowledgeGraph':
+        """从基于networkx的FinancialKnowledgeGraph转换
+
+        Args:
+            kg: FinancialKnowledgeGraph对象
+
+        Returns:
+            紧凑知识图谱对象
+        """
+        nodes = list(kg.graph.nodes(data=True))
+        node_keys = {key for _, attrs in nodes for key in attrs} - {'entity_type'}
+        edges = list(kg.graph.edges(data=True))
+        edge_keys = {key for _, _, attrs in edges for key in attrs} - {'relation_type'}
+        return cls.from_arrays(
+            [node for node, _ in nodes],
+            [attrs.get('entity_type', 'unknown') for _, attrs in nodes],
+            [u for u, _, _ in edges],
+            [v for _, v, _ in edges],
+            [attrs.get('relation_type', 'unknown') for _, _, attrs in edges],
+            {key: [attrs.get(key) for _, attrs in nodes] for key in node_keys},
+            {key: [attrs.get(key) for _, _, attrs in edges] for key in edge_keys},
+        )
+
+    def _flush(self):
+        """把pending缓冲中的边合并进列存数组"""
+        if not self._pending_src:
+            return
+        built = len(self._src)
+        added = len(self._pending_src)
+        self._src = np.concatenate([self._src, np.frombuffer(self._pending_src, dtype=np.int64)])
+        self._dst = np.concatenate([self._dst, np.frombuffer(self._pending_dst, dtype=np.int64)])
+        self._rel = np.concatenate([self._rel, np.frombuffer(self._pending_rel, dtype=np.uint16)])
+
+        for key in self._edge_attrs.keys() | self._pending_attrs.keys():
+            old = self._edge_attrs.get(key)
+            new = self._pending_attrs.get(key, [None] * added)
+            if old is None:
+                self._edge_attrs[key] = _to_column([None] * built + new)
+            elif old.dtype == object:
+                # 直接按object追加，全为None的新值经_to_column会变成NaN
+                extra = np.empty(added, dtype=object)
+                extra[:] = new
+                self._edge_attrs[key] = np.concatenate([old, extra])
+            else:
+                merged = _to_column(new)
+                if merged.dtype == object or (old.dtype == np.int64) != (merged.dtype == np.int64):
+                    # 类型不一致时退化为object列，保证值不丢失
+                    restored = [_column_value(old, i) for i in range(built)]
+                    self._edge_attrs[key] = _to_column(restored + new)
+                else:
+                    self._edge_attrs[key] = np.concatenate([old, merged])
+
+        self._pending_src = array('q')
+        self._pending_dst = array('q')
+        self._pending_rel = array('H')
+        self._pending_attrs = {}
+        self._delta_out = {}
+        self._delta_in = {}
+        # 合并进来的边不在旧索引中，增量邻接表也已清空，必须重建
+        self._out_indptr = None
+
+    def _ensure_index(self):
+        """按需(重新)构建CSR出边与CSC入边索引
+
+        少量新增边由增量邻接表服务，只有积累到阈值后才合并并重建，使逐条写入的摊销代价为O(1)。
+        """
+        threshold = max(DELTA_REBUILD_MIN, int(len(self._src) * DELTA_REBUILD_RATIO))
+        if self._out_indptr is not None and len(self._pending_src) <= threshold:
+            return
+        self._build_index()
+
+    def _build_index(self):
+        """合并全部pending边并重建CSR/CSC索引"""
+        self._flush()
+        n = self.num_nodes
+        self._out_eids = np.argsort(self._src, kind='stable')
+        self._out_indptr = np.concatenate([[0], np.cumsum(np.bincount(self._src, minlength=n))])
+        self._in_eids = np.argsort(self._dst, kind='stable')
+        self._in_indptr = np.concatenate([[0], np.cumsum(np.bincount(self._dst, minlength=n))])
+        logger.debug(f"重建邻接索引: {n}个实体, {len(self._src)}条关系")
+
+    @staticmethod
+    def _adjacent(eids: np.ndarray, indptr: np.ndarray, delta: Dict[int, List[int]], index: int) -> np.ndarray:
+        """CSR切片与增量邻接表拼接后的边ID数组"""
+        built = eids[indptr[index]:indptr[index + 1]] if index + 1 < len(indptr) else eids[:0]
+        extra = delta.get(index)
+        return np.concatenate([built, extra]) if extra else built
+
+    def out_edge_ids(self, index: int) -> np.ndarray:
+        """实体(整数ID)的出边ID数组"""
+        self._ensure_index()
+        return self._adjacent(self._out_eids, self._out_indptr, self._delta_out, index)
+
+    def in_edge_ids(self, index: int) -> np.ndarray:
+        """实体(整数ID)的入边ID数组"""
+        self._ensure_index()
+        return self._adjacent(self._in_eids, self._in_indptr, self._delta_in, index)
+
+    def edge_source(self, eid: int) -> int:
+        """边的源实体整数ID"""
+        built = len(self._src)
+        return int(self._src[eid]) if eid < built else self._pending_src[eid - built]
+
+    def edge_target(self, eid: int) -> int:
+        """边的目标实体整数ID"""
+        built = len(self._dst)
+        return int(self._dst[eid]) if eid < built else self._pending_dst[eid - built]
+
+    def edge_arrays(self, start: int = 0) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """边ID从start开始的(源实体整数ID, 目标实体整数ID, 关系类型编码)数组
+
+        边只追加不修改，调用方可以记住上次处理到的边数，只取之后新增的边。
+        """
+        if self._pending_src:
+            self._build_index()
+        return self._src[start:], self._dst[start:], self._rel[start:]
+
+    def edge_column(self, key: str, start: int = 0) -> Optional[np.ndarray]:
+        """边ID从start开始的属性列，属性不存在时返回None"""
+        if self._pending_src:
+            self._build_index()
+        column = self._edge_attrs.get(key)
+        return None if column is None else column[start:]
+
+    def relation_code(self, relation_type: str) -> Optional[int]:
+        """关系类型的编码，不存在时返回None"""
+        return self._relation_codes.get(relation_type)
+
+    def edge_relation(self, eid: int) -> int:
+        """边的关系类型编码"""
+        built = len(self._rel)
+        return int(self._rel[eid]) if eid < built else self._pending_rel[eid - built]
+
+    def edge_data(self, eid: int) -> Dict[str, Any]:
+        """按边ID还原关系属性字典"""
+        built = len(self._src)
+        data = {}
+        if eid < built:
+            for key, column in self._edge_attrs.items():
+                value = _column_value(column, eid)
+                if value is not None:
+                    data[key] = value
+            data['relation_type'] = self._relation_names[self._rel[eid]]
+        else:
+            for key, column in self._pending_attrs.items():
+                if column[eid - built] is not None:
+                    data[key] = column[eid - built]
+            data['relation_type'] = self._relation_names[self._pending_rel[eid - built]]
+        return data
+
+    def _edge_values(self, key: str, eids: np.ndarray) -> np.ndarray:
+        """按边ID数组取一列属性：数值列返回float64(缺失为NaN)，否则返回object数组(缺失为None)"""
+        built = len(self._src)
+        head, tail = eids[eids < built], eids[eids >= built] - built
+        column = self._edge_attrs.get(key)
+        values = column[head] if column is not None else np.full(len(head), np.nan)
+        pending = self._pending_attrs.get(key)
+        extra = _to_column([pending[i] for i in tail.tolist()] if pending is not None else [None] * len(tail))
+        if values.dtype == object or extra.dtype == object:
+            return np.concatenate([values.astype(object), extra.astype(object)])
+        return np.concatenate([values.astype(np.float64), extra.astype(np.float64)])
+
+    def _edge_records(self, eids: Sequence[int]) -> List[Dict[str, Any]]:
+        """按边ID批量还原关系属性字典，每列只做一次切片与tolist，不逐条逐列读取NumPy标量"""
+        eids = np.asarray(eids, dtype=np.int64)
+        built = len(self._src)
+        records: List[Dict[str, Any]] = [None] * len(eids)
+        inside = eids < built
+        head, tail = eids[inside], eids[~inside] - built
+
+        columns = {key: _column_list(column[head]) for key, column in self._edge_attrs.items()}
+        for j, (position, rel) in enumerate(zip(np.flatnonzero(inside).tolist(), self._rel[head].tolist())):
+            data = {key: values[j] for key, values in columns.items() if values[j] is not None}
+            data['relation_type'] = self._relation_names[rel]
+            records[position] = data
+
+        for position, i in zip(np.flatnonzero(~inside).tolist(), tail.tolist()):
+            data = {key: column[i] for key, column in self._pending_attrs.items() if column[i] is not None}
+            data['relation_type'] = self._relation_names[self._pending_rel[i]]
+            records[position] = data
+        return records
+
+    def _relation_code_array(self, relation_types: Optional[Iterable[str]]) -> Optional[np.ndarray]:
+        """关系类型名集合对应的编码数组，None表示不过滤"""
+        if relation_types is None:
+            return None
+        return np.array([self._relation_codes[name] for name in relation_types if name in self._relation_codes],
+                        dtype=np.uint16)
+
+    def _incident(self, index: int, direction: str, rel_codes: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """实体(整数ID)单个方向的(边ID数组, 另一端实体整数ID数组)，直接在CSR切片上按关系编码过滤"""
+        eids = (self.out_edge_ids(index) if direction == 'out' else self.in_edge_ids(index)).astype(np.int64)
+        built = len(self._src)
+        head, tail = eids[eids < built], eids[eids >= built] - built
+        if rel_codes is not None:
+            rels = np.concatenate([self._rel[head], np.frombuffer(self._pending_rel, dtype=np.uint16)[tail]])
+            eids = eids[np.isin(rels, rel_codes)]
+            head, tail = eids[eids < built], eids[eids >= built] - built
+        endpoints, pending = (self._dst, self._pending_dst) if direction == 'out' else (self._src, self._pending_src)
+        return eids, np.concatenate([endpoints[head], np.frombuffer(pending, dtype=np.int64)[tail]])
+
+    def neighbor_arrays(self, entity_id: str, direction: str = 'out', relation_types: Iterable[str] = None,
+                        columns: Sequence[str] = ()) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        """以数组形式获取实体单个方向的邻居及边属性列，不为每条边构造属性字典
+
+        Args:
+            entity_id: 实体ID
+            direction: 'out'表示出边，'in'表示入边
+            relation_types: 只返回这些类型的关系，None表示全部
+            columns: 需要返回的边属性名
+
+        Returns:
+            (邻居实体整数ID数组, 属性名 -> 与之对齐的属性值数组)，整数ID可通过node_ids还原为实体ID
+        """
+        index = self._node_index.get(entity_id)
+        if index is None:
+            return np.empty(0, dtype=np.int64), {key: np.empty(0) for key in columns}
+        eids, others = self._incident(index, direction, self._relation_code_array(relation_types))
+        return others, {key: self._edge_values(key, eids) for key in columns}
+
+    def relation_pairs(self, relation_type: str) -> Iterator[Tuple[str, str]]:
+        """遍历指定类型的全部(源实体ID, 目标实体ID)关系对
+
+        Args:
+            relation_type: 关系类型
+        """
+        code = self._relation_codes.get(relation_type)
+        if code is None:
+            return
+        for eid in np.flatnonzero(self._rel == code):
+            yield self._node_ids[self._src[eid]], self._node_ids[self._dst[eid]]
+        for i, rel in enumerate(self._pending_rel):
+            if rel == code:
+                yield self._node_ids[self._pending_src[i]], self._node_ids[self._pending_dst[i]]
+
+    def entities(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """按列批量遍历全部(实体ID, 实体属性)"""
+        columns = {key: list(column) for key, column in self._node_attrs.items()}
+        for index, entity_id in enumerate(self._node_ids):
+            data = {key: column[index] for key, column in columns.items() if column[index] is not None}
+            data['entity_type'] = self._type_names[self._node_type[index]]
+            yield entity_id, data
+
+    def relations(self) -> Iterator[Tuple[str, str, Dict[str, Any]]]:
+        """按列批量遍历全部(源实体ID, 目标实体ID, 关系属性)，按添加顺序"""
+        self._flush()
+        node_ids = self._node_ids
+        columns = {key: _column_list(column) for key, column in self._edge_attrs.items()}
+        for eid, (source, target, rel) in enumerate(zip(self._src.tolist(), self._dst.tolist(), self._rel.tolist())):
+            data = {key: column[eid] for key, column in columns.items() if column[eid] is not None}
+            data['relation_type'] = self._relation_names[rel]
+            yield node_ids[source], node_ids[target], data
+
+    def get_entity(self, entity_id: str) -> Dict:
+        """获取实体信息
+
+        Args:
+            entity_id: 实体ID
+
+        Returns:
+            实体信息
+        """
+        index = self._node_index.get(entity_id)
+        if index is None:
+            return None
+        data = {key: column[index] for key, column in self._node_attrs.items() if column[index] is not None}
+        data['entity_type'] = self._type_names[self._node_type[index]]
+        return data
+
+    def get_relations(self, entity_id: str, direction: str = 'out',
+                      relation_types: Iterable[str] = None) -> List[Tuple]:
+        """获取实体的关系
+
+        Args:
+            entity_id: 实体ID
+            direction: 关系方向，'out'表示出边，'in'表示入边，'both'表示双向
+            relation_types: 只返回这些类型的关系，None表示全部
+
+        Returns:
+            关系列表
+        """
+        index = self._node_index.get(entity_id)
+        if index is None:
+            return []
+        rel_codes = self._relation_code_array(relation_types)
+
+        relations = []
+        for side in ('out', 'in'):
+            if direction in [side, 'both']:
+                eids, others = self._incident(index, side, rel_codes)
+                relations.extend((side, self._node_ids[other], data)
+                                 for other, data in zip(others.tolist(), self._edge_records(eids)))
+        return relations
+
+    def get_entities_by_type(self, entity_type: str) -> List[str]:
+        """获取指定类型的全部实体ID
+
+        Args:
+            entity_type: 实体类型
+
+        Returns:
+            实体ID列表
+        """
+        code = self._type_codes.get(entity_type)
+        if code is None:
+            return []
+        codes = np.frombuffer(self._node_type, dtype=np.uint16)
+        return [self._node_ids[i] for i in np.flatnonzero(codes == code)]
+
+    def find_path(self, source_id: str, target_id: str, max_depth: int = 3, max_paths: int = None,
+                  relation_types: Iterable[str] = None, entity_types: Iterable[str] = None,
+                  k_shortest: int = None) -> List[List[Tuple]]:
+        """查找两个实体之间的路径
+
+        Args:
+            source_id: 源实体ID
+            target_id: 目标实体ID
+            max_depth: 最大深度
+            max_paths: 最多返回的路径数量，None表示不限
+            relation_types: 只沿这些类型的关系搜索，None表示全部
+            entity_types: 中间实体须属于这些类型，None表示全部
+            k_shortest: 若指定，按跳数从短到长返回前k条路径
+
+        Returns:
+            路径列表
+        """
+        if k_shortest is not None:
+            paths = self.k_shortest_paths(source_id, target_id, k_shortest, max_depth, relation_types, entity_types)
+        else:
+            paths = self.iter_paths(source_id, target_id, max_depth, relation_types, entity_types, max_paths)
+        return list(paths)
+
+    def iter_paths(self, source_id: str, target_id: str, max_depth: int = 3,
+                   relation_types: Iterable[str] = None, entity_types: Iterable[str] = None,
+                   max_paths: int = None, min_depth: int = 1) -> Iterator[List[Tuple]]:
+        """逐条生成两个实体之间的路径，调用方可随时停止
+
+        max_depth不小于BIDIRECTIONAL_MIN_DEPTH时，先从目标沿入边反向BFS得到各实体到目标的最短跳数，
+        正向DFS时剪掉无法在剩余深度内到达目标的分支，两端相向搜索、在中间汇合。
+
+        Args:
+            source_id: 源实体ID
+            target_id: 目标实体ID
+            max_depth: 最大深度
+            relation_types: 只沿这些类型的关系搜索，None表示全部
+            entity_types: 中间实体须属于这些类型，None表示全部
+            max_paths: 最多生成的路径数量，None表示不限
+            min_depth: 最小深度，更短的路径不生成
+
+        Yields:
+            路径，每一跳为(源实体ID, 目标实体ID, 关系属性)
+        """
+        source = self._node_index.get(source_id)
+        target = self._node_index.get(target_id)
+        if source is None or target is None or source == target or max_paths == 0:
+            return
+
+        self._ensure_index()
+        rel_codes = self._relation_code_array(relation_types)
+        type_codes = None if entity_types is None else {
+            self._type_codes[name] for name in entity_types if name in self._type_codes
+        }
+
+        def out_hops(index: int) -> Iterator[Tuple[int, int]]:
+            # 按出边逆序遍历，使重复邻居取最近添加的边
+            eids, targets = self._incident(index, 'out', rel_codes)
+            return zip(eids[::-1].tolist(), targets[::-1].tolist())
+
+        def node_ok(index: int) -> bool:
+            return type_codes is None or index in (source, target) or self._node_type[index] in type_codes
+
+        dist_back = None
+        if max_depth >= BIDIRECTIONAL_MIN_DEPTH:
+            dist_back = {target: 0}
+            queue = deque([target])
+            while queue:
+                node = queue.popleft()
+                if dist_back[node] >= max_depth - 1:
+                    continue
+                for predecessor in self._incident(node, 'in', rel_codes)[1].tolist():
+                    if predecessor not in dist_back and node_ok(predecessor):
+                        dist_back[predecessor] = dist_back[node] + 1
+                        queue.append(predecessor)
+
+        count = 0
+        path_nodes = [source]
+        path_edges: List[int] = []
+        on_path: Set[int] = {source}
+        stack = [out_hops(source)]
+        seen = [set()]
+
+        while stack:
+            hop = next(stack[-1], None)
+            if hop is None:
+                stack.pop()
+                seen.pop()
+                on_path.discard(path_nodes.pop())
+                if path_edges:
+                    path_edges.pop()
+                continue
+
+            eid, neighbor = hop
+            if neighbor in on_path or neighbor in seen[-1]:
+                continue
+            seen[-1].add(neighbor)
+
+            depth = len(path_edges) + 1
+            if neighbor == target:
+                if depth < min_depth:
+                    continue
+                nodes = path_nodes + [target]
+                records = self._edge_records(path_edges + [eid])
+                yield [
+                    (self._node_ids[nodes[i]], self._node_ids[nodes[i + 1]], records[i])
+                    for i in range(len(records))
+                ]
+                count += 1
+                if max_paths is not None and count >= max_paths:
+                    return
+            elif depth < max_depth and node_ok(neighbor):
+                if dist_back is not None and (neighbor not in dist_back or depth + dist_back[neighbor] > max_depth):
+                    continue
+                path_nodes.append(neighbor)
+                path_edges.append(eid)
+                on_path.add(neighbor)
+                stack.append(out_hops(neighbor))
+                seen.append(set())
+
+    def k_shortest_paths(self, source_id: str, target_id: str, k: int, max_depth: int = K_SHORTEST_MAX_DEPTH,
+                         relation_types: Iterable[str] = None,
+                         entity_types: Iterable[str] = None) -> Iterator[List[Tuple]]:
+        """按跳数从短到长生成前k条路径
+
+        Yen算法：每得到一条路径，以其上各节点为分叉点，屏蔽已有路径在该处的后继边后
+        用BFS求分叉点到目标的最短路径，候选中最短的一条即为下一条路径。
+        先从目标反向BFS半个max_depth，得到各实体到目标跳数的下界(球外实体至少为半径+1)，
+        正向BFS据此剪掉无法在剩余深度内到达目标的分支，每次搜索的范围都不超过max_depth跳邻域。
+
+        Args:
+            source_id: 源实体ID
+            target_id: 目标实体ID
+            k: 路径数量
+            max_depth: 最大深度，None表示不限
+            relation_types: 只沿这些类型的关系搜索，None表示全部
+            entity_types: 中间实体须属于这些类型，None表示全部
+
+        Yields:
+            路径，每一跳为(源实体ID, 目标实体ID, 关系属性)
+        """
+        source = self._node_index.get(source_id)
+        target = self._node_index.get(target_id)
+        if source is None or target is None or source == target or k <= 0:
+            return
+
+        self._ensure_index()
+        limit = self.num_nodes - 1 if max_depth is None else max_depth
+        rel_codes = self._relation_code_array(relation_types)
+        type_codes = None if entity_types is None else {
+            self._type_codes[name] for name in entity_types if name in self._type_codes
+        }
+
+        def node_ok(index: int) -> bool:
+            return type_codes is None or index in (source, target) or self._node_type[index] in type_codes
+
+        radius = (limit + 1) // 2
+        dist_back = {target: 0}
+        queue = deque([target])
+        while queue:
+            node = queue.popleft()
+            if dist_back[node] >= radius:
+                continue
+            for predecessor in self._incident(node, 'in', rel_codes)[1].tolist():
+                if predecessor not in dist_back and node_ok(predecessor):
+                    dist_back[predecessor] = dist_back[node] + 1
+                    queue.append(predecessor)
+
+        successors: Dict[int, List[int]] = {}
+
+        def shortest(start: int, budget: int, blocked_nodes: Set[int], blocked_edges: Set[Tuple[int, int]]):
+            # 从start出发至多budget跳到达目标的最短路径(实体整数ID序列)
+            parents = {start: None}
+            frontier = [start]
+            for depth in range(1, budget + 1):
+                following = []
+                for node in frontier:
+                    if node not in successors:
+                        successors[node] = [v for v in self._incident(node, 'out', rel_codes)[1].tolist() if node_ok(v)]
+                    for neighbor in successors[node]:
+                        if (neighbor in parents or neighbor in blocked_nodes or (node, neighbor) in blocked_edges
+                                or depth + dist_back.get(neighbor, radius + 1) > budget):
+                            continue
+                        parents[neighbor] = node
+                        if neighbor == target:
+                            path = [neighbor]
+                            while parents[path[-1]] is not None:
+                                path.append(parents[path[-1]])
+                            return path[::-1]
+                        following.append(neighbor)
+                frontier = following
+            return None
+
+        def materialize(path: List[int]) -> List[Tuple]:
+            # 每一跳取该实体对之间最近添加的那条(符合关系类型的)边
+            hops = []
+            for u, v in zip(path, path[1:]):
+                eids, targets = self._incident(u, 'out', rel_codes)
+                hops.append(int(eids[targets == v].max()))
+            records = self._edge_records(hops)
+            return [(self._node_ids[path[i]], self._node_ids[path[i + 1]], records[i]) for i in range(len(hops))]
+
+        first = shortest(source, limit, set(), set())
+        if first is None:
+            return
+        found = [first]
+        yield materialize(first)
+        candidates: List[Tuple[int, int, List[int]]] = []
+        queued = {tuple(found[0])}
+        while len(found) < k:
+            previous = found[-1]
+            for i in range(len(previous) - 1):
+                root = previous[:i + 1]
+                blocked_edges = {(path[i], path[i + 1]) for path in found if path[:i + 1] == root}
+                spur = shortest(previous[i], limit - i, set(root[:-1]), blocked_edges)
+                if spur is not None:
+                    path = root[:-1] + spur
+                    if tuple(path) not in queued:
+                        queued.add(tuple(path))
+                        heapq.heappush(candidates, (len(path), len(queued), path))
+            if not candidates:
+                return
+            found.append(heapq.heappop(candidates)[2])
+            yield materialize(found[-1])
+
+    def memory_usage(self) -> Dict[str, int]:
+        """邻接与属性数组占用的字节数(不含Python字符串驻留表)"""
+        self._ensure_index()
+        arrays = {
+            'edges': self._src.nbytes + self._dst.nbytes + self._rel.nbytes,
+            'index': sum(a.nbytes for a in (self._out_indptr, self._out_eids, self._in_indptr, self._in_eids)),
+            'edge_attributes': sum(column.nbytes for column in self._edge_attrs.values()),
+            'node_types': self._node_type.itemsize * len(self._node_type),
+        }
+        arrays['total'] = sum(arrays.values())
+        return arrays
+
+    def save_binary(self, directory: str):
+        """以二进制列存格式保存图谱
+
+        目录中每个数组一个.npy文件(边端点、类型编码、CSR/CSC索引与属性列)，
+        meta.json记录类型编码表与属性列描述。加载时无需解析文本，也无需重建索引。
+        实体ID须全为字符串或全为整数，保存为对应类型的数组，加载后类型不变。
+
+        Args:
+            directory: 输出目录，不存在时创建
+        """
+        if all(isinstance(v, str) for v in self._node_ids):
+            node_ids = np.asarray(self._node_ids, dtype=str)
+        elif all(isinstance(v, (int, np.integer)) and not isinstance(v, bool) for v in self._node_ids):
+            node_ids = np.asarray(self._node_ids, dtype=np.int64)
+        else:
+            raise ValueError("二进制存储要求实体ID全为字符串或全为整数")
+        self._build_index()
+        os.makedirs(directory, exist_ok=True)
+        arrays = {
+            'node_ids': node_ids,
+            'node_type': np.frombuffer(self._node_type, dtype=np.uint16),
+            'src': self._src, 'dst': self._dst, 'rel': self._rel,
+            'out_indptr': self._out_indptr, 'out_eids': self._out_eids,
+            'in_indptr': self._in_indptr, 'in_eids': self._in_eids,
+        }
+        for name, values in arrays.items():
+            np.save(os.path.join(directory, f"{name}.npy"), values)
+
+        meta = {
+            'version': BINARY_FORMAT_VERSION,
+            'type_names': self._type_names,
+            'relation_names': self._relation_names,
+            'entity_types': sorted(self.entity_types),
+            'relation_types': sorted(self.relation_types),
+            'node_attributes': {
+                key: _save_column(directory, f"node_attr_{i}", values)
+                for i, (key, values) in enumerate(self._node_attrs.items())
+            },
+            'edge_attributes': {
+                key: _save_column(directory, f"edge_attr_{i}", column)
+                for i, (key, column) in enumerate(self._edge_attrs.items())
+            },
+        }
+        with open(os.path.join(directory, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+
+        logger.info(f"紧凑图谱已保存到: {directory}")
+
+    @classmethod
+    def load_binary(cls, directory: str, mmap: bool = True) -> 'CompactFinancialKnowledgeGraph':
+        """从save_binary生成的目录加载图谱
+
+        边数组、索引与数值属性列以内存映射方式打开，由操作系统按访问分页读入，
+        启动代价只剩实体ID驻留表的构建。之后的写入会在合并时复制为内存数组，不会改动文件。
+
+        Args:
+            directory: save_binary的输出目录
+            mmap: 是否以内存映射方式延迟加载
+
+        Returns:
+            紧凑知识图谱对象
+        """
+        with open(os.path.join(directory, 'meta.json'), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get('version') not in READABLE_FORMAT_VERSIONS:
+            raise ValueError(f"不支持的图谱存储格式版本: {meta.get('version')}")
+        mmap_mode = 'r' if mmap else None
+
+        def load(name: str) -> np.ndarray:
+            return np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mmap_mode)
+
+        kg = cls()
+        kg._node_ids = np.load(os.path.join(directory, 'node_ids.npy')).tolist()
+        kg._node_index = {entity_id: i for i, entity_id in enumerate(kg._node_ids)}
+        kg._node_type = array('H', np.load(os.path.join(directory, 'node_type.npy')).tobytes())
+        kg._type_names = meta['type_names']
+        kg._type_codes = {name: code for code, name in enumerate(kg._type_names)}
+        kg._relation_names = meta['relation_names']
+        kg._relation_codes = {name: code for code, name in enumerate(kg._relation_names)}
+        kg.entity_types = set(meta['entity_types'])
+        kg.relation_types = set(meta['relation_types'])
+
+        kg._src, kg._dst, kg._rel = load('src'), load('dst'), load('rel')
+        kg._out_indptr, kg._out_eids = load('out_indptr'), load('out_eids')
+        kg._in_indptr, kg._in_eids = load('in_indptr'), load('in_eids')
+        kg._node_attrs = {
+            key: _column_list(_load_column(directory, spec, None))
+            for key, spec in meta['node_attributes'].items()
+        }
+        kg._edge_attrs = {
+            key: _load_column(directory, spec, mmap_mode)
+            for key, spec in meta['edge_attributes'].items()
+        }
+
+        logger.info(f"已从{directory}加载紧凑图谱: {kg.num_nodes}个实体, {kg.num_edges}条关系")
+        return kg
@@ -0,0 +1,307 @@
+import time
+from typing import Dict, List, Optional, Iterable
+import logging
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from scipy.sparse import csgraph
+
+from compact_graph import CompactFinancialKnowledgeGraph
+
+logger = logging.getLogger("KG_Risk_Control")
+
+# 默认的扇入/扇出时间窗口(列名后缀 -> 秒)
+DEFAULT_WINDOWS = {'1h': 3600, '24h': 86400}
+
+
+def label_propagation(adjacency: sp.csr_matrix, iterations: int = 20, seed: int = 0,
+                      initial: Optional[np.ndarray] = None, active: Optional[np.ndarray] = None) -> np.ndarray:
+    """在CSR邻接矩阵上做同步标签传播，返回按社区规模降序编号的社区数组
+
+    每轮把节点的标签改为邻居(含自身)中出现最多的标签，平票时随机选择；
+    计数通过对(节点, 邻居标签)排序去重一次完成，不逐节点循环。
+    只有自身或邻居的标签在上一轮变化过的节点才需要重算，活跃节点集合随收敛迅速缩小。
+    initial为上一次的结果时从它开始迭代(热启动)，新增节点各自成为一个社区，
+    此时第一轮只重算active(如被新边触及的节点)和新增节点。
+
+    Args:
+        adjacency: n×n无向邻接矩阵
+        iterations: 最大迭代轮数
+        seed: 平票随机种子
+        initial: 上一次的社区数组，长度可以小于n
+        active: 热启动时第一轮需要重算的节点下标，None表示全部节点
+
+    Returns:
+        长度为n的社区编号数组，0为最大的社区
+    """
+    n = adjacency.shape[0]
+    labels = np.arange(n, dtype=np.int64)
+    nodes = labels.copy()
+    if initial is not None and len(initial):
+        labels[:len(initial)] = initial
+        labels[len(initial):] = np.arange(len(initial), n) + int(initial.max()) + 1
+        _, labels = np.unique(labels, return_inverse=True)
+        if active is not None:
+            nodes = np.union1d(np.asarray(active, dtype=np.int64), np.arange(len(initial), n))
+    rng = np.random.default_rng(seed)
+    for _ in range(iterations):
+        if nodes.size == 0:
+            break
+        rows = adjacency[nodes]
+        owners = np.concatenate([np.repeat(np.arange(len(nodes)), np.diff(rows.indptr)), np.arange(len(nodes))])
+        neighbor_labels = np.concatenate([labels[rows.indices], labels[nodes]])
+        keys, counts = np.unique(owners * n + neighbor_labels, return_counts=True)
+        owners, candidates = keys // n, keys % n
+        # 键已按节点排序，每段取(次数 + 随机扰动)最大的候选标签
+        score = counts + rng.random(len(counts)) * 0.5
+        bounds = np.flatnonzero(np.r_[True, owners[1:] != owners[:-1]])
+        best = np.repeat(np.maximum.reduceat(score, bounds), np.diff(np.r_[bounds, len(owners)]))
+        winners = score == best
+        updated = labels[nodes]
+        updated[owners[winners]] = candidates[winners]
+        changed = nodes[updated != labels[nodes]]
+        labels[nodes] = updated
+        if changed.size == 0:
+            break
+        nodes = np.union1d(changed, adjacency[changed].indices)
+    _, inverse, sizes = np.unique(labels, return_inverse=True, return_counts=True)
+    rank = np.empty(len(sizes), dtype=np.int64)
+    rank[np.argsort(-sizes, kind='stable')] = np.arange(len(sizes))
+    return rank[inverse]
+
+
+def _to_seconds(column: Optional[np.ndarray], length: int) -> np.ndarray:
+    """把时间戳列统一转换为秒(float)，缺失或无法解析时为NaN"""
+    if column is None:
+        return np.full(length, np.nan)
+    if column.dtype != object:
+        return column.astype(np.float64)
+    values = pd.Series(column)
+    seconds = pd.to_numeric(values, errors='coerce').to_numpy(dtype=np.float64)
+    unparsed = np.isnan(seconds) & values.notna().to_numpy()
+    if unparsed.any():
+        parsed = pd.to_datetime(values[unparsed].astype(str), errors='coerce')
+        seconds[unparsed] = np.where(parsed.isna(), np.nan, parsed.astype('int64') / 1e9)
+    return seconds
+
+
+def _window_max(nodes: np.ndarray, seconds: np.ndarray, window: float, n: int) -> np.ndarray:
+    """每个节点在任意长度为window的时间窗口内的最大边数
+
+    按(节点, 时间)编码成单个整数键排序后，用searchsorted一次求出每条边开始的窗口内的边数。
+    """
+    result = np.zeros(n, dtype=np.int64)
+    valid = ~np.isnan(seconds)
+    if not valid.any():
+        return result
+    t = np.floor(seconds[valid] - seconds[valid].min()).astype(np.int64)
+    span = int(t.max()) + int(window) + 1
+    keys = np.sort(nodes[valid].astype(np.int64) * span + t)
+    counts = np.searchsorted(keys, keys + int(window), side='right') - np.arange(len(keys))
+    np.maximum.at(result, keys // span, counts)
+    return result
+
+
+class GraphFeatureExtractor:
+    """批量图特征计算
+
+    在紧凑图谱的边数组上用稀疏矩阵运算一次算出全部实体的特征列：
+    PageRank、(加权)出入度、时间窗口内的扇入/扇出、弱连通分量、社区，
+    以及经由共享属性(如地址)两跳可达的其他账户数。
+
+    结果按图谱的边数缓存；图谱只追加边，刷新时出入度只累加新边，
+    扇入/扇出只重算被新边触及的实体，PageRank和社区从上次结果热启动。
+    """
+
+    def __init__(self, kg, windows: Dict[str, float] = None,
+                 transfer_relations: Iterable[str] = ('transfer',),
+                 shared_relations: Iterable[str] = ('has_address',),
+                 amount_key: str = 'amount', timestamp_key: str = 'timestamp',
+                 damping: float = 0.85, max_shared_degree: int = 1000):
+        """初始化特征计算器
+
+        Args:
+            kg: CompactFinancialKnowledgeGraph；传入FinancialKnowledgeGraph时每次计算前转换
+            windows: 扇入/扇出时间窗口，列名后缀 -> 秒
+            transfer_relations: 计算度数、PageRank和扇入/扇出的关系类型，None表示全部
+            shared_relations: 计算两跳共享属性的关系类型(账户 -> 属性实体)
+            amount_key: 金额属性名，用于加权度数和PageRank
+            timestamp_key: 时间戳属性名
+            damping: PageRank阻尼系数
+            max_shared_degree: 关联账户超过该数的属性实体视为超级节点，不参与共享计数
+        """
+        self.kg = kg
+        self.windows = dict(DEFAULT_WINDOWS if windows is None else windows)
+        self.transfer_relations = None if transfer_relations is None else list(transfer_relations)
+        self.shared_relations = list(shared_relations)
+        self.amount_key = amount_key
+        self.timestamp_key = timestamp_key
+        self.damping = damping
+        self.max_shared_degree = max_shared_degree
+
+        self._edges_done = 0
+        self._state: Dict[str, np.ndarray] = {}
+        self._table: Optional[pd.DataFrame] = None
+
+    def _graph(self) -> CompactFinancialKnowledgeGraph:
+        """返回紧凑图谱，networkx后端每次转换一次"""
+        if isinstance(self.kg, CompactFinancialKnowledgeGraph):
+            return self.kg
+        self._edges_done = 0
+        self._state = {}
+        return CompactFinancialKnowledgeGraph.from_graph(self.kg)
+
+    def _relation_mask(self, kg: CompactFinancialKnowledgeGraph, rel: np.ndarray,
+                       relation_types: Optional[List[str]]) -> np.ndarray:
+        """边是否属于指定关系类型的布尔掩码"""
+        if relation_types is None:
+            return np.ones(len(rel), dtype=bool)
+        codes = [kg.relation_code(name) for name in relation_types]
+        return np.isin(rel, [code for code in codes if code is not None])
+
+    def compute(self) -> pd.DataFrame:
+        """计算(或增量刷新)特征表
+
+        Returns:
+            以实体ID为索引的特征表
+        """
+        kg = self._graph()
+        n = kg.num_nodes
+        if self._table is not None and kg is self.kg and kg.num_edges == self._edges_done and n == len(self._table):
+            return self._table
+
+        start_time = time.perf_counter()
+        src, dst, rel = kg.edge_arrays()
+        amounts = kg.edge_column(self.amount_key)
+        amounts = np.zeros(len(src)) if amounts is None else np.nan_to_num(
+            pd.to_numeric(pd.Series(amounts), errors='coerce').to_numpy(dtype=np.float64))
+        transfer = self._relation_mask(kg, rel, self.transfer_relations)
+        start = self._edges_done
+
+        self._update_degrees(n, src, dst, amounts, transfer, start)
+        self._update_fan(kg, n, src, dst, transfer, start)
+        adjacency = sp.csr_matrix((np.ones(int(transfer.sum())), (src[transfer], dst[transfer])), shape=(n, n))
+        self._update_pagerank(n, src[transfer], dst[transfer], amounts[transfer])
+        self._update_components(adjacency, np.union1d(src[start:][transfer[start:]], dst[start:][transfer[start:]]))
+        self._update_shared(kg, n, src, dst, rel)
+
+        self._edges_done = len(src)
+        self._table = pd.DataFrame(self._state, index=pd.Index(list(kg.node_ids), name='entity_id'))
+        logger.info(f"图特征计算完成: {n}个实体, {len(src) - start}条新边, "
+                    f"耗时 {(time.perf_counter() - start_time) * 1000:.0f} ms")
+        return self._table
+
+    def _grow(self, key: str, n: int, dtype=np.float64) -> np.ndarray:
+        """取出状态列并补齐到n个实体"""
+        column = self._state.get(key)
+        if column is None:
+            column = np.zeros(0, dtype=dtype)
+        if len(column) < n:
+            column = np.concatenate([column, np.zeros(n - len(column), dtype=column.dtype)])
+        self._state[key] = column
+        return column
+
+    def _update_degrees(self, n: int, src: np.ndarray, dst: np.ndarray, amounts: np.ndarray,
+                        transfer: np.ndarray, start: int):
+        """出入度与加权出入度只累加新边的贡献"""
+        new = np.zeros(len(src), dtype=bool)
+        new[start:] = True
+        new &= transfer
+        self._grow('in_degree', n, np.int64)[:] += np.bincount(dst[new], minlength=n)
+        self._grow('out_degree', n, np.int64)[:] += np.bincount(src[new], minlength=n)
+        self._grow('weighted_in', n)[:] += np.bincount(dst[new], weights=amounts[new], minlength=n)
+        self._grow('weighted_out', n)[:] += np.bincount(src[new], weights=amounts[new], minlength=n)
+
+    def _update_fan(self, kg: CompactFinancialKnowledgeGraph, n: int, src: np.ndarray, dst: np.ndarray,
+                    transfer: np.ndarray, start: int):
+        """扇入/扇出：只重算被新边触及的实体在各时间窗口内的最大交易数"""
+        if not self.windows:
+            return
+        seconds = _to_seconds(kg.edge_column(self.timestamp_key), len(src))
+        touched_in = np.unique(dst[start:][transfer[start:]])
+        touched_out = np.unique(src[start:][transfer[start:]])
+        for direction, nodes, touched in (('in', dst, touched_in), ('out', src, touched_out)):
+            if touched.size == 0:
+                for label in self.windows:
+                    self._grow(f'fan_{direction}_{label}', n, np.int64)
+                continue
+            mask = transfer & np.isin(nodes, touched)
+            for label, window in self.windows.items():
+                column = self._grow(f'fan_{direction}_{label}', n, np.int64)
+                column[touched] = _window_max(nodes[mask], seconds[mask], window, n)[touched]
+
+    def _update_pagerank(self, n: int, src: np.ndarray, dst: np.ndarray, weights: np.ndarray,
+                         tol: float = 1e-8, max_iter: int = 100):
+        """按金额加权的PageRank幂迭代，从上次结果热启动；金额缺失时按边数"""
+        if n == 0:
+            self._state['pagerank'] = np.zeros(0)
+            return
+        weights = np.where(weights > 0, weights, 1.0)
+        matrix = sp.csr_matrix((weights, (src, dst)), shape=(n, n))
+        out_weight = np.asarray(matrix.sum(axis=1)).ravel()
+        dangling = out_weight == 0
+        transition = sp.diags(np.where(dangling, 0, 1 / np.where(dangling, 1, out_weight))) @ matrix
+        transition_t = transition.T.tocsr()
+
+        previous = self._state.get('pagerank')
+        rank = np.full(n, 1.0 / n)
+        if previous is not None and len(previous):
+            rank[:len(previous)] = previous
+            rank /= rank.sum()
+        for _ in range(max_iter):
+            updated = self.damping * (transition_t @ rank + rank[dangling].sum() / n) + (1 - self.damping) / n
+            converged = np.abs(updated - rank).sum() < n * tol
+            rank = updated
+            if converged:
+                break
+        self._state['pagerank'] = rank
+
+    def _update_components(self, adjacency: sp.csr_matrix, touched: np.ndarray):
+        """弱连通分量与标签传播社区，以及各自的规模；社区只从被新边触及的节点开始重新传播"""
+        count, component = csgraph.connected_components(adjacency, directed=True, connection='weak')
+        self._state['component'] = component
+        self._state['component_size'] = np.bincount(component, minlength=count)[component]
+
+        undirected = (adjacency + adjacency.T).tocsr()
+        undirected.data[:] = 1
+        community = label_propagation(undirected, initial=self._state.get('community'), active=touched)
+        self._state['community'] = community
+        self._state['community_size'] = np.bincount(community)[community]
+
+    def _update_shared(self, kg: CompactFinancialKnowledgeGraph, n: int, src: np.ndarray,
+                       dst: np.ndarray, rel: np.ndarray):
+        """两跳共享属性：账户 -> 属性 <- 其他账户，按关系类型分别统计其他账户数和共享的属性数"""
+        for relation_type in self.shared_relations:
+            code = kg.relation_code(relation_type)
+            mask = rel == code if code is not None else np.zeros(len(rel), dtype=bool)
+            links = sp.csr_matrix((np.ones(int(mask.sum())), (src[mask], dst[mask])), shape=(n, n))
+            links.sum_duplicates()
+            links.data[:] = 1
+            holders = np.asarray(links.sum(axis=0)).ravel()
+            # 超级属性实体(关联账户过多)会让两跳展开爆炸，且区分度低，直接剔除
+            keep = sp.diags(((holders > 1) & (holders <= self.max_shared_degree)).astype(np.float64))
+            shared_links = (links @ keep).tocsr()
+            shared_links.eliminate_zeros()
+            co_holders = (shared_links @ shared_links.T).tocsr()
+            co_holders.setdiag(0)
+            co_holders.eliminate_zeros()
+            self._state[f'shared_{relation_type}_accounts'] = np.diff(co_holders.indptr)
+            self._state[f'shared_{relation_type}_count'] = np.diff(shared_links.indptr)
+
+    def features(self, entity_ids: Iterable[str] = None, entity_type: str = None) -> pd.DataFrame:
+        """取出部分实体的特征行
+
+        Args:
+            entity_ids: 实体ID列表，None表示全部
+            entity_type: 只保留该类型的实体
+
+        Returns:
+            特征表
+        """
+        table = self.compute()
+        if entity_type is not None:
+            table = table.loc[table.index.intersection(self.kg.get_entities_by_type(entity_type))]
+        if entity_ids is not None:
+            table = table.reindex(list(entity_ids))
+        return table
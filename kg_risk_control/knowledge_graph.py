@@ -1,11 +1,21 @@
 import networkx as nx
 import matplotlib.pyplot as plt
+from matplotlib.collections import LineCollection
+import numpy as np
 import pandas as pd
+import scipy.sparse as sp
+import bisect
 import json
 import os
-from typing import Dict, List, Any, Tuple, Set
+from collections import deque
+from itertools import islice
+from typing import Dict, List, Any, Tuple, Set, Callable, Iterable, Iterator
 import logging
 
+from compact_graph import (CompactFinancialKnowledgeGraph, BIDIRECTIONAL_MIN_DEPTH, DELTA_REBUILD_MIN,
+                           DELTA_REBUILD_RATIO, K_SHORTEST_MAX_DEPTH)
+from graph_features import label_propagation
+
 # 配置日志
 logging.basicConfig(
     level=logging.INFO,
@@ -13,14 +23,166 @@ logging.basicConfig(
 )
 logger = logging.getLogger("KG_Risk_Control")
 
+# 节点数不超过该值时用全图力导向布局，否则用多层(社区)布局
+LAYOUT_SPRING_MAX_NODES = 2000
+# 多层布局中，社区规模在[LAYOUT_LOCAL_MIN_NODES, LAYOUT_LOCAL_MAX_NODES]内时在社区内部做力导向布局，否则螺旋排布
+LAYOUT_LOCAL_MIN_NODES = 8
+LAYOUT_LOCAL_MAX_NODES = 300
+# 多层布局中参与社区级力导向布局的最大社区数
+LAYOUT_OVERVIEW_MAX = 500
+
+def _row_neighbors(adjacency: sp.csr_matrix, delta: Dict[int, Set[int]], row: int) -> np.ndarray:
+    """节点在CSR矩阵中的邻居并上增量邻接表中的邻居(去重有序)；矩阵构建后新增的节点没有矩阵行"""
+    base = adjacency.indices[adjacency.indptr[row]:adjacency.indptr[row + 1]] if row < adjacency.shape[0] else []
+    extra = delta.get(row)
+    return np.union1d(base, list(extra)).astype(np.int64) if extra else np.asarray(base, dtype=np.int64)
+
+
+def _k_hop(adjacency: sp.csr_matrix, seeds: np.ndarray, depth: int, max_degree: int = None,
+           seed: int = None, delta: Dict[int, Set[int]] = None) -> np.ndarray:
+    """在CSR邻接矩阵上从种子节点做k跳扩展，返回覆盖到的节点下标(有序)
+    
+    每一跳只取出前沿节点对应的行(稀疏矩阵乘稀疏前沿向量)，代价与邻域大小有关而与全图规模无关。
+    度数超过max_degree的超级节点只随机采样max_degree个邻居继续扩展。
+    delta为矩阵构建后新增的无向边(节点下标 -> 邻居下标集合)，扩展时一并并入。
+    """
+    rng = np.random.default_rng(seed)
+    delta = delta or {}
+    built = adjacency.shape[0]
+    base_degree = np.diff(adjacency.indptr)
+    visited = np.unique(seeds)
+    frontier = visited
+    for _ in range(depth):
+        if frontier.size == 0:
+            break
+        hubs = frontier[:0]
+        if max_degree is not None:
+            degree = np.zeros(frontier.size, dtype=np.int64)
+            inside = frontier < built
+            degree[inside] = base_degree[frontier[inside]]
+            if delta:
+                degree += np.fromiter((len(delta.get(i, ())) for i in frontier.tolist()), dtype=np.int64,
+                                      count=frontier.size)
+            hubs = frontier[degree > max_degree]
+            frontier = frontier[degree <= max_degree]
+        rows = frontier[frontier < built]
+        reached = [adjacency[rows].indices] if rows.size else []
+        reached += [np.fromiter(delta[i], dtype=np.int64) for i in frontier.tolist() if i in delta]
+        for hub in hubs:
+            row = _row_neighbors(adjacency, delta, hub)
+            reached.append(rng.choice(row, max_degree, replace=False))
+        if not reached:
+            break
+        frontier = np.setdiff1d(np.concatenate(reached), visited)
+        visited = np.union1d(visited, frontier)
+    return visited
+
+def _force_layout(adjacency: sp.spmatrix, seed: int, iterations: int = 50) -> np.ndarray:
+    """Fruchterman-Reingold力导向布局的稠密NumPy实现，坐标缩放到[-1, 1]，适合几百个节点以内的图"""
+    m = adjacency.shape[0]
+    rng = np.random.default_rng(seed)
+    pos = rng.uniform(-1, 1, (m, 2))
+    if m > 1:
+        weights = adjacency.toarray()
+        k = np.sqrt(1.0 / m)
+        t = 0.1
+        for _ in range(iterations):
+            delta = pos[:, None, :] - pos[None, :, :]
+            distance = np.clip(np.linalg.norm(delta, axis=-1), 0.01, None)
+            displacement = np.einsum('ijk,ij->ik', delta, k * k / distance ** 2 - weights * distance / k)
+            length = np.linalg.norm(displacement, axis=-1)
+            length = np.where(length < 0.01, 0.1, length)
+            pos += displacement * (t / length)[:, None]
+            t -= 0.1 / (iterations + 1)
+    pos -= pos.mean(axis=0)
+    scale = np.abs(pos).max()
+    return pos / scale if scale > 0 else pos
+
+class AttributeIndex:
+    """实体或关系属性上的二级索引
+    
+    hash索引按属性值等值查找；sorted索引另外维护按值有序的数组，支持范围查找。
+    键为实体ID或(源实体ID, 目标实体ID)。sorted索引要求属性值之间可以比较大小。
+    """
+    
+    def __init__(self, attribute: str, kind: str = 'hash'):
+        """初始化属性索引
+        
+        Args:
+            attribute: 属性名
+            kind: 'hash'或'sorted'
+        """
+        if kind not in ('hash', 'sorted'):
+            raise ValueError(f"不支持的索引类型: {kind}")
+        self.attribute = attribute
+        self.kind = kind
+        self._buckets: Dict[Any, Dict[Any, None]] = {}
+        self._sorted_values: List[Any] = []
+        self._sorted_keys: List[Any] = []
+    
+    def add(self, key: Any, value: Any):
+        """登记键的属性值，值为None时忽略"""
+        if value is None:
+            return
+        self._buckets.setdefault(value, {})[key] = None
+        if self.kind == 'sorted':
+            position = bisect.bisect_right(self._sorted_values, value)
+            self._sorted_values.insert(position, value)
+            self._sorted_keys.insert(position, key)
+    
+    def remove(self, key: Any, value: Any):
+        """撤销键的属性值登记"""
+        bucket = self._buckets.get(value) if value is not None else None
+        if bucket is None or key not in bucket:
+            return
+        del bucket[key]
+        if not bucket:
+            del self._buckets[value]
+        if self.kind == 'sorted':
+            start = bisect.bisect_left(self._sorted_values, value)
+            end = bisect.bisect_right(self._sorted_values, value)
+            position = start + self._sorted_keys[start:end].index(key)
+            del self._sorted_values[position]
+            del self._sorted_keys[position]
+    
+    def lookup(self, value: Any) -> List[Any]:
+        """属性值等于value的键列表"""
+        return list(self._buckets.get(value, ()))
+    
+    def range(self, low: Any = None, high: Any = None) -> List[Any]:
+        """属性值在[low, high]内的键列表，按属性值升序；None表示该端不设界"""
+        if self.kind != 'sorted':
+            raise ValueError(f"属性{self.attribute}上是hash索引，不支持范围查找")
+        start = 0 if low is None else bisect.bisect_left(self._sorted_values, low)
+        end = len(self._sorted_values) if high is None else bisect.bisect_right(self._sorted_values, high)
+        return self._sorted_keys[start:end]
+
 class FinancialKnowledgeGraph:
-    """金融知识图谱类"""
+    """金融知识图谱类
+
+    通过add_entity/add_relation写入时二级索引与邻接缓存增量维护；
+    直接修改self.graph(如批量add_nodes_from/add_edges_from)后须调用invalidate()。
+    """
     
     def __init__(self):
         """初始化金融知识图谱"""
         self.graph = nx.DiGraph()
         self.entity_types = set()
         self.relation_types = set()
+        self._adjacency = None
+        # 无向邻接矩阵构建后新增的边：节点下标 -> 新邻居下标，局部查询时并入，积累到阈值后整体重建
+        self._adjacency_delta: Dict[int, Set[int]] = {}
+        self._adjacency_delta_edges = 0
+        self._community_cache = None
+        self._layout: Dict[str, np.ndarray] = None
+        
+        # 二级索引：实体类型 -> 实体ID，关系类型 -> 实体 -> 邻居(出/入两个方向)，以及按需声明的属性索引
+        # 值用dict充当有序集合；为None表示需要从图中重建
+        self._type_index: Dict[str, Dict[str, None]] = {}
+        self._out_index: Dict[str, Dict[str, Dict[str, None]]] = {}
+        self._in_index: Dict[str, Dict[str, Dict[str, None]]] = {}
+        self._index_specs: Dict[Tuple[str, str], str] = {}
+        self._attribute_indexes: Dict[Tuple[str, str], AttributeIndex] = {}
     
     def add_entity(self, entity_id: str, entity_type: str, attributes: Dict = None):
         """添加实体到图谱
@@ -36,7 +198,13 @@ class FinancialKnowledgeGraph:
         attributes['entity_type'] = entity_type
         self.entity_types.add(entity_type)
         
+        self._ensure_writable()
+        old = dict(self.graph.nodes[entity_id]) if entity_id in self.graph else None
         self.graph.add_node(entity_id, **attributes)
+        if old is None:
+            self._adjacency_add_node(entity_id)
+        if self._type_index is not None:
+            self._index_entity(entity_id, old, self.graph.nodes[entity_id])
         logger.debug(f"添加实体: {entity_id}, 类型: {entity_type}")
     
     def add_relation(self, source_id: str, target_id: str, relation_type: str, attributes: Dict = None):
@@ -54,7 +222,15 @@ class FinancialKnowledgeGraph:
         attributes['relation_type'] = relation_type
         self.relation_types.add(relation_type)
         
+        self._ensure_writable()
+        old = dict(self.graph.edges[source_id, target_id]) if self.graph.has_edge(source_id, target_id) else None
+        self._adjacency_add_node(source_id)
+        self._adjacency_add_node(target_id)
         self.graph.add_edge(source_id, target_id, **attributes)
+        if old is None:
+            self._adjacency_add_edge(source_id, target_id)
+        if self._type_index is not None:
+            self._index_relation(source_id, target_id, old, self.graph.edges[source_id, target_id])
         logger.debug(f"添加关系: {source_id} --[{relation_type}]--> {target_id}")
     
     def get_entity(self, entity_id: str) -> Dict:
@@ -70,17 +246,29 @@ class FinancialKnowledgeGraph:
             return dict(self.graph.nodes[entity_id])
         return None
     
-    def get_relations(self, entity_id: str, direction: str = 'out') -> List[Tuple]:
+    def get_relations(self, entity_id: str, direction: str = 'out',
+                      relation_types: Iterable[str] = None) -> List[Tuple]:
         """获取实体的关系
         
         Args:
             entity_id: 实体ID
             direction: 关系方向，'out'表示出边，'in'表示入边，'both'表示双向
+            relation_types: 只返回这些类型的关系(走关系类型索引)，None表示全部
             
         Returns:
             关系列表
         """
         relations = []
+        if relation_types is not None:
+            self._ensure_indexes()
+            for relation_type in relation_types:
+                if direction in ['out', 'both']:
+                    for target_id in self._out_index.get(relation_type, {}).get(entity_id, ()):
+                        relations.append(('out', target_id, self.graph.edges[entity_id, target_id]))
+                if direction in ['in', 'both']:
+                    for source_id in self._in_index.get(relation_type, {}).get(entity_id, ()):
+                        relations.append(('in', source_id, self.graph.edges[source_id, entity_id]))
+            return relations
         
         if direction in ['out', 'both']:
             for _, target_id, data in self.graph.out_edges(entity_id, data=True):
@@ -92,37 +280,358 @@ class FinancialKnowledgeGraph:
                 
         return relations
     
-    def find_path(self, source_id: str, target_id: str, max_depth: int = 3) -> List[List[Tuple]]:
+    def _ensure_writable(self):
+        """get_subgraph返回的只读视图在第一次写入前复制为独立的图；节点顺序不变，已建的索引仍然有效"""
+        if nx.is_frozen(self.graph):
+            self.graph = self.graph.copy()
+
+    def invalidate(self):
+        """直接修改self.graph后调用：丢弃二级索引与邻接缓存，下次查询时重建"""
+        self._adjacency = None
+        self._adjacency_delta = {}
+        self._adjacency_delta_edges = 0
+        self._type_index = None
+        self._out_index = None
+        self._in_index = None
+        self._attribute_indexes = {}
+    
+    def _ensure_indexes(self):
+        """按需从图中重建类型索引、关系类型索引和已声明的属性索引"""
+        if self._type_index is not None:
+            return
+        self._type_index = {}
+        self._out_index = {}
+        self._in_index = {}
+        self._attribute_indexes = {key: AttributeIndex(key[1], kind) for key, kind in self._index_specs.items()}
+        for node, attrs in self.graph.nodes(data=True):
+            self._index_entity(node, None, attrs)
+        for source, target, attrs in self.graph.edges(data=True):
+            self._index_relation(source, target, None, attrs)
+    
+    def _index_entity(self, entity_id: str, old: Dict, new: Dict):
+        """实体属性从old变为new时更新索引，old为None表示新实体"""
+        old = old or {}
+        old_type, new_type = old.get('entity_type'), new.get('entity_type')
+        if old_type != new_type:
+            if old_type is not None:
+                self._type_index.get(old_type, {}).pop(entity_id, None)
+            if new_type is not None:
+                self._type_index.setdefault(new_type, {})[entity_id] = None
+        for (target, attribute), index in self._attribute_indexes.items():
+            if target == 'entity' and old.get(attribute) != new.get(attribute):
+                index.remove(entity_id, old.get(attribute))
+                index.add(entity_id, new.get(attribute))
+    
+    def _index_relation(self, source_id: str, target_id: str, old: Dict, new: Dict):
+        """关系属性从old变为new时更新索引，old为None表示新关系"""
+        old = old or {}
+        old_type, new_type = old.get('relation_type'), new.get('relation_type')
+        if old_type != new_type:
+            if old_type is not None:
+                self._out_index.get(old_type, {}).get(source_id, {}).pop(target_id, None)
+                self._in_index.get(old_type, {}).get(target_id, {}).pop(source_id, None)
+            if new_type is not None:
+                self._out_index.setdefault(new_type, {}).setdefault(source_id, {})[target_id] = None
+                self._in_index.setdefault(new_type, {}).setdefault(target_id, {})[source_id] = None
+        for (target, attribute), index in self._attribute_indexes.items():
+            if target == 'relation' and old.get(attribute) != new.get(attribute):
+                index.remove((source_id, target_id), old.get(attribute))
+                index.add((source_id, target_id), new.get(attribute))
+    
+    def create_index(self, attribute: str, kind: str = 'hash', target: str = 'relation'):
+        """在实体或关系属性上建立二级索引，之后的写入会同步维护
+        
+        Args:
+            attribute: 属性名，如amount、timestamp
+            kind: 'hash'支持等值查找，'sorted'另外支持范围查找
+            target: 'entity'或'relation'
+        """
+        if target not in ('entity', 'relation'):
+            raise ValueError(f"不支持的索引对象: {target}")
+        index = AttributeIndex(attribute, kind)
+        self._index_specs[(target, attribute)] = kind
+        if self._type_index is None:
+            return
+        if target == 'entity':
+            for node, value in self.graph.nodes(data=attribute):
+                index.add(node, value)
+        else:
+            for source, target_id, value in self.graph.edges(data=attribute):
+                index.add((source, target_id), value)
+        self._attribute_indexes[(target, attribute)] = index
+        logger.info(f"已在{target}属性{attribute}上建立{kind}索引")
+    
+    def _attribute_index(self, attribute: str, target: str) -> AttributeIndex:
+        """取出已建立的属性索引"""
+        if (target, attribute) not in self._index_specs:
+            raise KeyError(f"{target}属性{attribute}上没有索引，请先调用create_index")
+        self._ensure_indexes()
+        return self._attribute_indexes[(target, attribute)]
+    
+    def _index_results(self, keys: List[Any], target: str) -> List[Any]:
+        """把索引键还原为实体ID列表或(源实体ID, 目标实体ID, 关系属性)列表"""
+        if target == 'entity':
+            return list(keys)
+        return [(source, target_id, self.graph.edges[source, target_id]) for source, target_id in keys]
+    
+    def lookup(self, attribute: str, value: Any, target: str = 'relation') -> List[Any]:
+        """按属性值等值查找
+        
+        Args:
+            attribute: 已建立索引的属性名
+            value: 属性值
+            target: 'entity'或'relation'
+            
+        Returns:
+            实体ID列表，或(源实体ID, 目标实体ID, 关系属性)列表
+        """
+        return self._index_results(self._attribute_index(attribute, target).lookup(value), target)
+    
+    def range_lookup(self, attribute: str, low: Any = None, high: Any = None,
+                     target: str = 'relation') -> List[Any]:
+        """按属性值范围查找，需要sorted索引
+        
+        Args:
+            attribute: 已建立sorted索引的属性名
+            low: 下界(含)，None表示不限
+            high: 上界(含)，None表示不限
+            target: 'entity'或'relation'
+            
+        Returns:
+            按属性值升序的实体ID列表，或(源实体ID, 目标实体ID, 关系属性)列表
+        """
+        return self._index_results(self._attribute_index(attribute, target).range(low, high), target)
+    
+    def get_entities_by_type(self, entity_type: str) -> List[str]:
+        """获取指定类型的全部实体ID
+        
+        Args:
+            entity_type: 实体类型
+            
+        Returns:
+            实体ID列表
+        """
+        self._ensure_indexes()
+        return list(self._type_index.get(entity_type, ()))
+    
+    def relation_pairs(self, relation_type: str) -> Iterator[Tuple[str, str]]:
+        """遍历指定类型的全部(源实体ID, 目标实体ID)关系对
+        
+        Args:
+            relation_type: 关系类型
+        """
+        self._ensure_indexes()
+        for source_id, targets in list(self._out_index.get(relation_type, {}).items()):
+            for target_id in list(targets):
+                yield source_id, target_id
+    
+    def find_path(self, source_id: str, target_id: str, max_depth: int = 3, max_paths: int = None,
+                  relation_types: Iterable[str] = None, entity_types: Iterable[str] = None,
+                  k_shortest: int = None) -> List[List[Tuple]]:
         """查找两个实体之间的路径
         
         Args:
             source_id: 源实体ID
             target_id: 目标实体ID
             max_depth: 最大深度
+            max_paths: 最多返回的路径数量，None表示不限
+            relation_types: 只沿这些类型的关系搜索，None表示全部
+            entity_types: 中间实体须属于这些类型，None表示全部
+            k_shortest: 若指定，按跳数从短到长返回前k条路径
             
         Returns:
             路径列表
         """
-        try:
-            paths = list(nx.all_simple_paths(self.graph, source_id, target_id, cutoff=max_depth))
-            result = []
+        if k_shortest is not None:
+            paths = self.k_shortest_paths(source_id, target_id, k_shortest, max_depth, relation_types, entity_types)
+        else:
+            paths = self.iter_paths(source_id, target_id, max_depth, relation_types, entity_types, max_paths)
+        return list(paths)
+    
+    def _path_filters(self, source_id: str, target_id: str, relation_types: Iterable[str] = None,
+                      entity_types: Iterable[str] = None) -> Tuple[Callable, Callable]:
+        """构造路径搜索用的边过滤(按关系类型)和节点过滤(按中间实体类型)函数"""
+        relation_types = set(relation_types) if relation_types is not None else None
+        entity_types = set(entity_types) if entity_types is not None else None
+        
+        def edge_ok(data: Dict) -> bool:
+            return relation_types is None or data.get('relation_type') in relation_types
+        
+        def node_ok(node: str) -> bool:
+            if entity_types is None or node == source_id or node == target_id:
+                return True
+            return self.graph.nodes[node].get('entity_type') in entity_types
+        
+        return edge_ok, node_ok
+    
+    def iter_paths(self, source_id: str, target_id: str, max_depth: int = 3,
+                   relation_types: Iterable[str] = None, entity_types: Iterable[str] = None,
+                   max_paths: int = None) -> Iterator[List[Tuple]]:
+        """逐条生成两个实体之间的路径，调用方可随时停止
+        
+        max_depth不小于BIDIRECTIONAL_MIN_DEPTH时，先从目标沿入边反向BFS得到各实体到目标的最短跳数，
+        正向DFS时剪掉无法在剩余深度内到达目标的分支，两端相向搜索、在中间汇合。
+        
+        Args:
+            source_id: 源实体ID
+            target_id: 目标实体ID
+            max_depth: 最大深度
+            relation_types: 只沿这些类型的关系搜索，None表示全部
+            entity_types: 中间实体须属于这些类型，None表示全部
+            max_paths: 最多生成的路径数量，None表示不限
             
-            for path in paths:
-                path_with_relations = []
-                for i in range(len(path) - 1):
-                    source = path[i]
-                    target = path[i + 1]
-                    edge_data = self.graph.get_edge_data(source, target)
-                    path_with_relations.append((source, target, edge_data))
-                result.append(path_with_relations)
-                
-            return result
-        except nx.NetworkXNoPath:
-            return []
+        Yields:
+            路径，每一跳为(源实体ID, 目标实体ID, 关系属性)
+        """
+        if source_id not in self.graph or target_id not in self.graph or source_id == target_id or max_paths == 0:
+            return
+        edge_ok, node_ok = self._path_filters(source_id, target_id, relation_types, entity_types)
+        
+        dist_back = None
+        if max_depth >= BIDIRECTIONAL_MIN_DEPTH:
+            dist_back = {target_id: 0}
+            queue = deque([target_id])
+            while queue:
+                node = queue.popleft()
+                if dist_back[node] >= max_depth - 1:
+                    continue
+                for predecessor, _, data in self.graph.in_edges(node, data=True):
+                    if predecessor not in dist_back and edge_ok(data) and node_ok(predecessor):
+                        dist_back[predecessor] = dist_back[node] + 1
+                        queue.append(predecessor)
+        
+        count = 0
+        path = [source_id]
+        hops: List[Dict] = []
+        on_path = {source_id}
+        stack = [iter(self.graph.out_edges(source_id, data=True))]
+        
+        while stack:
+            edge = next(stack[-1], None)
+            if edge is None:
+                stack.pop()
+                on_path.discard(path.pop())
+                if hops:
+                    hops.pop()
+                continue
+            
+            _, neighbor, data = edge
+            if neighbor in on_path or not edge_ok(data):
+                continue
+            
+            depth = len(path)
+            if neighbor == target_id:
+                nodes = path + [target_id]
+                edges = hops + [data]
+                yield [(nodes[i], nodes[i + 1], edges[i]) for i in range(len(edges))]
+                count += 1
+                if max_paths is not None and count >= max_paths:
+                    return
+            elif depth < max_depth and node_ok(neighbor):
+                if dist_back is not None and (neighbor not in dist_back or depth + dist_back[neighbor] > max_depth):
+                    continue
+                path.append(neighbor)
+                hops.append(data)
+                on_path.add(neighbor)
+                stack.append(iter(self.graph.out_edges(neighbor, data=True)))
+    
+    def k_shortest_paths(self, source_id: str, target_id: str, k: int, max_depth: int = K_SHORTEST_MAX_DEPTH,
+                         relation_types: Iterable[str] = None, entity_types: Iterable[str] = None,
+                         weight: str = None) -> Iterator[List[Tuple]]:
+        """按长度从短到长生成前k条路径
+        
+        Args:
+            source_id: 源实体ID
+            target_id: 目标实体ID
+            k: 路径数量
+            max_depth: 最大深度，None表示不限
+            relation_types: 只沿这些类型的关系搜索，None表示全部
+            entity_types: 中间实体须属于这些类型，None表示全部
+            weight: 作为边长度的属性名，None表示按跳数
+            
+        Yields:
+            路径，每一跳为(源实体ID, 目标实体ID, 关系属性)
+        """
+        edge_ok, node_ok = self._path_filters(source_id, target_id, relation_types, entity_types)
+        view = nx.subgraph_view(
+            self.graph,
+            filter_node=node_ok,
+            filter_edge=lambda u, v: edge_ok(self.graph.edges[u, v])
+        )
+        try:
+            for path in islice(nx.shortest_simple_paths(view, source_id, target_id, weight=weight), k):
+                if max_depth is not None and len(path) - 1 > max_depth:
+                    if weight is None:
+                        return
+                    continue
+                yield [(path[i], path[i + 1], self.graph.get_edge_data(path[i], path[i + 1]))
+                       for i in range(len(path) - 1)]
+        except (nx.NetworkXNoPath, nx.NodeNotFound):
+            return
+    
+    def _adjacency_add_node(self, entity_id: str):
+        """新实体追加到已构建邻接矩阵的节点顺序末尾，矩阵本身不变"""
+        if self._adjacency is not None and entity_id not in self._adjacency[2]:
+            nodes, index = self._adjacency[1], self._adjacency[2]
+            index[entity_id] = len(nodes)
+            nodes.append(entity_id)
+
+    def _adjacency_add_edge(self, source_id: str, target_id: str):
+        """新关系记入增量邻接表，不丢弃已构建的矩阵"""
+        if self._adjacency is None:
+            return
+        index = self._adjacency[2]
+        source, target = index[source_id], index[target_id]
+        self._adjacency_delta.setdefault(source, set()).add(target)
+        self._adjacency_delta.setdefault(target, set()).add(source)
+        self._adjacency_delta_edges += 1
+
+    def _local_adjacency(self) -> Tuple[sp.csr_matrix, Dict[int, Set[int]], List[str], Dict[str, int]]:
+        """供局部查询使用的(矩阵, 增量邻接表, 节点顺序, 节点下标)
+
+        少量新增边不合并进矩阵，由查询在访问到的行上并入，使逐条写入后的局部查询不必O(E)重建；
+        增量超过 max(DELTA_REBUILD_MIN, 矩阵非零元数 * DELTA_REBUILD_RATIO) 时才整体合并。
+        """
+        if self._adjacency is not None:
+            threshold = max(DELTA_REBUILD_MIN, int(self._adjacency[0].nnz * DELTA_REBUILD_RATIO))
+            if self._adjacency_delta_edges <= threshold:
+                return self._adjacency[0], self._adjacency_delta, self._adjacency[1], self._adjacency[2]
+        adjacency, nodes, index = self._undirected_adjacency()
+        return adjacency, {}, nodes, index
+
+    def _undirected_adjacency(self) -> Tuple[sp.csr_matrix, List[str], Dict[str, int]]:
+        """完整的无向邻接矩阵(CSR)、节点顺序及节点下标，构建后缓存
+
+        add_entity/add_relation不丢弃矩阵，只追加节点并记录增量边，这里把增量合并进矩阵。
+        """
+        if self._adjacency is None:
+            nodes = list(self.graph.nodes)
+            index = {node: i for i, node in enumerate(nodes)}
+            directed = nx.to_scipy_sparse_array(self.graph, nodelist=nodes, weight=None, format='csr')
+            undirected = sp.csr_matrix(directed + directed.T)
+            undirected.data[:] = 1
+            self._adjacency = (undirected, nodes, index)
+        elif self._adjacency_delta or self._adjacency[0].shape[0] < len(self._adjacency[1]):
+            matrix, nodes, index = self._adjacency
+            n = len(nodes)
+            rows = [row for row, columns in self._adjacency_delta.items() for _ in columns]
+            columns = [column for neighbors in self._adjacency_delta.values() for column in neighbors]
+            extra = sp.csr_matrix((np.ones(len(rows), dtype=matrix.dtype), (rows, columns)), shape=(n, n))
+            base = matrix.copy()
+            base.resize((n, n))
+            merged = sp.csr_matrix(base + extra)
+            merged.data[:] = 1
+            self._adjacency = (merged, nodes, index)
+            self._adjacency_delta = {}
+            self._adjacency_delta_edges = 0
+        return self._adjacency
     
     def find_common_neighbors(self, entity_ids: List[str]) -> Dict[str, Set[str]]:
         """查找多个实体的共同邻居
         
+        取出各实体在无向邻接矩阵中的行，出现次数等于实体数的列即为共同邻居，
+        代价只与这些实体的度数之和有关。
+        
         Args:
             entity_ids: 实体ID列表
             
@@ -131,95 +640,335 @@ class FinancialKnowledgeGraph:
         """
         if not entity_ids:
             return {}
-            
-        neighbors = {}
-        for entity_id in entity_ids:
-            neighbors[entity_id] = set(self.graph.successors(entity_id)) | set(self.graph.predecessors(entity_id))
-            
-        common = set.intersection(*neighbors.values()) if neighbors else set()
+        
+        adjacency, delta, nodes, index = self._local_adjacency()
+        rows = sorted({index[entity_id] for entity_id in entity_ids if entity_id in index})
+        common = set()
+        if len(rows) == len(set(entity_ids)):
+            neighbors = [_row_neighbors(adjacency, delta, row) for row in rows]
+            columns, counts = np.unique(np.concatenate(neighbors), return_counts=True)
+            common = {nodes[i] for i in columns[counts == len(rows)]}
         return {entity_id: common for entity_id in entity_ids}
     
-    def get_subgraph(self, entity_ids: List[str], depth: int = 1) -> 'FinancialKnowledgeGraph':
+    def get_subgraph(self, entity_ids: List[str], depth: int = 1, max_degree: int = None,
+                     seed: int = None) -> 'FinancialKnowledgeGraph':
         """获取以指定实体为中心的子图
         
+        返回的子图起初是原图的视图，不复制节点和边；第一次写入时才复制为独立的图，不影响原图。
+        类型集合为副本，不与原图共享。
+        
         Args:
             entity_ids: 实体ID列表
             depth: 扩展深度
+            max_degree: 若指定，度数超过该值的超级节点只随机采样max_degree个邻居继续扩展
+            seed: 采样的随机种子
             
         Returns:
             子图
         """
-        nodes_to_include = set(entity_ids)
-        frontier = set(entity_ids)
-        
-        for _ in range(depth):
-            new_frontier = set()
-            for node in frontier:
-                new_frontier.update(self.graph.successors(node))
-                new_frontier.update(self.graph.predecessors(node))
-            frontier = new_frontier - nodes_to_include
-            nodes_to_include.update(frontier)
-        
-        subgraph = self.graph.subgraph(nodes_to_include)
+        adjacency, delta, nodes, index = self._local_adjacency()
+        seeds = np.array([index[entity_id] for entity_id in entity_ids if entity_id in index], dtype=np.int64)
+        covered = _k_hop(adjacency, seeds, depth, max_degree, seed, delta)
         
         result = FinancialKnowledgeGraph()
-        result.graph = subgraph
-        result.entity_types = self.entity_types
-        result.relation_types = self.relation_types
+        result.graph = self.graph.subgraph([nodes[i] for i in covered])
+        result._index_specs = dict(self._index_specs)
+        result.invalidate()
+        result.entity_types = set(self.entity_types)
+        result.relation_types = set(self.relation_types)
         
         return result
     
-    def visualize(self, output_path: str = None, figsize: Tuple[int, int] = (12, 10)):
-        """可视化知识图谱
+    def _communities(self) -> Tuple[List[str], np.ndarray]:
+        """标签传播得到的社区划分(节点顺序, 社区编号数组，0为最大社区)，结构变化前缓存"""
+        adjacency, nodes, _ = self._undirected_adjacency()
+        if self._community_cache is None or self._community_cache[0] is not adjacency:
+            self._community_cache = (adjacency, label_propagation(adjacency))
+        return nodes, self._community_cache[1]
+    
+    def compute_layout(self, method: str = 'auto', seed: int = 42, layout_path: str = None,
+                       recompute: bool = False) -> Dict[str, np.ndarray]:
+        """计算并缓存节点坐标
+        
+        坐标按节点缓存在图谱对象上，之后新增的节点放在已定位邻居的重心附近，不必重算整张图。
         
         Args:
-            output_path: 输出文件路径
-            figsize: 图像大小
+            method: 'spring'为全图力导向布局(O(n²)，仅适合小图)；'multilevel'先把社区折叠为单个点
+                    布局社区中心，再在各社区内部做局部布局；'auto'按节点数选择
+            seed: 随机种子
+            layout_path: 若指定，从该.npz文件读取缓存的坐标，计算后写回
+            recompute: 忽略已有缓存重新计算
+            
+        Returns:
+            实体ID -> 二维坐标
         """
-        plt.figure(figsize=figsize)
+        if recompute:
+            self._layout = None
+        if self._layout is None and layout_path and os.path.exists(layout_path):
+            stored = np.load(layout_path, allow_pickle=False)
+            self._layout = dict(zip(stored['nodes'].tolist(), stored['positions']))
+            logger.info(f"已从{layout_path}加载布局缓存")
+        
+        if self._layout is None:
+            if method == 'auto':
+                method = 'spring' if self.graph.number_of_nodes() <= LAYOUT_SPRING_MAX_NODES else 'multilevel'
+            if method == 'spring':
+                self._layout = nx.spring_layout(self.graph, seed=seed)
+            elif method == 'multilevel':
+                self._layout = self._multilevel_layout(seed)
+            else:
+                raise ValueError(f"不支持的布局方法: {method}")
+            if layout_path:
+                np.savez(layout_path, nodes=np.asarray(list(self._layout), dtype=str),
+                         positions=np.asarray(list(self._layout.values())))
         
-        # 设置节点颜色映射
-        entity_types = list(self.entity_types)
-        color_map = {}
-        for i, entity_type in enumerate(entity_types):
-            color_map[entity_type] = plt.cm.tab10(i / len(entity_types))
-        
-        # 获取节点颜色
-        node_colors = []
-        for node in self.graph.nodes():
-            entity_type = self.graph.nodes[node].get('entity_type', 'unknown')
-            node_colors.append(color_map.get(entity_type, 'gray'))
-        
-        # 绘制图形
-        pos = nx.spring_layout(self.graph, seed=42)
-        nx.draw_networkx_nodes(self.graph, pos, node_color=node_colors, alpha=0.8, node_size=500)
-        nx.draw_networkx_edges(self.graph, pos, alpha=0.5, arrows=True)
-        nx.draw_networkx_labels(self.graph, pos, font_size=10)
-        
-        # 添加图例
+        missing = [node for node in self.graph.nodes if node not in self._layout]
+        if missing:
+            rng = np.random.default_rng(seed)
+            for node in missing:
+                placed = [self._layout[n] for n in nx.all_neighbors(self.graph, node) if n in self._layout]
+                center = np.mean(placed, axis=0) if placed else rng.uniform(-1, 1, 2)
+                self._layout[node] = center + rng.normal(0, 0.01, 2)
+        return self._layout
+    
+    def _multilevel_layout(self, seed: int) -> Dict[str, np.ndarray]:
+        """社区级布局 + 社区内局部布局
+        
+        最大的LAYOUT_OVERVIEW_MAX个社区做力导向布局，其余小社区贴在与其连边最多的大社区旁；
+        社区内部规模适中时做局部力导向布局，过小或过大时螺旋排布。
+        """
+        nodes, labels = self._communities()
+        adjacency, _, _ = self._undirected_adjacency()
+        count = int(labels.max()) + 1 if len(labels) else 0
+        rng = np.random.default_rng(seed)
+        
+        # 社区间的边数作为社区级布局的权重
+        coo = adjacency.tocoo()
+        between = sp.coo_matrix((np.ones(len(coo.row)), (labels[coo.row], labels[coo.col])), shape=(count, count)).tocsr()
+        between.setdiag(0)
+        between.eliminate_zeros()
+        
+        top = min(count, LAYOUT_OVERVIEW_MAX)
+        weights = between[:top, :top]
+        centers = np.zeros((count, 2))
+        centers[:top] = _force_layout(weights / max(weights.max(), 1), seed)
+        if count > top:
+            links = between[top:, :top]
+            anchors = np.asarray(links.argmax(axis=1)).ravel()
+            linked = np.asarray(links.max(axis=1).todense()).ravel() > 0
+            jitter = rng.normal(0, 0.05, (count - top, 2))
+            k = np.arange(count - top)
+            ring = 1.2 * np.column_stack([np.cos(k * np.pi * (3 - np.sqrt(5))), np.sin(k * np.pi * (3 - np.sqrt(5)))])
+            centers[top:] = np.where(linked[:, None], centers[anchors] + jitter, ring + jitter)
+        
+        sizes = np.bincount(labels, minlength=count)
+        order = np.argsort(labels, kind='stable')
+        bounds = np.concatenate([[0], np.cumsum(sizes)])
+        # 按社区重排后，每个社区的子矩阵都是对角线上的连续块
+        blocks = adjacency[order][:, order]
+        positions = np.zeros((len(nodes), 2))
+        for label in range(count):
+            start, end = bounds[label], bounds[label + 1]
+            radius = 0.5 * np.sqrt(sizes[label] / len(nodes))
+            if LAYOUT_LOCAL_MIN_NODES <= end - start <= LAYOUT_LOCAL_MAX_NODES:
+                local = _force_layout(blocks[start:end, start:end], seed, iterations=30)
+            else:
+                # 黄金角螺旋排布：O(m)，在圆盘内均匀分布
+                k = np.arange(end - start)
+                r = np.sqrt((k + 0.5) / (end - start))
+                theta = k * np.pi * (3 - np.sqrt(5))
+                local = np.column_stack([r * np.cos(theta), r * np.sin(theta)])
+            positions[order[start:end]] = centers[label] + radius * local
+        logger.info(f"多层布局: {len(nodes)}个实体, {count}个社区")
+        return dict(zip(nodes, positions))
+    
+    def _type_colors(self) -> Dict[str, Any]:
+        """实体类型 -> 颜色"""
+        entity_types = sorted(self.entity_types)
+        return {entity_type: plt.cm.tab10(i / max(len(entity_types), 1)) for i, entity_type in enumerate(entity_types)}
+    
+    def _draw_legend(self, color_map: Dict[str, Any]):
+        """绘制实体类型图例"""
         legend_elements = []
         for entity_type, color in color_map.items():
             legend_elements.append(plt.Line2D([0], [0], marker='o', color='w', 
                                              markerfacecolor=color, markersize=10, label=entity_type))
         plt.legend(handles=legend_elements, loc='upper right')
-        
+    
+    def _finish_figure(self, output_path: str, dpi: int):
+        """保存或显示当前图像"""
         plt.axis('off')
         plt.tight_layout()
         
         if output_path:
-            plt.savefig(output_path, dpi=300, bbox_inches='tight')
+            plt.savefig(output_path, dpi=dpi, bbox_inches='tight')
             logger.info(f"图谱已保存到: {output_path}")
         else:
             plt.show()
         
         plt.close()
     
-    def save(self, file_path: str):
+    def _draw_nodes(self, nodes: List[str], pos: Dict[str, np.ndarray], label_limit: int,
+                    highlight: Iterable[str] = ()):
+        """绘制节点、边和按度数筛选后的标签
+        
+        标签只保留度数最高的label_limit个节点(以及highlight中的节点)；边超过1000条时不画箭头，
+        直接从邻接矩阵取出边并用LineCollection一次绘制。
+        """
+        color_map = self._type_colors()
+        adjacency, _, index = self._undirected_adjacency()
+        rows = np.array([index[node] for node in nodes], dtype=np.int64)
+        local = adjacency[rows][:, rows]
+        positions = np.asarray([pos[node] for node in nodes])
+        node_colors = [color_map.get(self.graph.nodes[node].get('entity_type'), 'gray') for node in nodes]
+        node_size = max(20, min(500, 200000 // max(len(nodes), 1)))
+        
+        edges = sp.triu(local, k=1).tocoo()
+        if edges.nnz <= 1000:
+            view = self.graph.subgraph(nodes)
+            nx.draw_networkx_edges(view, pos, alpha=0.5, arrows=True, node_size=node_size)
+        else:
+            segments = np.stack([positions[edges.row], positions[edges.col]], axis=1)
+            plt.gca().add_collection(LineCollection(segments, linewidths=0.3, colors='gray', alpha=0.15))
+        plt.scatter(positions[:, 0], positions[:, 1], s=node_size, c=node_colors, alpha=0.8, zorder=2)
+        
+        highlight = [node for node in highlight if node in index]
+        if highlight:
+            marked = np.asarray([pos[node] for node in highlight])
+            plt.scatter(marked[:, 0], marked[:, 1], s=node_size * 2, c='red', zorder=3)
+        degrees = np.diff(local.indptr)
+        labeled = {nodes[i] for i in np.argsort(-degrees, kind='stable')[:label_limit]} | set(highlight)
+        font_size = 10 if len(nodes) <= 200 else 6
+        for node in labeled:
+            plt.annotate(str(node), pos[node], fontsize=font_size, ha='center', va='center', zorder=4)
+        self._draw_legend(color_map)
+    
+    def visualize(self, output_path: str = None, figsize: Tuple[int, int] = (12, 10), max_nodes: int = 2000,
+                  label_limit: int = 100, highlight: Iterable[str] = (), dpi: int = 300):
+        """可视化知识图谱
+        
+        节点数不超过max_nodes时逐点绘制，只标注度数最高的label_limit个节点；
+        超过时绘制社区折叠后的概览图，每个点代表一个社区。布局会被缓存复用。
+        
+        Args:
+            output_path: 输出文件路径
+            figsize: 图像大小
+            max_nodes: 逐点绘制的最大节点数
+            label_limit: 最多显示的标签数
+            highlight: 需要突出显示并总是标注的实体ID
+            dpi: 输出分辨率
+        """
+        plt.figure(figsize=figsize)
+        if self.graph.number_of_nodes() <= max_nodes:
+            self._draw_nodes(list(self.graph.nodes), self.compute_layout(), label_limit, highlight)
+        else:
+            self._draw_overview(label_limit)
+        self._finish_figure(output_path, dpi)
+    
+    def _draw_overview(self, label_limit: int):
+        """绘制社区折叠概览：只画最大的LAYOUT_OVERVIEW_MAX个社区，点大小表示社区规模，颜色为社区内最多的实体类型"""
+        nodes, labels = self._communities()
+        layout = self.compute_layout()
+        color_map = self._type_colors()
+        count = int(labels.max()) + 1
+        shown = min(count, LAYOUT_OVERVIEW_MAX)
+        sizes = np.bincount(labels, minlength=count)
+        
+        positions = np.asarray([layout[node] for node in nodes])
+        centers = np.zeros((count, 2))
+        np.add.at(centers, labels, positions)
+        centers /= sizes[:, None]
+        
+        # 社区编号按规模降序，编号小于shown的即为要画的社区
+        type_votes: Dict[int, Dict[str, int]] = {}
+        for node, label in zip(nodes, labels.tolist()):
+            if label < shown:
+                entity_type = self.graph.nodes[node].get('entity_type', 'unknown')
+                votes = type_votes.setdefault(label, {})
+                votes[entity_type] = votes.get(entity_type, 0) + 1
+        dominant = [max(type_votes[label], key=type_votes[label].get) for label in range(shown)]
+        
+        adjacency, _, _ = self._undirected_adjacency()
+        coo = sp.triu(adjacency).tocoo()
+        keep = (labels[coo.row] < shown) & (labels[coo.col] < shown)
+        between = sp.coo_matrix((np.ones(int(keep.sum())), (labels[coo.row[keep]], labels[coo.col[keep]])),
+                                shape=(shown, shown)).tocsr()
+        between.setdiag(0)
+        between.eliminate_zeros()
+        pairs = between.tocoo()
+        segments = np.stack([centers[pairs.row], centers[pairs.col]], axis=1)
+        widths = 0.2 + np.log1p(pairs.data)
+        plt.gca().add_collection(LineCollection(segments, linewidths=widths, colors='gray', alpha=0.3))
+        
+        plt.scatter(centers[:shown, 0], centers[:shown, 1], s=20 + 2000 * np.sqrt(sizes[:shown] / sizes[0]),
+                    c=[color_map.get(t, 'gray') for t in dominant], alpha=0.8, zorder=2)
+        for label in range(min(shown, label_limit)):
+            plt.annotate(f"{dominant[label]} ×{sizes[label]}", centers[label], fontsize=8, ha='center', zorder=3)
+        self._draw_legend(color_map)
+        plt.title(f"{len(nodes)}个实体 / {count}个社区(显示最大的{shown}个)")
+    
+    def visualize_ego(self, entity_id: str, radius: int = 2, output_path: str = None,
+                      max_degree: int = 50, label_limit: int = 50, **kwargs):
+        """绘制实体的ego网络(radius跳内的邻域)，超级节点按max_degree采样
+        
+        Args:
+            entity_id: 中心实体ID
+            radius: 邻域跳数
+            output_path: 输出文件路径
+            max_degree: 超级节点最多展开的邻居数
+            label_limit: 最多显示的标签数
+            **kwargs: 传给visualize的其他参数
+        """
+        ego = self.get_subgraph([entity_id], depth=radius, max_degree=max_degree, seed=0)
+        ego.visualize(output_path, label_limit=label_limit, highlight=[entity_id], **kwargs)
+    
+    def export_tiles(self, output_dir: str, grid: int = 4, figsize: Tuple[int, int] = (8, 8),
+                     label_limit: int = 50, dpi: int = 150) -> List[str]:
+        """按缓存布局把全图切成grid×grid个瓦片分别渲染，空瓦片跳过
+        
+        Args:
+            output_dir: 输出目录
+            grid: 每边的瓦片数
+            figsize: 单个瓦片的图像大小
+            label_limit: 每个瓦片最多显示的标签数
+            dpi: 输出分辨率
+            
+        Returns:
+            生成的瓦片文件路径列表
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        layout = self.compute_layout()
+        nodes = list(self.graph.nodes)
+        positions = np.asarray([layout[node] for node in nodes])
+        low, high = positions.min(axis=0), positions.max(axis=0)
+        cells = np.minimum(((positions - low) / np.maximum(high - low, 1e-9) * grid).astype(int), grid - 1)
+        
+        paths = []
+        for row in range(grid):
+            for col in range(grid):
+                selected = np.flatnonzero((cells[:, 0] == col) & (cells[:, 1] == row))
+                if selected.size == 0:
+                    continue
+                plt.figure(figsize=figsize)
+                self._draw_nodes([nodes[i] for i in selected], layout, label_limit)
+                path = os.path.join(output_dir, f"tile_{row}_{col}.png")
+                self._finish_figure(path, dpi)
+                paths.append(path)
+        return paths
+    
+    def save(self, file_path: str, format: str = 'json'):
         """保存知识图谱到文件
         
         Args:
-            file_path: 文件路径
+            file_path: 文件路径；format为'binary'时为输出目录
+            format: 'json'为可读的JSON文本，'binary'为可内存映射的二进制列存格式
         """
+        if format == 'binary':
+            CompactFinancialKnowledgeGraph.from_graph(self).save_binary(file_path)
+            return
+        if format != 'json':
+            raise ValueError(f"不支持的保存格式: {format}")
+        
         data = {
             'nodes': [],
             'edges': [],
@@ -246,29 +995,49 @@ class FinancialKnowledgeGraph:
     def load(cls, file_path: str) -> 'FinancialKnowledgeGraph':
         """从文件加载知识图谱
         
+        JSON文件与save(format='binary')生成的目录均可加载。实体和关系通过
+        add_nodes_from/add_edges_from批量写入，不逐条经过add_entity/add_relation。
+        
         Args:
-            file_path: 文件路径
+            file_path: 文件路径或二进制存储目录
             
         Returns:
             知识图谱对象
         """
+        kg = cls()
+        if os.path.isdir(file_path):
+            compact = CompactFinancialKnowledgeGraph.load_binary(file_path)
+            kg.entity_types = set(compact.entity_types)
+            kg.relation_types = set(compact.relation_types)
+            kg.graph.add_nodes_from(compact.entities())
+            kg.graph.add_edges_from(compact.relations())
+            kg.invalidate()
+            logger.info(f"已从{file_path}加载知识图谱")
+            return kg
+        
         with open(file_path, 'r', encoding='utf-8') as f:
             data = json.load(f)
         
-        kg = cls()
         kg.entity_types = set(data.get('entity_types', []))
         kg.relation_types = set(data.get('relation_types', []))
         
+        nodes = []
         for node in data.get('nodes', []):
             node_id = node.pop('id')
-            entity_type = node.pop('entity_type', 'unknown')
-            kg.add_entity(node_id, entity_type, node)
+            node.setdefault('entity_type', 'unknown')
+            kg.entity_types.add(node['entity_type'])
+            nodes.append((node_id, node))
+        kg.graph.add_nodes_from(nodes)
         
+        edges = []
         for edge in data.get('edges', []):
             source = edge.pop('source')
             target = edge.pop('target')
-            relation_type = edge.pop('relation_type', 'unknown')
-            kg.add_relation(source, target, relation_type, edge)
+            edge.setdefault('relation_type', 'unknown')
+            kg.relation_types.add(edge['relation_type'])
+            edges.append((source, target, edge))
+        kg.graph.add_edges_from(edges)
+        kg.invalidate()
         
         logger.info(f"已从{file_path}加载知识图谱")
-        return kg
\ No newline at end of file
+        return kg
@@ -0,0 +1,158 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Any, Optional
+import logging
+
+import numpy as np
+import pandas as pd
+
+from risk_rules import RiskRule
+
+logger = logging.getLogger("KG_Risk_Control")
+
+# 工作进程内的只读状态：fork启动时由父进程直接继承(写时复制)，spawn启动时由initializer设置一次
+_WORKER_STATE: Dict[str, Any] = {}
+
+
+def _init_worker(kg, rules: List[RiskRule], shared: Dict[str, Any]):
+    """spawn方式下在每个工作进程中设置一次只读状态"""
+    _WORKER_STATE.update(knowledge_graph=kg, rules=rules, shared=shared)
+
+
+def _evaluate_chunk(account_ids: List[str], include_details: bool) -> List[Dict[str, Any]]:
+    """在工作进程中评估一批账户"""
+    return _evaluate_accounts(
+        _WORKER_STATE['knowledge_graph'], _WORKER_STATE['rules'], _WORKER_STATE['shared'],
+        account_ids, include_details
+    )
+
+
+def _evaluate_accounts(kg, rules: List[RiskRule], shared: Dict[str, Any],
+                       account_ids: List[str], include_details: bool) -> List[Dict[str, Any]]:
+    """对一批账户依次执行全部规则，返回每个账户一行的结果"""
+    rows = []
+    for account_id in account_ids:
+        context = dict(shared, knowledge_graph=kg, account_id=account_id)
+        row = {'account_id': account_id}
+        for rule in rules:
+            try:
+                result = rule.evaluate(context)
+            except Exception as e:
+                logger.error(f"规则{rule.rule_id}评估账户{account_id}时出错: {str(e)}")
+                result = {'triggered': False, 'risk_level': 0, 'details': str(e)}
+            row[rule.rule_id] = result['risk_level'] if result.get('triggered') else 0
+            if include_details:
+                row[f"{rule.rule_id}_details"] = result.get('details')
+        rows.append(row)
+    return rows
+
+
+class RiskEngine:
+    """批量风控评估引擎
+
+    注册一组规则后，对账户列表批量评估：每条规则的prepare只在整张图上执行一次，
+    结果作为共享上下文传给所有账户；账户按块分发到多个进程并行评估，图谱在进程间只读共享。
+    """
+
+    def __init__(self, rules: List[RiskRule] = None, workers: int = 1, chunk_size: int = 256):
+        """初始化风控引擎
+
+        Args:
+            rules: 初始规则列表
+            workers: 并行进程数，1表示在当前进程中串行评估
+            chunk_size: 每个任务包含的账户数
+        """
+        self.rules: List[RiskRule] = []
+        self.workers = workers
+        self.chunk_size = chunk_size
+        for rule in rules or []:
+            self.register(rule)
+
+    def register(self, rule: RiskRule):
+        """注册规则
+
+        Args:
+            rule: 风控规则
+        """
+        if any(existing.rule_id == rule.rule_id for existing in self.rules):
+            raise ValueError(f"规则ID重复: {rule.rule_id}")
+        self.rules.append(rule)
+        logger.info(f"注册规则: {rule.rule_id} {rule.name}")
+
+    def prepare(self, kg) -> Dict[str, Any]:
+        """执行全部规则的预计算并合并为共享上下文
+
+        Args:
+            kg: 知识图谱
+
+        Returns:
+            共享上下文
+        """
+        shared: Dict[str, Any] = {}
+        for rule in self.rules:
+            start = time.perf_counter()
+            shared.update(rule.prepare(kg))
+            logger.debug(f"规则{rule.rule_id}预计算耗时 {(time.perf_counter() - start) * 1000:.1f} ms")
+        return shared
+
+    def evaluate(self, kg, account_ids: List[str], include_details: bool = False,
+                 shared: Optional[Dict[str, Any]] = None) -> pd.DataFrame:
+        """批量评估账户
+
+        Args:
+            kg: 知识图谱
+            account_ids: 账户ID列表
+            include_details: 是否在结果中附带每条规则的details列
+            shared: 已有的预计算结果，None时调用prepare
+
+        Returns:
+            列式评分表：account_id、每条规则的风险等级列、total_score、max_risk_level、triggered_rules
+        """
+        if shared is None:
+            shared = self.prepare(kg)
+        account_ids = list(account_ids)
+        chunks = [account_ids[i:i + self.chunk_size] for i in range(0, len(account_ids), self.chunk_size)]
+        start = time.perf_counter()
+
+        if self.workers <= 1 or len(chunks) <= 1:
+            rows = _evaluate_accounts(kg, self.rules, shared, account_ids, include_details)
+        else:
+            rows = self._evaluate_parallel(kg, shared, chunks, include_details)
+
+        logger.info(f"批量评估{len(account_ids)}个账户、{len(self.rules)}条规则，"
+                    f"耗时 {time.perf_counter() - start:.2f} 秒")
+        return self._to_table(rows)
+
+    def _evaluate_parallel(self, kg, shared: Dict[str, Any], chunks: List[List[str]],
+                           include_details: bool) -> List[Dict[str, Any]]:
+        """在进程池中并行评估各账户块，结果按输入顺序拼接"""
+        workers = min(self.workers, len(chunks), os.cpu_count() or 1)
+        if 'fork' in multiprocessing.get_all_start_methods():
+            # fork时子进程直接继承父进程中的图谱，不需要序列化
+            _WORKER_STATE.update(knowledge_graph=kg, rules=self.rules, shared=shared)
+            executor = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('fork'))
+        else:
+            executor = ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(kg, self.rules, shared))
+
+        try:
+            with executor:
+                results = executor.map(_evaluate_chunk, chunks, [include_details] * len(chunks))
+                return [row for chunk_rows in results for row in chunk_rows]
+        finally:
+            _WORKER_STATE.clear()
+
+    def _to_table(self, rows: List[Dict[str, Any]]) -> pd.DataFrame:
+        """把逐账户结果转换为列式评分表"""
+        rule_ids = [rule.rule_id for rule in self.rules]
+        table = pd.DataFrame(rows)
+        if table.empty:
+            table = pd.DataFrame(columns=['account_id'] + rule_ids)
+        scores = table[rule_ids].to_numpy(dtype=float).reshape(len(table), len(rule_ids))
+        table['total_score'] = scores.sum(axis=1)
+        table['max_risk_level'] = scores.max(axis=1, initial=0)
+        table['triggered_rules'] = [
+            [rule_ids[j] for j in np.flatnonzero(row > 0)] for row in scores
+        ]
+        return table
@@ -1,8 +1,372 @@
-from typing import Dict, List, Any, Callable
+from datetime import datetime
+from typing import TYPE_CHECKING, Dict, List, Any, Callable, Iterable, Optional, Tuple
 import logging
+import time
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from graph_features import GraphFeatureExtractor
 
 logger = logging.getLogger("KG_Risk_Control")
 
+
+def _neighbors(kg, entity_id: str, direction: str, relation_types: Optional[Iterable[str]]) -> List[Tuple[str, Dict]]:
+    """获取实体指定方向、指定关系类型的邻居及边属性，两种图谱后端都按关系类型索引查找"""
+    return [(other, data) for _, other, data in kg.get_relations(entity_id, direction, relation_types)]
+
+
+def _neighbor_ids(kg, entity_id: str, direction: str, relation_types: Optional[Iterable[str]]) -> List[str]:
+    """只获取邻居实体ID；紧凑图谱直接读取邻接数组，不还原边属性"""
+    if hasattr(kg, 'neighbor_arrays'):
+        others, _ = kg.neighbor_arrays(entity_id, direction, relation_types)
+        return [kg.node_ids[other] for other in others.tolist()]
+    return [other for other, _ in _neighbors(kg, entity_id, direction, relation_types)]
+
+
+def _timestamp(data: Dict) -> Optional[float]:
+    """把边上的timestamp属性统一转换为秒级时间戳"""
+    return _to_seconds(data.get('timestamp'))
+
+
+def _to_seconds(value: Any) -> Optional[float]:
+    """把数值或ISO格式的时间转换为秒级时间戳，无法解析时返回None"""
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return datetime.fromisoformat(str(value)).timestamp()
+    except ValueError:
+        return None
+
+
+def _amount_ok(earlier: Optional[float], later: Optional[float], amount_tolerance: Optional[float]) -> bool:
+    """相邻两跳的资金守恒检查：以前一跳金额为基准，后一跳金额的相对差不超过amount_tolerance"""
+    if amount_tolerance is None or earlier is None:
+        return True
+    return later is not None and abs(later - earlier) <= amount_tolerance * abs(earlier)
+
+
+class _AdjacencyCache:
+    """单次搜索内的邻接缓存：每个实体每个方向只向图谱取一次边，按时间戳排序后按时间区间二分截取
+
+    枢纽账户在一次环路搜索中会被反复经过，缓存后只需取一次它的边；指定时间窗口时每次扩展
+    只物化落在窗口内的那一段邻居。图谱提供neighbor_arrays时(紧凑图谱)直接读取邻接与属性数组，
+    不为每条边构造属性字典。
+    """
+
+    def __init__(self, kg, relation_types: Optional[set], time_bounds: Optional[Tuple[float, float]] = None):
+        """
+        Args:
+            kg: 知识图谱
+            relation_types: 只沿这些类型的关系搜索，None表示全部
+            time_bounds: 若指定，只保留时间戳落在[下界, 上界]内的边
+        """
+        self.kg = kg
+        self.relation_types = relation_types
+        self.time_bounds = time_bounds
+        self._arrays: Dict[Tuple[str, str], tuple] = {}
+        self._full: Dict[Tuple[str, str], List[tuple]] = {}
+
+    def _load(self, node: str, direction: str) -> tuple:
+        """(按时间排序的键, 邻居, 时间戳, 金额, 整数ID到实体ID的映射)，缺失的时间戳键为inf"""
+        cached = self._arrays.get((node, direction))
+        if cached is not None:
+            return cached
+        names = None
+        if hasattr(self.kg, 'neighbor_arrays'):
+            others, columns = self.kg.neighbor_arrays(node, direction, self.relation_types, ('timestamp', 'amount'))
+            names = self.kg.node_ids
+            timestamps, amounts = columns['timestamp'], columns['amount']
+            if timestamps.dtype == object:
+                timestamps = np.array([_to_seconds(value) for value in timestamps], dtype=np.float64)
+        else:
+            relations = _neighbors(self.kg, node, direction, self.relation_types)
+            others = np.array([other for other, _ in relations], dtype=object)
+            timestamps = np.array([_timestamp(data) for _, data in relations], dtype=np.float64)
+            amounts = np.array([data.get('amount') for _, data in relations], dtype=object)
+
+        keys = np.where(np.isnan(timestamps), np.inf, timestamps)
+        if self.time_bounds is not None:
+            keep = (keys >= self.time_bounds[0]) & (keys <= self.time_bounds[1])
+            others, keys, timestamps, amounts = others[keep], keys[keep], timestamps[keep], amounts[keep]
+        order = np.argsort(keys, kind='stable')
+        cached = self._arrays[(node, direction)] = (keys[order], others[order], timestamps[order],
+                                                    amounts[order], names)
+        return cached
+
+    def edges(self, node: str, direction: str, lo: Optional[float] = None,
+              hi: Optional[float] = None) -> List[Tuple[str, Optional[float], Optional[float]]]:
+        """node在direction方向上的(邻居, 时间戳, 金额)列表
+
+        lo/hi都为None时返回全部边，否则只返回时间戳落在[lo, hi]内的边(None表示该端不限)。
+        """
+        if lo is None and hi is None:
+            full = self._full.get((node, direction))
+            if full is None:
+                full = self._full[(node, direction)] = self._slice(self._load(node, direction), 0, None)
+            return full
+        keys = self._load(node, direction)[0]
+        begin = 0 if lo is None else int(np.searchsorted(keys, lo, side='left'))
+        end = None if hi is None else int(np.searchsorted(keys, hi, side='right'))
+        return self._slice(self._arrays[(node, direction)], begin, end)
+
+    @staticmethod
+    def _slice(arrays: tuple, begin: int, end: Optional[int]) -> List[Tuple[str, Optional[float], Optional[float]]]:
+        _, others, timestamps, amounts, names = arrays
+        others = others[begin:end].tolist()
+        if names is not None:
+            others = [names[other] for other in others]
+        timestamps = [None if ts != ts else ts for ts in timestamps[begin:end].tolist()]
+        amounts = [None if amount is None or amount != amount else amount for amount in amounts[begin:end].tolist()]
+        return list(zip(others, timestamps, amounts))
+
+
+def _backward_halves(adjacency: _AdjacencyCache, goal: str, depth: int, time_window: Optional[float],
+                     amount_tolerance: Optional[float],
+                     deadline: Optional[float]) -> Tuple[Dict[str, Dict[int, List[tuple]]], bool]:
+    """从goal沿入边反向枚举至多depth跳、满足时间与金额约束的半路径，按半路径起点和跳数分组
+
+    反向扩展时已知后一跳，因此时间须不晚于后一跳、且不早于进入goal的那一跳减time_window，
+    金额须与后一跳满足资金守恒；不满足的边在扩展时即被剪掉，搜索范围只是时间窗口内的局部邻域。
+
+    Returns:
+        ({起点: {跳数: [(起点到goal的节点元组, 首跳时间, 首跳金额, 末跳时间, 末跳金额)]}}, 是否超时)
+    """
+    halves: Dict[str, Dict[int, List[tuple]]] = {}
+    if depth <= 0:
+        return halves, False
+    nodes = [goal]
+    on_path = {goal}
+    # edges[i]为nodes[i+1] -> nodes[i]这一跳的(时间戳, 金额)，edges[0]是进入goal的末跳
+    edges: List[Tuple[Optional[float], Optional[float]]] = []
+    stack = [iter(adjacency.edges(goal, 'in'))]
+
+    while stack:
+        if deadline is not None and time.monotonic() > deadline:
+            return halves, True
+        step = next(stack[-1], None)
+        if step is None:
+            stack.pop()
+            on_path.discard(nodes.pop())
+            if edges:
+                edges.pop()
+            continue
+
+        predecessor, ts, amount = step
+        if predecessor in on_path:
+            continue
+        if edges:
+            later_ts, later_amount = edges[-1]
+            if time_window is not None and (ts is None or ts > later_ts or edges[0][0] - ts > time_window):
+                continue
+            if not _amount_ok(amount, later_amount, amount_tolerance):
+                continue
+        elif time_window is not None and ts is None:
+            continue
+
+        edges.append((ts, amount))
+        nodes.append(predecessor)
+        length = len(edges)
+        halves.setdefault(predecessor, {}).setdefault(length, []).append(
+            (tuple(reversed(nodes)), ts, amount, edges[0][0], edges[0][1]))
+        if length < depth:
+            on_path.add(predecessor)
+            if time_window is None:
+                stack.append(iter(adjacency.edges(predecessor, 'in')))
+            else:
+                stack.append(iter(adjacency.edges(predecessor, 'in', edges[0][0] - time_window, ts)))
+        else:
+            nodes.pop()
+            edges.pop()
+
+    return halves, False
+
+
+def _bounded_paths(kg, start: str, goal: str, max_hops: int, min_hops: int,
+                   relation_types: Optional[set], time_window: Optional[float],
+                   amount_tolerance: Optional[float], max_paths: int, deadline: Optional[float],
+                   time_bounds: Optional[Tuple[float, float]] = None,
+                   accept: Optional[Callable[[Optional[float], Optional[float], Optional[float]], bool]] = None
+                   ) -> Tuple[List[List[str]], bool]:
+    """枚举start到goal、边数在[min_hops, max_hops]之间的简单路径；start == goal时即经过start的环路
+
+    双向(meet-in-the-middle)搜索：先从goal反向枚举至多 max_hops // 2 跳的半路径，
+    再从start正向DFS至多 max_hops - max_hops // 2 跳，在相遇节点处拼接。两个方向都在扩展时
+    应用时间单调、时间窗口和资金守恒约束，每一侧只搜索约一半深度内满足约束的局部邻域。
+    每条路径只按一种方式切分：反向半路径取 min(反向深度, 路径长度 - 1) 跳，避免重复。
+    time_bounds若指定，只沿时间戳落在[下界, 上界]内的边搜索；
+    accept(最后一跳时间戳, 最后一跳金额, 首跳时间戳)用于对到达goal的路径做额外检查。
+    """
+    adjacency = _AdjacencyCache(kg, relation_types, time_bounds)
+    back_depth = max_hops // 2
+    forward_depth = max_hops - back_depth
+    halves, truncated = _backward_halves(adjacency, goal, back_depth, time_window, amount_tolerance, deadline)
+    if truncated:
+        return [], True
+
+    paths: List[List[str]] = []
+    path = [start]
+    on_path = {start}
+    # 每一帧：(邻居迭代器, 到达该节点的边的(时间戳, 金额))
+    stack = [(iter(adjacency.edges(start, 'out')), None)]
+    first_time: List[Optional[float]] = [None]
+
+    def join(node: str, depth: int, ts: Optional[float], amount: Optional[float], first: Optional[float]) -> bool:
+        """把正向路径(path + node)与node处的反向半路径拼接成完整路径，达到max_paths时返回True"""
+        by_length = halves.get(node)
+        if not by_length:
+            return False
+        if depth == 1:
+            lengths = range(max(min_hops - 1, 1), back_depth + 1)
+        elif depth + back_depth >= min_hops:
+            lengths = (back_depth,)
+        else:
+            return False
+        for length in lengths:
+            for nodes, half_first_ts, half_first_amount, last_ts, last_amount in by_length.get(length, ()):
+                if time_window is not None and (half_first_ts < ts or last_ts - first > time_window):
+                    continue
+                if not _amount_ok(amount, half_first_amount, amount_tolerance):
+                    continue
+                if any(middle in on_path for middle in nodes[1:-1]):
+                    continue
+                if accept is not None and not accept(last_ts, last_amount, first):
+                    continue
+                paths.append(path + [node] + list(nodes[1:-1]) + ([] if goal == start else [goal]))
+                if len(paths) >= max_paths:
+                    return True
+        return False
+
+    while stack:
+        if deadline is not None and time.monotonic() > deadline:
+            truncated = True
+            break
+
+        neighbors, arrived = stack[-1]
+        step = next(neighbors, None)
+        if step is None:
+            stack.pop()
+            on_path.discard(path.pop())
+            first_time.pop()
+            continue
+
+        neighbor, ts, amount = step
+        depth = len(path)
+        first = first_time[-1] if first_time[-1] is not None else ts
+        if time_window is not None:
+            if ts is None or (arrived is not None and arrived[0] is not None and ts < arrived[0]):
+                continue
+            if ts - first > time_window:
+                continue
+        if arrived is not None and not _amount_ok(arrived[1], amount, amount_tolerance):
+            continue
+
+        if neighbor == goal:
+            # 直接到达goal只在一跳路径时计入，更长的路径由反向半路径拼接得到
+            if depth == 1 and min_hops <= 1 and (accept is None or accept(ts, amount, first)):
+                paths.append([start] if goal == start else [start, goal])
+                if len(paths) >= max_paths:
+                    truncated = True
+                    break
+            continue
+        if neighbor in on_path:
+            continue
+        if join(neighbor, depth, ts, amount, first):
+            truncated = True
+            break
+
+        if depth < forward_depth:
+            path.append(neighbor)
+            on_path.add(neighbor)
+            first_time.append(first)
+            if time_window is None:
+                stack.append((iter(adjacency.edges(neighbor, 'out')), (ts, amount)))
+            else:
+                stack.append((iter(adjacency.edges(neighbor, 'out', ts, first + time_window)), (ts, amount)))
+
+    return paths, truncated
+
+
+def find_anchored_cycles(kg, account_id: str, max_length: int = 6, min_length: int = 3,
+                         relation_types: Optional[Iterable[str]] = None,
+                         time_window: Optional[float] = None,
+                         amount_tolerance: Optional[float] = None,
+                         max_cycles: int = 100,
+                         time_budget: Optional[float] = None) -> Tuple[List[List[str]], bool]:
+    """查找经过指定账户的环路，只搜索账户max_length跳内的局部子图
+
+    Args:
+        kg: 知识图谱(FinancialKnowledgeGraph或CompactFinancialKnowledgeGraph)
+        account_id: 锚定账户ID
+        max_length: 环路最大边数
+        min_length: 环路最小边数
+        relation_types: 参与环路的关系类型，None表示全部
+        time_window: 若指定，环路上的交易须按时间先后发生且首尾间隔不超过该秒数
+        amount_tolerance: 若指定，相邻两跳的金额相对差不得超过该比例(资金守恒)
+        max_cycles: 最多返回的环路数量
+        time_budget: 搜索的最长耗时(秒)，超时提前返回
+
+    Returns:
+        (环路列表, 是否因数量或耗时上限被截断)，每个环路是以account_id开头的实体ID列表
+    """
+    if relation_types is not None:
+        relation_types = set(relation_types)
+    deadline = time.monotonic() + time_budget if time_budget is not None else None
+    return _bounded_paths(kg, account_id, account_id, max_length, min_length, relation_types,
+                          time_window, amount_tolerance, max_cycles, deadline)
+
+
+def find_closing_cycles(kg, source_id: str, target_id: str, data: Dict, max_length: int = 6,
+                        min_length: int = 3,
+                        relation_types: Optional[Iterable[str]] = None,
+                        time_window: Optional[float] = None,
+                        amount_tolerance: Optional[float] = None,
+                        max_cycles: int = 100,
+                        time_budget: Optional[float] = None) -> Tuple[List[List[str]], bool]:
+    """查找由一条新边 source -> target 刚刚闭合的环路
+
+    即 target 到 source 的有界路径再接上这条新边。新边是环路上最晚发生的一跳：
+    指定time_window时只沿时间戳落在[新边时间 - time_window, 新边时间]内的边搜索，
+    流式场景下搜索范围因此只是最近一段时间的局部子图。
+
+    Args:
+        kg: 知识图谱
+        source_id: 新边的源实体ID
+        target_id: 新边的目标实体ID
+        data: 新边属性(含relation_type、timestamp、amount)
+        其余参数同find_anchored_cycles
+
+    Returns:
+        (环路列表, 是否被截断)，每个环路是以target_id开头、以source_id结尾的实体ID列表
+    """
+    if relation_types is not None:
+        relation_types = set(relation_types)
+        if data.get('relation_type') not in relation_types:
+            return [], False
+    deadline = time.monotonic() + time_budget if time_budget is not None else None
+    closing_ts = _timestamp(data)
+    closing_amount = data.get('amount')
+
+    time_bounds = None
+    if time_window is not None:
+        if closing_ts is None:
+            return [], False
+        time_bounds = (closing_ts - time_window, closing_ts)
+
+    def accept(last_ts: Optional[float], last_amount: Optional[float], first_ts: Optional[float]) -> bool:
+        if time_window is not None and (last_ts > closing_ts or closing_ts - first_ts > time_window):
+            return False
+        if amount_tolerance is not None and last_amount is not None:
+            if closing_amount is None or abs(closing_amount - last_amount) > amount_tolerance * abs(last_amount):
+                return False
+        return True
+
+    return _bounded_paths(kg, target_id, source_id, max_length - 1, min_length - 1, relation_types,
+                          time_window, amount_tolerance, max_cycles, deadline,
+                          time_bounds=time_bounds, accept=accept)
+
 class RiskRule:
     """风控规则基类"""
     
@@ -20,6 +384,17 @@ class RiskRule:
         self.description = description
         self.risk_level = risk_level
     
+    def prepare(self, kg) -> Dict[str, Any]:
+        """批量评估前对整张图做一次预计算，结果会合并进每个账户的评估上下文
+        
+        Args:
+            kg: 知识图谱
+            
+        Returns:
+            共享的上下文条目，默认无
+        """
+        return {}
+    
     def evaluate(self, context: Dict[str, Any]) -> Dict[str, Any]:
         """评估风险
         
@@ -34,13 +409,31 @@ class RiskRule:
 class CircularTransactionRule(RiskRule):
     """环形交易检测规则"""
     
-    def __init__(self):
+    def __init__(self, max_length: int = 6, relation_types: List[str] = None,
+                 time_window: float = None, amount_tolerance: float = None,
+                 max_cycles: int = 100, time_budget: float = 0.5):
+        """初始化环形交易检测规则
+
+        Args:
+            max_length: 环路最大边数
+            relation_types: 参与环路的关系类型，None表示全部
+            time_window: 环路首尾交易的最大时间间隔(秒)，None表示不限制
+            amount_tolerance: 相邻两跳金额的最大相对差，None表示不检查资金守恒
+            max_cycles: 最多返回的环路数量
+            time_budget: 单个账户的最长搜索耗时(秒)
+        """
         super().__init__(
             rule_id="R001",
             name="环形交易检测",
             description="检测资金在多个账户间形成环形流动的模式，可能是洗钱或欺诈行为",
             risk_level=8
         )
+        self.max_length = max_length
+        self.relation_types = relation_types
+        self.time_window = time_window
+        self.amount_tolerance = amount_tolerance
+        self.max_cycles = max_cycles
+        self.time_budget = time_budget
     
     def evaluate(self, context: Dict[str, Any]) -> Dict[str, Any]:
         """评估是否存在环形交易
@@ -62,14 +455,19 @@ class CircularTransactionRule(RiskRule):
                 'details': "缺少必要的评估信息"
             }
         
-        # 查找从账户出发并回到账户的路径
+        # 以账户为锚点的有界环路搜索，不再枚举全图环路
         cycles = []
-        
-        # 使用NetworkX的简单环路查找
+        truncated = False
         try:
-            for cycle in kg.graph.simple_cycles():
-                if account_id in cycle and len(cycle) >= 3:
-                    cycles.append(cycle)
+            cycles, truncated = find_anchored_cycles(
+                kg, account_id,
+                max_length=self.max_length,
+                relation_types=self.relation_types,
+                time_window=self.time_window,
+                amount_tolerance=self.amount_tolerance,
+                max_cycles=self.max_cycles,
+                time_budget=self.time_budget
+            )
         except Exception as e:
             logger.error(f"查找环路时出错: {str(e)}")
         
@@ -80,9 +478,19 @@ class CircularTransactionRule(RiskRule):
                 'risk_level': self.risk_level,
                 'details': {
                     'cycles': cycles,
-                    'cycle_count': len(cycles)
+                    'cycle_count': len(cycles),
+                    'truncated': truncated
                 }
             }
+        elif truncated:
+            # 预算内没有搜索完，不能断言不存在环路
+            return {
+                'rule_id': self.rule_id,
+                'triggered': False,
+                'risk_level': 0,
+                'truncated': True,
+                'details': f"环路搜索超出时间预算({self.time_budget}秒)，结果不完整"
+            }
         else:
             return {
                 'rule_id': self.rule_id,
@@ -94,13 +502,35 @@ class CircularTransactionRule(RiskRule):
 class SharedAddressRule(RiskRule):
     """共享地址检测规则"""
     
-    def __init__(self):
+    def __init__(self, min_accounts: int = 3):
+        """初始化共享地址检测规则
+
+        Args:
+            min_accounts: 同一地址关联的账户数(含自身)达到该值时触发
+        """
         super().__init__(
             rule_id="R002",
             name="共享地址检测",
             description="检测多个高风险账户共享同一地址的情况，可能是欺诈团伙",
             risk_level=7
         )
+        self.min_accounts = min_accounts
+    
+    def prepare(self, kg) -> Dict[str, Any]:
+        """一次性按地址聚合全部has_address关系，供批量评估共享
+
+        Args:
+            kg: 知识图谱
+
+        Returns:
+            {'address_accounts': 地址 -> 账户列表, 'account_addresses': 账户 -> 地址列表}
+        """
+        address_accounts: Dict[str, List[str]] = {}
+        account_addresses: Dict[str, List[str]] = {}
+        for account, address in kg.relation_pairs('has_address'):
+            address_accounts.setdefault(address, []).append(account)
+            account_addresses.setdefault(account, []).append(address)
+        return {'address_accounts': address_accounts, 'account_addresses': account_addresses}
     
     def evaluate(self, context: Dict[str, Any]) -> Dict[str, Any]:
         """评估是否存在共享地址
@@ -122,11 +552,134 @@ class SharedAddressRule(RiskRule):
                 'details': "缺少必要的评估信息"
             }
         
-        # 查找账户关联的地址
-        addresses = []
-        for _, target, data in kg.graph.out_edges(account_id, data=True):
-            if data.get('relation_type') == 'has_address':
-                addresses.append(target)
+        # 查找账户关联的地址，优先使用prepare预先聚合的结果
+        if 'account_addresses' in context:
+            addresses = context['account_addresses'].get(account_id, [])
+        else:
+            addresses = _neighbor_ids(kg, account_id, 'out', {'has_address'})
         
         if not addresses:
-            return
\ No newline at end of file
+            return {
+                'rule_id': self.rule_id,
+                'triggered': False,
+                'risk_level': 0,
+                'details': "账户没有关联地址"
+            }
+        
+        shared = {}
+        for address in addresses:
+            if 'address_accounts' in context:
+                accounts = context['address_accounts'].get(address, [])
+            else:
+                accounts = _neighbor_ids(kg, address, 'in', {'has_address'})
+            if len(accounts) >= self.min_accounts:
+                shared[address] = [account for account in accounts if account != account_id]
+        
+        if shared:
+            return {
+                'rule_id': self.rule_id,
+                'triggered': True,
+                'risk_level': self.risk_level,
+                'details': {
+                    'shared_addresses': shared,
+                    'shared_account_count': len({a for accounts in shared.values() for a in accounts})
+                }
+            }
+        else:
+            return {
+                'rule_id': self.rule_id,
+                'triggered': False,
+                'risk_level': 0,
+                'details': "未检测到共享地址"
+            }
+
+class FeatureThresholdRule(RiskRule):
+    """图特征阈值规则：直接读取GraphFeatureExtractor预计算的特征列，不在评估时遍历图谱"""
+    
+    def __init__(self, rule_id: str, name: str, description: str, risk_level: int,
+                 thresholds: Dict[str, float], extractor: 'GraphFeatureExtractor' = None):
+        """初始化图特征阈值规则
+
+        Args:
+            rule_id: 规则ID
+            name: 规则名称
+            description: 规则描述
+            risk_level: 风险等级(1-10)
+            thresholds: 特征列 -> 阈值，任一特征达到阈值即触发
+            extractor: 特征计算器，多条规则可共用同一个；None时按图谱创建
+        """
+        super().__init__(rule_id=rule_id, name=name, description=description, risk_level=risk_level)
+        self.thresholds = thresholds
+        self.extractor = extractor
+    
+    def _features(self, kg):
+        """图谱对应的特征表(增量缓存)"""
+        if self.extractor is None or self.extractor.kg is not kg:
+            # 特征计算依赖scipy与pandas，只在用到本规则时才导入
+            from graph_features import GraphFeatureExtractor
+            self.extractor = GraphFeatureExtractor(kg)
+        return self.extractor.compute()
+    
+    def prepare(self, kg) -> Dict[str, Any]:
+        """批量评估前计算一次特征表
+
+        Args:
+            kg: 知识图谱
+
+        Returns:
+            {'graph_features': 特征表}
+        """
+        return {'graph_features': self._features(kg)}
+    
+    def evaluate(self, context: Dict[str, Any]) -> Dict[str, Any]:
+        """评估账户的特征是否超过阈值
+        
+        Args:
+            context: 包含知识图谱(或预计算特征表)和账户信息的上下文
+            
+        Returns:
+            评估结果
+        """
+        kg = context.get('knowledge_graph')
+        account_id = context.get('account_id')
+        
+        if not kg or not account_id:
+            return {
+                'rule_id': self.rule_id,
+                'triggered': False,
+                'risk_level': 0,
+                'details': "缺少必要的评估信息"
+            }
+        
+        features = context.get('graph_features')
+        if features is None:
+            features = self._features(kg)
+        if account_id not in features.index:
+            return {
+                'rule_id': self.rule_id,
+                'triggered': False,
+                'risk_level': 0,
+                'details': "账户不在图谱中"
+            }
+        
+        row = features.loc[account_id]
+        exceeded = {
+            feature: float(row[feature])
+            for feature, threshold in self.thresholds.items()
+            if feature in row.index and row[feature] >= threshold
+        }
+        
+        if exceeded:
+            return {
+                'rule_id': self.rule_id,
+                'triggered': True,
+                'risk_level': self.risk_level,
+                'details': {'exceeded_features': exceeded}
+            }
+        else:
+            return {
+                'rule_id': self.rule_id,
+                'triggered': False,
+                'risk_level': 0,
+                'details': "图特征均未超过阈值"
+            }
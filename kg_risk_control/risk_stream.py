@@ -0,0 +1,181 @@
+import asyncio
+import time
+from collections import deque
+from datetime import datetime
+from typing import Dict, List, Any, Callable, Set
+import logging
+
+from risk_rules import CircularTransactionRule, SharedAddressRule, find_closing_cycles
+
+logger = logging.getLogger("KG_Risk_Control")
+
+
+class StreamingRiskMonitor:
+    """流式风控监控器
+
+    交易边实时写入图谱，每条新边只触发受影响局部的增量评估：
+    转账边检查是否闭合了新的环路，地址边原地更新地址的共享账户计数。
+    告警通过回调函数和/或asyncio队列输出。
+    """
+
+    def __init__(self, kg, cycle_rule: CircularTransactionRule = None,
+                 address_rule: SharedAddressRule = None,
+                 on_alert: Callable[[Dict[str, Any]], None] = None,
+                 alert_queue: asyncio.Queue = None,
+                 loop: asyncio.AbstractEventLoop = None,
+                 transfer_relation: str = 'transfer',
+                 address_relation: str = 'has_address',
+                 event_time_budget: float = 0.05,
+                 latency_window: int = 10000):
+        """初始化流式监控器
+
+        Args:
+            kg: 知识图谱(任一后端)，新边会写入其中
+            cycle_rule: 环形交易规则，提供环路长度、时间窗口、资金守恒等参数
+            address_rule: 共享地址规则，提供触发阈值
+            on_alert: 告警回调
+            alert_queue: 告警队列
+            loop: alert_queue所属的事件循环；在其他线程中写入时必须提供
+            transfer_relation: 转账关系类型
+            address_relation: 地址关系类型
+            event_time_budget: 单个事件环路检查的最长耗时(秒)
+            latency_window: 统计事件延迟时保留的最近事件数
+        """
+        self.kg = kg
+        self.cycle_rule = cycle_rule or CircularTransactionRule()
+        self.address_rule = address_rule or SharedAddressRule()
+        self.on_alert = on_alert
+        self.alert_queue = alert_queue
+        self.loop = loop
+        self.transfer_relation = transfer_relation
+        self.address_relation = address_relation
+        self.event_time_budget = event_time_budget
+        self.alert_count = 0
+        self._latencies = deque(maxlen=latency_window)
+
+        # 由现有图谱初始化地址 -> 账户集合的计数
+        prepared = self.address_rule.prepare(kg)
+        self._address_accounts: Dict[str, Set[str]] = {
+            address: set(accounts) for address, accounts in prepared['address_accounts'].items()
+        }
+
+    def add_entity(self, entity_id: str, entity_type: str, attributes: Dict = None):
+        """添加实体，直接写入图谱
+
+        Args:
+            entity_id: 实体ID
+            entity_type: 实体类型
+            attributes: 实体属性
+        """
+        self.kg.add_entity(entity_id, entity_type, attributes)
+
+    def add_relation(self, source_id: str, target_id: str, relation_type: str,
+                     attributes: Dict = None) -> List[Dict[str, Any]]:
+        """写入一条关系并增量评估受影响的局部
+
+        Args:
+            source_id: 源实体ID
+            target_id: 目标实体ID
+            relation_type: 关系类型
+            attributes: 关系属性
+
+        Returns:
+            本事件产生的告警列表
+        """
+        start = time.perf_counter()
+        attributes = dict(attributes or {})
+        self.kg.add_relation(source_id, target_id, relation_type, dict(attributes))
+
+        alerts = []
+        if relation_type == self.transfer_relation:
+            alerts.extend(self._check_cycle_closure(source_id, target_id, relation_type, attributes))
+        elif relation_type == self.address_relation:
+            alerts.extend(self._update_shared_address(source_id, target_id))
+
+        latency_ms = (time.perf_counter() - start) * 1000
+        self._latencies.append(latency_ms)
+        for alert in alerts:
+            alert['event_latency_ms'] = round(latency_ms, 3)
+            self._emit(alert)
+        return alerts
+
+    def _check_cycle_closure(self, source_id: str, target_id: str, relation_type: str,
+                             attributes: Dict) -> List[Dict[str, Any]]:
+        """只查找新边刚闭合的环路：target到source的有界路径再接上这条新边"""
+        rule = self.cycle_rule
+        cycles, truncated = find_closing_cycles(
+            self.kg, source_id, target_id, dict(attributes, relation_type=relation_type),
+            max_length=rule.max_length,
+            relation_types=rule.relation_types,
+            time_window=rule.time_window,
+            amount_tolerance=rule.amount_tolerance,
+            max_cycles=rule.max_cycles,
+            time_budget=self.event_time_budget
+        )
+        if not cycles:
+            return []
+        return [self._alert(rule, source_id, {
+            'cycles': cycles,
+            'cycle_count': len(cycles),
+            'truncated': truncated,
+            'closing_edge': (source_id, target_id)
+        })]
+
+    def _update_shared_address(self, account_id: str, address: str) -> List[Dict[str, Any]]:
+        """原地更新地址的共享账户集合，达到阈值时为新加入的账户(首次达到时为全部账户)告警"""
+        accounts = self._address_accounts.setdefault(address, set())
+        if account_id in accounts:
+            return []
+        accounts.add(account_id)
+
+        rule = self.address_rule
+        if len(accounts) < rule.min_accounts:
+            return []
+        # 首次达到阈值时，之前关联该地址的账户也一并告警
+        targets = sorted(accounts) if len(accounts) == rule.min_accounts else [account_id]
+        return [
+            self._alert(rule, account, {
+                'shared_addresses': {address: sorted(accounts - {account})},
+                'shared_account_count': len(accounts) - 1
+            })
+            for account in targets
+        ]
+
+    @staticmethod
+    def _alert(rule, account_id: str, details: Dict[str, Any]) -> Dict[str, Any]:
+        """构造告警"""
+        return {
+            'rule_id': rule.rule_id,
+            'account_id': account_id,
+            'triggered': True,
+            'risk_level': rule.risk_level,
+            'details': details,
+            'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        }
+
+    def _emit(self, alert: Dict[str, Any]):
+        """把告警交给回调和队列"""
+        self.alert_count += 1
+        logger.info(f"风控告警: {alert['rule_id']} 账户 {alert['account_id']}")
+        if self.on_alert is not None:
+            try:
+                self.on_alert(alert)
+            except Exception as e:
+                logger.error(f"告警回调出错: {str(e)}")
+        if self.alert_queue is not None:
+            if self.loop is not None:
+                self.loop.call_soon_threadsafe(self.alert_queue.put_nowait, alert)
+            else:
+                self.alert_queue.put_nowait(alert)
+
+    def latency_stats(self) -> Dict[str, float]:
+        """最近事件的处理延迟统计(毫秒)"""
+        if not self._latencies:
+            return {'events': 0, 'p50_ms': 0.0, 'p99_ms': 0.0, 'max_ms': 0.0}
+        ordered = sorted(self._latencies)
+        return {
+            'events': len(ordered),
+            'p50_ms': round(ordered[len(ordered) // 2], 3),
+            'p99_ms': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))], 3),
+            'max_ms': round(ordered[-1], 3)
+        }
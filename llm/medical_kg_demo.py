@@ -1,15 +1,17 @@
 import networkx as nx
 import json
 from typing import List, Dict, Any
-from openai import OpenAI
+import os
+import sys
+
+# 共享的大模型客户端位于agent目录
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'agent'))
+from llm_client import get_client
 
 class MedicalKG:
     def __init__(self):
         self.kg = nx.DiGraph()
-        self.client = OpenAI(
-            api_key="sk-XvWvy8rf8ewno0vVFmtgOMidGb5i3h1qNQmer7bE2buY6hlK",
-            base_url="https://tbnx.plus7.plus/v1"
-        )
+        self.client = get_client()
         self.load_knowledge_base()
 
     def load_knowledge_base(self):
@@ -93,6 +95,10 @@ class MedicalKG:
 
     def get_ai_suggestion(self, diagnosis_results: List[Dict], medicine_results: List[Dict]) -> str:
         """获取 AI 建议"""
+        return self.client.run(self.aget_ai_suggestion(diagnosis_results, medicine_results))
+
+    async def aget_ai_suggestion(self, diagnosis_results: List[Dict], medicine_results: List[Dict]) -> str:
+        """获取 AI 建议(异步)"""
         context = {
             "diagnosis": diagnosis_results,
             "medicines": medicine_results
@@ -108,10 +114,10 @@ class MedicalKG:
 
 请提供专业的建议："""
 
-        response = self.client.chat.completions.create(
-            model="deepseek-chat",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.7
+        response = await self.client.achat(
+            [{"role": "user", "content": prompt}],
+            temperature=0.7,
+            use_cache=True
         )
         
         return response.choices[0].message.content
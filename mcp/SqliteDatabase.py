@@ -1,7 +1,20 @@
 import sqlite3
 import logging
 from logging.handlers import RotatingFileHandler
-from contextlib import closing
+import asyncio
+import base64
+import csv
+import hashlib
+import io
+import json
+import queue
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from contextlib import closing, contextmanager
 from pathlib import Path
 from mcp.server.models import InitializationOptions
 import mcp.types as types
@@ -9,6 +22,7 @@ from mcp.server import NotificationOptions, Server
 import mcp.server.stdio
 from pydantic import AnyUrl
 from typing import Any
+from urllib.parse import parse_qs, urlsplit
 
 logger = logging.getLogger('mcp_sqlite_server')
 logger.info("Starting MCP SQLite Server")
@@ -31,8 +45,11 @@ This server provides several SQL-related tools:
 "read-query": Executes SELECT queries to read data from the database
 "write-query": Executes INSERT, UPDATE, or DELETE queries to modify data
 "create-table": Creates new tables in the database
+"bulk-insert": Loads many rows (or a local CSV/Parquet file) into a table in one transaction
 "list-tables": Shows all existing tables
 "describe-table": Shows the schema for a specific table
+"explain-query": Shows the query plan for a SELECT and flags full table scans
+"index-advisor": Proposes (and on request creates) indexes for slow queries seen so far
 "append-insight": Adds a new business insight to the memo resource
 </mcp>
 <demo-instructions>
@@ -94,64 +111,1092 @@ The provided XML tags are for the assistants understanding. Implore to make all
 Start your first message fully in character with something like "Oh, Hey there! I see you've chosen the topic {topic}. Let's get started! 🚀"
 """
 
+# 每个连接建立时应用的 PRAGMA：WAL 允许读写并发，NORMAL 在 WAL 下只在 checkpoint 时 fsync
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "mmap_size": 256 * 1024 * 1024,
+    "cache_size": -64 * 1024,  # 负数表示 KiB，即每个连接 64MB 页缓存
+    "temp_store": "MEMORY",
+}
+# 每执行多少条 SQLite VM 指令回调一次 progress handler，用于超时与取消检查
+PROGRESS_HANDLER_STEPS = 1000
+# read-query 分页与结果大小上限
+DEFAULT_PAGE_ROWS = 500
+MAX_PAGE_ROWS = 5000
+DEFAULT_MAX_BYTES = 256 * 1024
+# 每个连接的预编译语句缓存（sqlite3 默认 128）与进程内结果缓存条目上限
+STATEMENT_CACHE_SIZE = 512
+RESULT_CACHE_ENTRIES = 256
+# bulk-insert 每批 executemany 的默认行数
+DEFAULT_BULK_BATCH_SIZE = 1000
+# 索引顾问：最多记录的不同查询数、单个建议索引的最大列数、基准测试重复次数
+ADVISOR_MAX_QUERIES = 1000
+ADVISOR_MAX_INDEX_COLUMNS = 4
+BENCHMARK_REPEAT = 3
+# 持久化 insights 的内部表，不在 list-tables/describe-table 中展示
+INSIGHTS_TABLE = "_mcp_insights"
+# 指标：延迟直方图桶（毫秒）与慢查询阈值
+LATENCY_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+SLOW_QUERY_MS = 500
+# 语句分类：EXPLAIN 编译（不执行）语句后，出现写事务或下列操作码/授权动作的语句不是只读语句，
+# 与 sqlite3_stmt_readonly 的判定一致，WITH ... INSERT、VACUUM、REINDEX、PRAGMA x=... 等都会路由到写连接
+WRITE_OPCODES = frozenset({"Vacuum", "JournalMode", "Checkpoint", "AutoCommit", "Savepoint", "VCreate", "VDestroy", "VUpdate"})
+WRITE_ACTIONS = frozenset({
+    sqlite3.SQLITE_ATTACH, sqlite3.SQLITE_DETACH, sqlite3.SQLITE_REINDEX, sqlite3.SQLITE_ANALYZE,
+    sqlite3.SQLITE_TRANSACTION, sqlite3.SQLITE_SAVEPOINT, sqlite3.SQLITE_ALTER_TABLE,
+    sqlite3.SQLITE_INSERT, sqlite3.SQLITE_UPDATE, sqlite3.SQLITE_DELETE,
+})
+# 不带赋值也会改动数据库文件的 PRAGMA，以及参数只是表名/索引名的只读 PRAGMA（授权回调区分不了 x=v 与 x(v)）
+WRITE_PRAGMAS = frozenset({"optimize", "incremental_vacuum", "wal_checkpoint"})
+READ_PRAGMAS = frozenset({
+    "table_info", "table_xinfo", "table_list", "index_info", "index_xinfo", "index_list",
+    "foreign_key_list", "foreign_key_check", "integrity_check", "quick_check",
+})
+
+
+_SQL_LITERAL = re.compile(r"('(?:[^']|'')*'|\"(?:[^\"]|\"\")*\")")
+# 字面量与带引号的标识符，其中的空白和注释标记都要原样保留
+_SQL_QUOTED = re.compile(r"('(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|`(?:[^`]|``)*`|\[[^\]]*\])")
+# 字面量/带引号的标识符（原样保留）或注释（替换为空格）
+_SQL_COMMENT = re.compile(_SQL_QUOTED.pattern + r"|--[^\n]*|/\*.*?(?:\*/|$)", re.DOTALL)
+
+
+def _strip_comments(query: str) -> str:
+    """Replace -- and /* */ comments outside literals and quoted identifiers with a space"""
+    return _SQL_COMMENT.sub(lambda match: match.group(1) or " ", query)
+
+
+def _statement_body(query: str) -> str:
+    """The statement without comments, surrounding whitespace or trailing semicolons,
+    safe to embed in a larger statement"""
+    return re.sub(r"[\s;]+$", "", _strip_comments(query)).strip()
+
+
+def _quote_identifier(name: str) -> str:
+    """Double-quote an SQL identifier, escaping embedded quotes"""
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _normalize_sql(query: str) -> str:
+    """Drop comments and trailing semicolons, then collapse whitespace outside literals
+
+    Comments go first: collapsing the newline that ends a -- comment would otherwise
+    let the comment swallow the rest of the statement in the cache key.
+    """
+    parts = _SQL_QUOTED.split(_statement_body(query))
+    return "".join(part if i % 2 else re.sub(r"\s+", " ", part) for i, part in enumerate(parts))
+
+
+class QueryCache:
+    """LRU cache of read results tagged with the database version they were computed at"""
+
+    def __init__(self, max_entries: int = RESULT_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[tuple, tuple[Any, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple, version: Any) -> Any | None:
+        """Return the cached value for key if it was computed at version"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: tuple, version: Any, value: Any):
+        """Store value for key, evicting the least recently used entry when full"""
+        with self._lock:
+            self._entries[key] = (version, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Drop every cached result"""
+        with self._lock:
+            self._entries.clear()
+
+
+_PLAN_SCAN = re.compile(r"^SCAN (?:TABLE )?(\w+)(.*)$")
+_TABLE_REF = re.compile(
+    r'\b(?:FROM|JOIN)\s+"?(\w+)"?'
+    r"(?:\s+(?:AS\s+)?(?!(?:WHERE|JOIN|ON|LEFT|RIGHT|INNER|OUTER|CROSS|NATURAL|GROUP|ORDER|LIMIT|HAVING|UNION|USING)\b)(\w+))?",
+    re.IGNORECASE,
+)
+_PREDICATE = re.compile(
+    r'(?:(\w+)\.)?"?(\w+)"?\s*(==|=|<=|>=|<>|!=|<|>|\bIN\b|\bLIKE\b|\bBETWEEN\b|\bIS\b)',
+    re.IGNORECASE,
+)
+_SELECT_LIST = re.compile(r"^\s*SELECT\s+(?:DISTINCT\s+)?(.*?)\s+FROM\s", re.IGNORECASE | re.DOTALL)
+_EQUALITY_OPS = {"=", "==", "IN", "IS"}
+
+
+def _full_scans(plan: list[dict[str, Any]]) -> list[str]:
+    """Tables read by a full table scan (SCAN without any index) in an EXPLAIN QUERY PLAN"""
+    tables = []
+    for step in plan:
+        match = _PLAN_SCAN.match(step["detail"])
+        if match and "INDEX" not in match.group(2).upper():
+            tables.append(match.group(1))
+    return tables
+
+
+class IndexAdvisor:
+    """Records read queries and turns the predicates of full-scanning ones into index proposals"""
+
+    def __init__(self, max_queries: int = ADVISOR_MAX_QUERIES):
+        self.max_queries = max_queries
+        self._observed: Counter[str] = Counter()
+        self._lock = threading.Lock()
+
+    def observe(self, query: str):
+        """Count an executed read query"""
+        key = _normalize_sql(query)
+        with self._lock:
+            if key in self._observed or len(self._observed) < self.max_queries:
+                self._observed[key] += 1
+
+    def observed(self) -> list[tuple[str, int]]:
+        """Snapshot of (query, count), most frequent first"""
+        with self._lock:
+            return self._observed.most_common()
+
+    @staticmethod
+    def index_columns(
+        query: str, schema: dict[str, list[dict[str, Any]]], tables: list[str]
+    ) -> dict[str, list[str]]:
+        """Index columns per scanned table (or alias): equality predicates, then one range
+        predicate, then selected columns when that keeps the index covering and small"""
+        text = _SQL_LITERAL.sub("?", query)
+        aliases: dict[str, str] = {}
+        for table, alias in _TABLE_REF.findall(text):
+            aliases[table.lower()] = table
+            if alias:
+                aliases[alias.lower()] = table
+        # 查询计划里的表名可能是别名
+        tables = list(dict.fromkeys(aliases.get(name.lower(), name) for name in tables))
+        columns = {table: {col["name"].lower(): col["name"] for col in schema.get(table, [])} for table in tables}
+
+        def owner(qualifier: str, column: str) -> str | None:
+            if qualifier:
+                table = aliases.get(qualifier.lower())
+                return table if table in columns and column.lower() in columns[table] else None
+            matches = [table for table in tables if column.lower() in columns[table]]
+            return matches[0] if len(matches) == 1 else None
+
+        equality: dict[str, list[str]] = {table: [] for table in tables}
+        ranges: dict[str, list[str]] = {table: [] for table in tables}
+        for qualifier, column, op in _PREDICATE.findall(text):
+            table = owner(qualifier, column)
+            if table is None:
+                continue
+            name = columns[table][column.lower()]
+            bucket = equality if op.upper() in _EQUALITY_OPS else ranges
+            if name not in equality[table] and name not in ranges[table]:
+                bucket[table].append(name)
+
+        result = {}
+        select = _SELECT_LIST.match(text)
+        for table in tables:
+            keys = (equality[table] + ranges[table][:1])[:ADVISOR_MAX_INDEX_COLUMNS]
+            if not keys:
+                continue
+            if select and len(tables) == 1:
+                selected = []
+                for item in select.group(1).split(","):
+                    match = re.fullmatch(r'\s*(?:(\w+)\.)?"?(\w+)"?\s*', item)
+                    if not match or owner(match.group(1) or "", match.group(2)) != table:
+                        selected = None
+                        break
+                    selected.append(columns[table][match.group(2).lower()])
+                if selected is not None:
+                    covering = keys + [col for col in selected if col not in keys]
+                    if len(covering) <= ADVISOR_MAX_INDEX_COLUMNS:
+                        keys = covering
+            result[table] = keys
+        return result
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram in the Prometheus style"""
+
+    def __init__(self, buckets: tuple[float, ...] = LATENCY_BUCKETS_MS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        """Record one observation"""
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self) -> list[tuple[str, int]]:
+        """(le, cumulative count) pairs including +Inf"""
+        total = 0
+        result = []
+        for bound, count in zip([*map(str, self.buckets), "+Inf"], self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "count": self.count,
+            "sum_ms": round(self.sum, 3),
+            "avg_ms": round(self.sum / self.count, 3) if self.count else 0.0,
+            "buckets": dict(self.cumulative()),
+        }
+
+
+class ServerMetrics:
+    """Per-tool and per-query counters and latency histograms for the MCP server"""
+
+    def __init__(self):
+        self.tool_latency: dict[str, Histogram] = {}
+        self.tool_errors: Counter[str] = Counter()
+        self.tool_bytes: Counter[str] = Counter()
+        self.query_latency: dict[str, Histogram] = {}
+        self.query_rows: Counter[str] = Counter()
+        self.slow_queries = 0
+        self._lock = threading.Lock()
+
+    def record_tool(self, tool: str, elapsed_ms: float, size: int, error: bool):
+        """Record one tool call"""
+        with self._lock:
+            self.tool_latency.setdefault(tool, Histogram()).observe(elapsed_ms)
+            self.tool_bytes[tool] += size
+            if error:
+                self.tool_errors[tool] += 1
+
+    def record_query(self, kind: str, elapsed_ms: float, rows: int, slow: bool):
+        """Record one statement executed on the database"""
+        with self._lock:
+            self.query_latency.setdefault(kind, Histogram()).observe(elapsed_ms)
+            self.query_rows[kind] += rows
+            self.slow_queries += slow
+
+    def to_dict(self, cache: QueryCache) -> dict[str, Any]:
+        """Snapshot suitable for JSON serialization"""
+        lookups = cache.hits + cache.misses
+        with self._lock:
+            return {
+                "tools": {
+                    tool: {
+                        **histogram.to_dict(),
+                        "errors": self.tool_errors[tool],
+                        "bytes_serialized": self.tool_bytes[tool],
+                    }
+                    for tool, histogram in self.tool_latency.items()
+                },
+                "queries": {
+                    kind: {**histogram.to_dict(), "rows": self.query_rows[kind]}
+                    for kind, histogram in self.query_latency.items()
+                },
+                "slow_queries": self.slow_queries,
+                "cache": {
+                    "hits": cache.hits,
+                    "misses": cache.misses,
+                    "hit_ratio": round(cache.hits / lookups, 4) if lookups else 0.0,
+                },
+            }
+
+    def to_prometheus(self, cache: QueryCache) -> str:
+        """Prometheus text exposition format dump"""
+        lines = []
+
+        def histogram(name: str, label: str, series: dict[str, Histogram], help_text: str):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for key, hist in series.items():
+                for bound, count in hist.cumulative():
+                    lines.append(f'{name}_bucket{{{label}="{key}",le="{bound}"}} {count}')
+                lines.append(f'{name}_sum{{{label}="{key}"}} {hist.sum:.3f}')
+                lines.append(f'{name}_count{{{label}="{key}"}} {hist.count}')
+
+        def counter(name: str, label: str, values: Counter[str], help_text: str):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for key, value in values.items():
+                lines.append(f'{name}{{{label}="{key}"}} {value}')
+
+        with self._lock:
+            histogram("mcp_sqlite_tool_latency_ms", "tool", self.tool_latency, "Tool call latency in milliseconds")
+            counter("mcp_sqlite_tool_errors_total", "tool", self.tool_errors, "Tool calls that returned an error")
+            counter("mcp_sqlite_tool_bytes_total", "tool", self.tool_bytes, "Bytes of text returned by tool calls")
+            histogram("mcp_sqlite_query_latency_ms", "kind", self.query_latency, "Statement latency in milliseconds")
+            counter("mcp_sqlite_query_rows_total", "kind", self.query_rows, "Rows returned or affected by statements")
+            lines.append("# TYPE mcp_sqlite_slow_queries_total counter")
+            lines.append(f"mcp_sqlite_slow_queries_total {self.slow_queries}")
+        lines.append("# TYPE mcp_sqlite_cache_hits_total counter")
+        lines.append(f"mcp_sqlite_cache_hits_total {cache.hits}")
+        lines.append("# TYPE mcp_sqlite_cache_misses_total counter")
+        lines.append(f"mcp_sqlite_cache_misses_total {cache.misses}")
+        return "\n".join(lines) + "\n"
+
+
 class SqliteDatabase:
-    def __init__(self, db_path: str):
+    def __init__(self, db_path: str, pool_size: int = 4, query_timeout: float | None = 30.0):
         self.db_path = str(Path(db_path).expanduser())
         Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
-        self._init_database()
+        self.pool_size = pool_size
+        self.query_timeout = query_timeout
+        self._write_lock = threading.Lock()
+        self._readers: queue.Queue[sqlite3.Connection] = queue.Queue()
+        self._version_lock = threading.Lock()
+        self._compile_lock = threading.Lock()
+        self._read_only_statements = QueryCache()
+        # 查询计划缓存：schema_version 变化时整体清空
+        self._plans = QueryCache()
+        self._plan_schema_version: int | None = None
+        self._schema: tuple[int, dict[str, list[dict[str, Any]]]] | None = None
+        self.cache = QueryCache()
+        self.advisor = IndexAdvisor()
+        self.metrics = ServerMetrics()
+        # 读连接数 + 一个写线程，保证写请求不会排在慢查询后面
+        self._executor = ThreadPoolExecutor(max_workers=pool_size + 1, thread_name_prefix="sqlite-query")
         self.insights: list[str] = []
+        self._memo_body = io.StringIO()
+        self._memo_cache: tuple[int, str] | None = None
+        self._init_database()
+        self._load_insights()
+
+    def _connect(self, read_only: bool = False) -> sqlite3.Connection:
+        """Open a connection with the server-wide pragmas applied"""
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, cached_statements=STATEMENT_CACHE_SIZE)
+        conn.row_factory = sqlite3.Row
+        for pragma, value in SQLITE_PRAGMAS.items():
+            conn.execute(f"PRAGMA {pragma}={value}")
+        if read_only:
+            # 读连接不应持有写事务，误路由的写语句直接报错而不是悄悄占住写锁
+            conn.execute("PRAGMA query_only=ON")
+        return conn
 
     def _init_database(self):
-        """Initialize connection to the SQLite database"""
-        logger.debug("Initializing database connection")
-        with closing(sqlite3.connect(self.db_path)) as conn:
-            conn.row_factory = sqlite3.Row
-            conn.close()
+        """Open the long-lived writer connection and the reader pool"""
+        logger.debug(f"Initializing database connections (pool_size={self.pool_size})")
+        self._writer = self._connect()
+        for _ in range(self.pool_size):
+            self._readers.put(self._connect(read_only=True))
+        # 专用于读取 data_version/schema_version 的连接：其他任何连接（包括本进程写连接）提交后版本号都会变化
+        self._version_conn = self._connect(read_only=True)
+        # 专用于 EXPLAIN 的连接（语句分类与查询计划）：关闭语句缓存，保证每次都按当前 schema 重新编译并触发授权回调
+        self._compile_conn = sqlite3.connect(self.db_path, check_same_thread=False, cached_statements=0)
+        self._compile_conn.execute("PRAGMA query_only=ON")
+        self._writer.execute(
+            f"CREATE TABLE IF NOT EXISTS {INSIGHTS_TABLE} ("
+            "id INTEGER PRIMARY KEY, insight TEXT NOT NULL, created_at TEXT DEFAULT CURRENT_TIMESTAMP)"
+        )
+        self._writer.commit()
+
+    @contextmanager
+    def _reader(self):
+        """Borrow a reader connection from the pool"""
+        conn = self._readers.get()
+        try:
+            yield conn
+        finally:
+            self._readers.put(conn)
+
+    def close(self):
+        """Close all pooled connections"""
+        logger.debug("Closing database connections")
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        while not self._readers.empty():
+            self._readers.get_nowait().close()
+        with self._write_lock:
+            self._writer.close()
+        with self._version_lock:
+            self._version_conn.close()
+        with self._compile_lock:
+            self._compile_conn.close()
+
+    def _data_version(self) -> tuple[int, int]:
+        """Current (data_version, schema_version) as seen by the version connection"""
+        with self._version_lock:
+            data_version = self._version_conn.execute("PRAGMA data_version").fetchone()[0]
+            schema_version = self._version_conn.execute("PRAGMA schema_version").fetchone()[0]
+        return data_version, schema_version
+
+    def get_schema(self) -> dict[str, list[dict[str, Any]]]:
+        """Table name -> column info, loaded once and refreshed only when the schema changes"""
+        schema_version = self._data_version()[1]
+        if self._schema is not None and self._schema[0] == schema_version:
+            return self._schema[1]
+
+        logger.debug(f"Loading schema metadata at schema_version {schema_version}")
+        with self._version_lock:
+            names = [
+                row[0]
+                for row in self._version_conn.execute("SELECT name FROM sqlite_master WHERE type='table' AND name != ?", (INSIGHTS_TABLE,))
+            ]
+            tables = {
+                name: [
+                    dict(row)
+                    for row in self._version_conn.execute(
+                        "SELECT * FROM pragma_table_info(?)", (name,)
+                    )
+                ]
+                for name in names
+            }
+        self._schema = (schema_version, tables)
+        return tables
+
+    def _is_read_only(self, query: str, params: dict[str, Any] | None, schema_version: int) -> bool:
+        """Whether query only reads the database, with sqlite3_stmt_readonly semantics
+
+        The statement is compiled with EXPLAIN (never executed) under an authorizer;
+        a write transaction, a write opcode or a write action makes it a write.
+        Statements that fail to compile here (syntax errors, several statements,
+        TEMP objects only the writer sees) are treated as writes so the writer
+        reports the real outcome.
+        """
+        cached = self._read_only_statements.get((query,), schema_version)
+        if cached is not None:
+            return cached
+
+        writes = False
+
+        def authorize(action: int, arg1: str | None, arg2: str | None, database: str | None, trigger: str | None) -> int:
+            nonlocal writes
+            if action == sqlite3.SQLITE_PRAGMA:
+                pragma = (arg1 or "").lower()
+                writes |= pragma in WRITE_PRAGMAS or (arg2 is not None and pragma not in READ_PRAGMAS)
+            elif action in WRITE_ACTIONS:
+                writes = True
+            return sqlite3.SQLITE_OK
+
+        with self._compile_lock:
+            # 先执行一条读语句让连接载入最新 schema，否则 REINDEX 等不引用表的语句按旧 schema 编译
+            self._compile_conn.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchall()
+            self._compile_conn.set_authorizer(authorize)
+            try:
+                for _, opcode, _, p2, *_ in self._compile_conn.execute(f"EXPLAIN {query}", params or ()):
+                    if opcode in WRITE_OPCODES or (opcode == "Transaction" and p2 != 0):
+                        writes = True
+            except (sqlite3.Error, ValueError):
+                writes = True
+            finally:
+                self._compile_conn.set_authorizer(None)
+        self._read_only_statements.put((query,), schema_version, not writes)
+        return not writes
+
+    def _load_insights(self):
+        """Restore insights persisted by earlier runs into the memo buffer"""
+        with self._reader() as conn:
+            rows = conn.execute(f"SELECT insight FROM {INSIGHTS_TABLE} ORDER BY id").fetchall()
+        for row in rows:
+            self._append_to_memo(row[0])
+        logger.debug(f"Loaded {len(rows)} persisted insights")
+
+    def _append_to_memo(self, insight: str):
+        """Append one insight to the in-memory memo buffer"""
+        if self.insights:
+            self._memo_body.write("\n")
+        self._memo_body.write(f"- {insight}")
+        self.insights.append(insight)
+
+    @property
+    def memo_version(self) -> int:
+        """Monotonic memo version: the number of insights recorded so far"""
+        return len(self.insights)
+
+    def _add_insight(
+        self, insight: str, timeout: float | None = None, cancel_event: threading.Event | None = None
+    ) -> int:
+        """Persist an insight, append it to the memo and return the new memo version"""
+        with self._write_lock:
+            try:
+                with self._guard(self._writer, timeout, cancel_event):
+                    self._writer.execute(f"INSERT INTO {INSIGHTS_TABLE} (insight) VALUES (?)", (insight,))
+                self._writer.commit()
+            except BaseException:
+                self._writer.rollback()
+                raise
+            self._append_to_memo(insight)
+            return self.memo_version
 
     def _synthesize_memo(self) -> str:
         """Synthesizes business insights into a formatted memo"""
-        logger.debug(f"Synthesizing memo with {len(self.insights)} insights")
+        version = self.memo_version
+        if self._memo_cache is not None and self._memo_cache[0] == version:
+            return self._memo_cache[1]
+
+        logger.debug(f"Synthesizing memo with {version} insights")
         if not self.insights:
             return "No business insights have been discovered yet."
 
-        insights = "\n".join(f"- {insight}" for insight in self.insights)
-
         memo = "📊 Business Intelligence Memo 📊\n\n"
         memo += "Key Insights Discovered:\n\n"
-        memo += insights
+        memo += self._memo_body.getvalue()
 
-        if len(self.insights) > 1:
+        if version > 1:
             memo += "\nSummary:\n"
-            memo += f"Analysis has revealed {len(self.insights)} key business insights that suggest opportunities for strategic optimization and growth."
+            memo += f"Analysis has revealed {version} key business insights that suggest opportunities for strategic optimization and growth."
 
+        self._memo_cache = (version, memo)
         logger.debug("Generated basic memo format")
         return memo
 
-    def _execute_query(self, query: str, params: dict[str, Any] | None = None) -> list[dict[str, Any]]:
-        """Execute a SQL query and return results as a list of dictionaries"""
+    def memo_delta(self, since: int) -> str:
+        """Insights added after memo version since, headed by the current version"""
+        new = self.insights[max(0, since):]
+        lines = [f"version: {self.memo_version}"] + [f"- {insight}" for insight in new]
+        return "\n".join(lines)
+
+    @contextmanager
+    def _guard(self, conn: sqlite3.Connection, timeout: float | None, cancel_event: threading.Event | None):
+        """Interrupt the statement running on conn once the deadline passes or cancel_event is set"""
+        if timeout is None and cancel_event is None:
+            yield
+            return
+
+        deadline = time.monotonic() + timeout if timeout is not None else None
+
+        def should_abort() -> int:
+            if cancel_event is not None and cancel_event.is_set():
+                return 1
+            return int(deadline is not None and time.monotonic() > deadline)
+
+        conn.set_progress_handler(should_abort, PROGRESS_HANDLER_STEPS)
+        try:
+            yield
+        except sqlite3.OperationalError as e:
+            if cancel_event is not None and cancel_event.is_set():
+                raise asyncio.CancelledError("Query cancelled") from e
+            if deadline is not None and time.monotonic() > deadline:
+                raise TimeoutError(f"Query exceeded timeout of {timeout}s") from e
+            raise
+        finally:
+            conn.set_progress_handler(None, 0)
+
+    def _observe_query(self, kind: str, query: str, start: float, rows: int):
+        """Record statement metrics and log slow statements together with their plan"""
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        slow = elapsed_ms >= SLOW_QUERY_MS
+        self.metrics.record_query(kind, elapsed_ms, rows, slow)
+        if slow:
+            try:
+                plan = "; ".join(step["detail"] for step in self._explain(query))
+            except sqlite3.Error:
+                plan = "unavailable"
+            logger.warning(f"Slow {kind} query ({elapsed_ms:.1f} ms, {rows} rows): {query} | plan: {plan}")
+
+    def _execute_query(
+        self,
+        query: str,
+        params: dict[str, Any] | None = None,
+        timeout: float | None = None,
+        cancel_event: threading.Event | None = None,
+        use_cache: bool = False,
+    ) -> list[dict[str, Any]]:
+        """Execute a SQL query and return results as a list of dictionaries
+
+        Read-only statements run on a pooled reader and, with use_cache, are served
+        from the result cache; every other statement runs on the writer and is never cached.
+        """
         logger.debug(f"Executing query: {query}")
         try:
-            with closing(sqlite3.connect(self.db_path)) as conn:
-                conn.row_factory = sqlite3.Row
-                with closing(conn.cursor()) as cursor:
-                    if params:
-                        cursor.execute(query, params)
-                    else:
-                        cursor.execute(query)
-
-                    if query.strip().upper().startswith(('INSERT', 'UPDATE', 'DELETE', 'CREATE', 'DROP', 'ALTER')):
-                        conn.commit()
+            version = self._data_version()
+            if not self._is_read_only(query, params, version[1]):
+                with self._write_lock:
+                    with closing(self._writer.cursor()) as cursor:
+                        start = time.perf_counter()
+                        try:
+                            with self._guard(self._writer, timeout, cancel_event):
+                                cursor.execute(query, params or ())
+                            self._writer.commit()
+                            self.cache.clear()
+                        except BaseException:
+                            self._writer.rollback()
+                            raise
                         affected = cursor.rowcount
+                        self._observe_query("write", query, start, max(affected, 0))
                         logger.debug(f"Write query affected {affected} rows")
                         return [{"affected_rows": affected}]
 
+            key = ("query", _normalize_sql(query), json.dumps(params, sort_keys=True, default=str))
+            if use_cache:
+                results = self.cache.get(key, version)
+                if results is not None:
+                    return results
+
+            with self._reader() as conn:
+                with closing(conn.cursor()) as cursor, self._guard(conn, timeout, cancel_event):
+                    start = time.perf_counter()
+                    cursor.execute(query, params or ())
                     results = [dict(row) for row in cursor.fetchall()]
+                    self._observe_query("read", query, start, len(results))
                     logger.debug(f"Read query returned {len(results)} rows")
-                    return results
+            if use_cache:
+                self.cache.put(key, version, results)
+            return results
         except Exception as e:
             logger.error(f"Database error executing query: {e}")
             raise
 
+    def _bulk_insert(
+        self,
+        table: str,
+        columns: list[str],
+        rows,
+        batch_size: int = DEFAULT_BULK_BATCH_SIZE,
+        timeout: float | None = None,
+        cancel_event: threading.Event | None = None,
+    ) -> dict[str, Any]:
+        """Insert rows into table with executemany in batches inside a single transaction"""
+        known = self.get_schema().get(table)
+        if known is None:
+            raise ValueError(f"Unknown table: {table}")
+        unknown = set(columns) - {col["name"] for col in known}
+        if unknown:
+            raise ValueError(f"Unknown columns for {table}: {sorted(unknown)}")
+
+        sql = "INSERT INTO {} ({}) VALUES ({})".format(
+            _quote_identifier(table),
+            ", ".join(_quote_identifier(col) for col in columns),
+            ", ".join("?" for _ in columns),
+        )
+        logger.debug(f"Bulk inserting into {table} with batch size {batch_size}")
+
+        inserted = 0
+        batches = 0
+        with self._write_lock:
+            with closing(self._writer.cursor()) as cursor:
+                start = time.perf_counter()
+                try:
+                    with self._guard(self._writer, timeout, cancel_event):
+                        for batch in _batched(rows, batch_size):
+                            cursor.executemany(sql, batch)
+                            inserted += len(batch)
+                            batches += 1
+                    self._writer.commit()
+                    self.cache.clear()
+                except BaseException:
+                    self._writer.rollback()
+                    raise
+                self._observe_query("bulk", sql, start, inserted)
+        logger.debug(f"Bulk insert wrote {inserted} rows in {batches} batches")
+        return {"table": table, "inserted_rows": inserted, "batches": batches}
+
+    def _explain(
+        self, query: str, timeout: float | None = None, cancel_event: threading.Event | None = None
+    ) -> list[dict[str, Any]]:
+        """EXPLAIN QUERY PLAN rows for query, cached until the schema changes
+
+        EXPLAIN opens no transaction, so neither a prepared EXPLAIN statement nor the
+        connection's parsed schema notices schema changes by itself. Plans are compiled
+        on the uncached connection after reloading the schema, and the plan cache is
+        cleared whenever schema_version moves, e.g. after an index is created.
+        """
+        schema_version = self._data_version()[1]
+        with self._compile_lock:
+            if self._plan_schema_version != schema_version:
+                self._plans.clear()
+                self._plan_schema_version = schema_version
+            plan = self._plans.get((query,), schema_version)
+            if plan is None:
+                self._compile_conn.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchall()
+                with self._guard(self._compile_conn, timeout, cancel_event):
+                    plan = [
+                        {"id": row[0], "parent": row[1], "detail": row[3]}
+                        for row in self._compile_conn.execute(f"EXPLAIN QUERY PLAN {_statement_body(query)}")
+                    ]
+                self._plans.put((query,), schema_version, plan)
+        return plan
+
+    def _explain_query(
+        self, query: str, timeout: float | None = None, cancel_event: threading.Event | None = None
+    ) -> dict[str, Any]:
+        """Query plan plus full-scan and temp B-tree detection"""
+        plan = self._explain(query, timeout, cancel_event)
+        return {
+            "plan": plan,
+            "full_scans": _full_scans(plan),
+            "uses_temp_btree": any("TEMP B-TREE" in step["detail"] for step in plan),
+        }
+
+    def _time_query(self, conn: sqlite3.Connection, query: str, repeat: int = BENCHMARK_REPEAT) -> float:
+        """Median wall time in milliseconds to step through every row of query"""
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for _ in conn.execute(query):
+                pass
+            timings.append((time.perf_counter() - start) * 1000)
+        return sorted(timings)[len(timings) // 2]
+
+    def _advise_indexes(
+        self, apply: bool = False, timeout: float | None = None, cancel_event: threading.Event | None = None
+    ) -> list[dict[str, Any]]:
+        """Propose indexes for observed full-scanning queries, optionally creating them
+
+        With apply=True each proposed index is created on the writer under the same
+        timeout, cancellation and rollback handling as other writes, and the queries
+        that motivated it are benchmarked before and after. A proposal whose index
+        cannot be created is rolled back and reported with created=False and an error.
+        """
+        schema = self.get_schema()
+        proposals: dict[tuple[str, tuple[str, ...]], dict[str, Any]] = {}
+        for query, count in self.advisor.observed():
+            try:
+                scans = _full_scans(self._explain(query, timeout, cancel_event))
+            except sqlite3.Error:
+                continue
+            for table, columns in IndexAdvisor.index_columns(query, schema, scans).items():
+                name = f"idx_advisor_{table}_{'_'.join(columns)}"
+                proposal = proposals.setdefault(
+                    (table, tuple(columns)),
+                    {
+                        "table": table,
+                        "columns": columns,
+                        "sql": "CREATE INDEX IF NOT EXISTS {} ON {} ({})".format(
+                            _quote_identifier(name),
+                            _quote_identifier(table),
+                            ", ".join(_quote_identifier(col) for col in columns),
+                        ),
+                        "observed_queries": 0,
+                        "queries": [],
+                    },
+                )
+                proposal["observed_queries"] += count
+                proposal["queries"].append(query)
+
+        ranked = sorted(proposals.values(), key=lambda proposal: -proposal["observed_queries"])
+        if not apply:
+            return ranked
+
+        for proposal in ranked:
+            with self._reader() as conn, self._guard(conn, timeout, cancel_event):
+                before = {query: self._time_query(conn, query) for query in proposal["queries"]}
+            with self._write_lock:
+                try:
+                    with self._guard(self._writer, timeout, cancel_event):
+                        self._writer.execute(proposal["sql"])
+                    self._writer.commit()
+                except sqlite3.Error as e:
+                    # 单个索引建不出来不影响其余建议；超时与取消照常向上抛出
+                    self._writer.rollback()
+                    proposal["created"] = False
+                    proposal["error"] = str(e)
+                    logger.warning(f"Advisor index failed: {proposal['sql']}: {e}")
+                    continue
+                except BaseException:
+                    self._writer.rollback()
+                    raise
+            self.cache.clear()
+            with self._reader() as conn, self._guard(conn, timeout, cancel_event):
+                after = {query: self._time_query(conn, query) for query in proposal["queries"]}
+            proposal["created"] = True
+            proposal["benchmark_ms"] = [
+                {"query": query, "before": round(before[query], 3), "after": round(after[query], 3)}
+                for query in proposal["queries"]
+            ]
+            logger.info(f"Created advisor index: {proposal['sql']}")
+        return ranked
+
+    def _fetch_page(
+        self,
+        query: str,
+        params: dict[str, Any] | None = None,
+        offset: int = 0,
+        max_rows: int = DEFAULT_PAGE_ROWS,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        timeout: float | None = None,
+        cancel_event: threading.Event | None = None,
+        use_cache: bool = False,
+    ) -> dict[str, Any]:
+        """Fetch one bounded page of a SELECT query
+
+        The query is wrapped in LIMIT/OFFSET so SQLite stops producing rows once
+        the page is full, and rows are pulled with fetchmany until either the row
+        or the serialized byte budget runs out. With use_cache the page is served
+        from the result cache while the database is unchanged.
+        """
+        logger.debug(f"Fetching page at offset {offset} for query: {query}")
+        key = (
+            "page", _normalize_sql(query), json.dumps(params, sort_keys=True, default=str), offset, max_rows, max_bytes
+        )
+        if use_cache:
+            version = self._data_version()
+            page = self.cache.get(key, version)
+            if page is not None:
+                return page
+
+        # 子查询单独成行，即使残留注释也不会吞掉右括号
+        body = _statement_body(query)
+        paged = f"SELECT * FROM (\n{body}\n) LIMIT ? OFFSET ?"
+        bind: dict[str, Any] | tuple = (max_rows + 1, offset)
+        if params:
+            paged = f"SELECT * FROM (\n{body}\n) LIMIT :_page_limit OFFSET :_page_offset"
+            bind = {**params, "_page_limit": max_rows + 1, "_page_offset": offset}
+
+        rows: list[list[Any]] = []
+        size = 0
+        truncated_by = None
+        with self._reader() as conn:
+            with closing(conn.cursor()) as cursor, self._guard(conn, timeout, cancel_event):
+                start = time.perf_counter()
+                cursor.execute(paged, bind)
+                columns = [col[0] for col in cursor.description]
+                while truncated_by is None:
+                    batch = cursor.fetchmany(min(max_rows + 1, 256))
+                    if not batch:
+                        break
+                    for row in batch:
+                        if len(rows) == max_rows:
+                            truncated_by = "rows"
+                            break
+                        encoded = _encode_row(tuple(row))
+                        if rows and size + len(encoded) > max_bytes:
+                            truncated_by = "bytes"
+                            break
+                        rows.append(list(row))
+                        size += len(encoded)
+                self._observe_query("page", query, start, len(rows))
+
+        next_offset = offset + len(rows)
+        logger.debug(f"Page returned {len(rows)} rows ({size} bytes), truncated_by={truncated_by}")
+        page = {
+            "columns": columns,
+            "rows": rows,
+            "row_count": len(rows),
+            "offset": offset,
+            "truncated": truncated_by is not None,
+            "truncated_by": truncated_by,
+            "next_page_token": _make_page_token(query, next_offset) if truncated_by else None,
+        }
+        if use_cache:
+            self.cache.put(key, version, page)
+        return page
+
+    async def _submit(self, fn, *args, timeout: float | None = None, default_timeout: bool = True, **kwargs):
+        """Run fn on the query thread pool without blocking the event loop
+
+        Without an explicit timeout the server-wide query_timeout applies unless
+        default_timeout is False. Cancelling the awaiting task interrupts the
+        statement inside SQLite.
+        """
+        if timeout is None and default_timeout:
+            timeout = self.query_timeout
+        cancel_event = threading.Event()
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(
+            self._executor,
+            partial(
+                fn,
+                *args,
+                timeout=timeout,
+                cancel_event=cancel_event,
+                **kwargs,
+            ),
+        )
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            cancel_event.set()
+            # 被中断的语句仍会在工作线程里结束，取走其异常以免事件循环告警
+            future.add_done_callback(lambda f: f.cancelled() or f.exception())
+            raise
+
+    async def run_query(
+        self, query: str, params: dict[str, Any] | None = None, timeout: float | None = None
+    ) -> list[dict[str, Any]]:
+        """Asynchronous wrapper around _execute_query, caching read-only results"""
+        return await self._submit(self._execute_query, query, params, timeout=timeout, use_cache=True)
+
+    async def add_insight(self, insight: str) -> int:
+        """Asynchronous wrapper around _add_insight"""
+        return await self._submit(self._add_insight, insight)
+
+    async def explain_query(self, query: str, timeout: float | None = None) -> dict[str, Any]:
+        """Asynchronous wrapper around _explain_query"""
+        return await self._submit(self._explain_query, query, timeout=timeout)
+
+    async def advise_indexes(self, apply: bool = False, timeout: float | None = None) -> list[dict[str, Any]]:
+        """Asynchronous wrapper around _advise_indexes"""
+        return await self._submit(self._advise_indexes, apply, timeout=timeout)
+
+    async def bulk_insert(
+        self,
+        table: str,
+        columns: list[str] | None = None,
+        rows: list[list[Any]] | None = None,
+        data: dict[str, list[Any]] | None = None,
+        file_path: str | None = None,
+        batch_size: int = DEFAULT_BULK_BATCH_SIZE,
+        timeout: float | None = None,
+    ) -> dict[str, Any]:
+        """Bulk insert from a row-array payload, a columnar payload or a local CSV/Parquet file
+
+        Loads are bounded only by an explicit timeout: the server-wide query_timeout is
+        sized for interactive queries and would abort large imports part way through.
+        """
+        batch_size = max(1, int(batch_size))
+        if file_path:
+            columns, rows = _read_table_file(file_path, columns, batch_size)
+        elif data is not None:
+            columns = list(data)
+            lengths = {len(values) for values in data.values()}
+            if len(lengths) > 1:
+                raise ValueError("All columns in data must have the same length")
+            rows = zip(*data.values())
+        elif rows is None or not columns:
+            raise ValueError("Provide columns and rows, data, or file_path")
+        return await self._submit(
+            self._bulk_insert, table, list(columns), rows, batch_size, timeout=timeout, default_timeout=False
+        )
+
+    async def run_paged_query(
+        self,
+        query: str,
+        page_token: str | None = None,
+        max_rows: int = DEFAULT_PAGE_ROWS,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        timeout: float | None = None,
+    ) -> dict[str, Any]:
+        """Asynchronous wrapper around _fetch_page that resumes from page_token"""
+        offset = _parse_page_token(query, page_token) if page_token else 0
+        max_rows = max(1, min(int(max_rows), MAX_PAGE_ROWS))
+
+        if offset == 0:
+            self.advisor.observe(query)
+
+        return await self._submit(
+            self._fetch_page, query, None, offset, max_rows, int(max_bytes), timeout=timeout, use_cache=True
+        )
+
+    async def schema(self) -> dict[str, list[dict[str, Any]]]:
+        """Asynchronous wrapper around get_schema"""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self.get_schema)
+
+
+def _batched(rows, size: int):
+    """Yield lists of at most size rows from any iterable"""
+    batch = []
+    for row in rows:
+        batch.append(tuple(row))
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _read_table_file(file_path: str, columns: list[str] | None, batch_size: int):
+    """Return (columns, row iterator) for a local CSV or Parquet file
+
+    CSV files must have a header row. Rows are streamed so the file is never fully
+    materialized; the row iterator owns the open file and closes it when exhausted.
+    """
+    path = Path(file_path).expanduser()
+    if not path.is_file():
+        raise ValueError(f"File not found: {file_path}")
+
+    if path.suffix.lower() == ".parquet":
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ValueError("Parquet import requires pyarrow to be installed")
+        parquet = pq.ParquetFile(path)
+        names = columns or parquet.schema_arrow.names
+
+        def parquet_rows():
+            for record_batch in parquet.iter_batches(batch_size=batch_size, columns=names):
+                yield from zip(*(column.to_pylist() for column in record_batch.columns))
+
+        return names, parquet_rows()
+
+    handle = open(path, newline="", encoding="utf-8")
+    reader = csv.reader(handle)
+    header = next(reader, None)
+    if header is None:
+        handle.close()
+        raise ValueError(f"CSV file is empty: {file_path}")
+    if columns:
+        missing = set(columns) - set(header)
+        if missing:
+            handle.close()
+            raise ValueError(f"Columns not in CSV header: {sorted(missing)}")
+        indexes = [header.index(col) for col in columns]
+    else:
+        columns, indexes = header, list(range(len(header)))
+
+    def csv_rows():
+        with handle:
+            for record in reader:
+                yield [record[i] if record[i] != "" else None for i in indexes]
+
+    return columns, csv_rows()
+
+
+def _json_default(value: Any) -> Any:
+    """JSON fallback for SQLite values json cannot encode (BLOBs)"""
+    if isinstance(value, bytes):
+        return value.hex()
+    return str(value)
+
+
+def _encode_row(row: tuple) -> str:
+    """Compact JSON encoding of one result row"""
+    return json.dumps(row, ensure_ascii=False, separators=(",", ":"), default=_json_default)
+
+
+def _make_page_token(query: str, offset: int) -> str:
+    """Opaque continuation token bound to the query text"""
+    digest = hashlib.sha1(query.encode()).hexdigest()[:16]
+    raw = json.dumps({"q": digest, "o": offset}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def _parse_page_token(query: str, page_token: str) -> int:
+    """Return the offset encoded in page_token after checking it belongs to query"""
+    try:
+        data = json.loads(base64.urlsafe_b64decode(page_token.encode()))
+        digest, offset = data["q"], int(data["o"])
+    except Exception:
+        raise ValueError("Invalid page_token")
+    if digest != hashlib.sha1(query.encode()).hexdigest()[:16]:
+        raise ValueError("page_token does not belong to this query")
+    return offset
+
+
+def format_page(page: dict[str, Any], fmt: str = "json") -> list[types.TextContent]:
+    """Serialize a page from run_paged_query as compact JSON or CSV plus metadata"""
+    if fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(page["columns"])
+        writer.writerows(
+            [value.hex() if isinstance(value, bytes) else value for value in row] for row in page["rows"]
+        )
+        meta = {key: value for key, value in page.items() if key not in ("columns", "rows")}
+        return [
+            types.TextContent(type="text", text=buffer.getvalue()),
+            types.TextContent(type="text", text=json.dumps(meta, separators=(",", ":"))),
+        ]
+    if fmt != "json":
+        raise ValueError(f"Unsupported format: {fmt}")
+    return [
+        types.TextContent(
+            type="text",
+            text=json.dumps(page, ensure_ascii=False, separators=(",", ":"), default=_json_default),
+        )
+    ]
+
+
 async def main(db_path: str):
     logger.info(f"Starting SQLite MCP Server with DB path: {db_path}")
 
@@ -170,22 +1215,54 @@ async def main(db_path: str):
                 name="Business Insights Memo",
                 description="A living document of discovered business insights",
                 mimeType="text/plain",
-            )
+            ),
+            types.Resource(
+                uri=AnyUrl("memo://insights/delta?since=0"),
+                name="Business Insights Delta",
+                description="Insights added after memo version `since`; re-fetch with the version it reports",
+                mimeType="text/plain",
+            ),
+            types.Resource(
+                uri=AnyUrl("metrics://sqlite"),
+                name="SQLite Server Metrics",
+                description="Per-tool and per-query latency histograms, row/byte counters and cache hit ratio",
+                mimeType="application/json",
+            ),
+            types.Resource(
+                uri=AnyUrl("metrics://sqlite/prometheus"),
+                name="SQLite Server Metrics (Prometheus)",
+                description="The same metrics in Prometheus text exposition format",
+                mimeType="text/plain",
+            ),
         ]
 
     @server.read_resource()
     async def handle_read_resource(uri: AnyUrl) -> str:
         logger.debug(f"Handling read_resource request for URI: {uri}")
+        parts = urlsplit(str(uri))
+        path = parts.netloc + parts.path
+        if uri.scheme == "metrics":
+            if path == "sqlite":
+                return json.dumps(db.metrics.to_dict(db.cache), separators=(",", ":"))
+            if path == "sqlite/prometheus":
+                return db.metrics.to_prometheus(db.cache)
+            logger.error(f"Unknown resource path: {path}")
+            raise ValueError(f"Unknown resource path: {path}")
+
         if uri.scheme != "memo":
             logger.error(f"Unsupported URI scheme: {uri.scheme}")
             raise ValueError(f"Unsupported URI scheme: {uri.scheme}")
 
-        path = str(uri).replace("memo://", "")
-        if not path or path != "insights":
-            logger.error(f"Unknown resource path: {path}")
-            raise ValueError(f"Unknown resource path: {path}")
+        if path == "insights":
+            return db._synthesize_memo()
+        if path == "insights/delta":
+            since = parse_qs(parts.query).get("since", ["0"])[0]
+            if not since.isdigit():
+                raise ValueError(f"Invalid since parameter: {since}")
+            return db.memo_delta(int(since))
 
-        return db._synthesize_memo()
+        logger.error(f"Unknown resource path: {path}")
+        raise ValueError(f"Unknown resource path: {path}")
 
     @server.list_prompts()
     async def handle_list_prompts() -> list[types.Prompt]:
@@ -235,11 +1312,16 @@ async def main(db_path: str):
         return [
             types.Tool(
                 name="read-query",
-                description="Execute a SELECT query on the SQLite database",
+                description="Execute a SELECT query on the SQLite database. Results are paginated; pass next_page_token back as page_token to continue",
                 inputSchema={
                     "type": "object",
                     "properties": {
                         "query": {"type": "string", "description": "SELECT SQL query to execute"},
+                        "page_token": {"type": "string", "description": "Continuation token from a previous truncated page"},
+                        "max_rows": {"type": "integer", "description": f"Maximum rows per page (default {DEFAULT_PAGE_ROWS}, max {MAX_PAGE_ROWS})"},
+                        "max_bytes": {"type": "integer", "description": f"Maximum serialized bytes per page (default {DEFAULT_MAX_BYTES})"},
+                        "format": {"type": "string", "enum": ["json", "csv"], "description": "Result serialization (default json)"},
+                        "timeout": {"type": "number", "description": "Optional timeout in seconds for this query"},
                     },
                     "required": ["query"],
                 },
@@ -285,6 +1367,44 @@ async def main(db_path: str):
                     "required": ["table_name"],
                 },
             ),
+            types.Tool(
+                name="bulk-insert",
+                description="Insert many rows into an existing table in a single transaction. Provide columns + rows, a columnar data object, or a local CSV/Parquet file_path",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "table": {"type": "string", "description": "Name of the target table"},
+                        "columns": {"type": "array", "items": {"type": "string"}, "description": "Column names for rows (or a column subset to import from file_path)"},
+                        "rows": {"type": "array", "items": {"type": "array"}, "description": "Row-array payload, one array per row in columns order"},
+                        "data": {"type": "object", "description": "Columnar payload mapping column name to a list of values"},
+                        "file_path": {"type": "string", "description": "Local .csv (with header) or .parquet file to import"},
+                        "batch_size": {"type": "integer", "description": f"Rows per executemany batch (default {DEFAULT_BULK_BATCH_SIZE})"},
+                        "timeout": {"type": "number", "description": "Optional timeout in seconds for the whole load (default none)"},
+                    },
+                    "required": ["table"],
+                },
+            ),
+            types.Tool(
+                name="explain-query",
+                description="Show the SQLite query plan for a SELECT query and flag full table scans",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "query": {"type": "string", "description": "SELECT SQL query to explain"},
+                    },
+                    "required": ["query"],
+                },
+            ),
+            types.Tool(
+                name="index-advisor",
+                description="Propose indexes for full-scanning read queries observed in this session; with apply=true create them and report before/after timings",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "apply": {"type": "boolean", "description": "Create the proposed indexes and benchmark them (default false)"},
+                    },
+                },
+            ),
             types.Tool(
                 name="append-insight",
                 description="Add a business insight to the memo",
@@ -298,78 +1418,120 @@ async def main(db_path: str):
             ),
         ]
 
-    @server.call_tool()
-    async def handle_call_tool(
+    async def dispatch_tool(
         name: str, arguments: dict[str, Any] | None
     ) -> list[types.TextContent | types.ImageContent | types.EmbeddedResource]:
-        """Handle tool execution requests"""
-        try:
-            if name == "list-tables":
-                results = db._execute_query(
-                    "SELECT name FROM sqlite_master WHERE type='table'"
-                )
-                return [types.TextContent(type="text", text=str(results))]
+        """Run a tool and return its content; errors propagate to handle_call_tool"""
+        if name == "list-tables":
+            results = [{"name": table} for table in await db.schema()]
+            return [types.TextContent(type="text", text=str(results))]
 
-            elif name == "describe-table":
-                if not arguments or "table_name" not in arguments:
-                    raise ValueError("Missing table_name argument")
-                results = db._execute_query(
-                    f"PRAGMA table_info({arguments['table_name']})"
-                )
-                return [types.TextContent(type="text", text=str(results))]
+        elif name == "describe-table":
+            if not arguments or "table_name" not in arguments:
+                raise ValueError("Missing table_name argument")
+            results = (await db.schema()).get(arguments["table_name"], [])
+            return [types.TextContent(type="text", text=str(results))]
+
+        elif name == "index-advisor":
+            proposals = await db.advise_indexes(apply=bool((arguments or {}).get("apply", False)))
+            return [types.TextContent(type="text", text=json.dumps(proposals, ensure_ascii=False, separators=(",", ":")))]
+
+        elif name == "append-insight":
+            if not arguments or "insight" not in arguments:
+                raise ValueError("Missing insight argument")
+
+            version = await db.add_insight(arguments["insight"])
 
-            elif name == "append-insight":
-                if not arguments or "insight" not in arguments:
-                    raise ValueError("Missing insight argument")
+            # Notify clients that the memo resource has changed, plus the delta holding just this insight
+            session = server.request_context.session
+            await session.send_resource_updated(AnyUrl("memo://insights"))
+            await session.send_resource_updated(AnyUrl(f"memo://insights/delta?since={version - 1}"))
 
-                db.insights.append(arguments["insight"])
-                _ = db._synthesize_memo()
+            return [types.TextContent(type="text", text=f"Insight added to memo (version {version})")]
 
-                # Notify clients that the memo resource has changed
-                await server.request_context.session.send_resource_updated(AnyUrl("memo://insights"))
+        if not arguments:
+            raise ValueError("Missing arguments")
 
-                return [types.TextContent(type="text", text="Insight added to memo")]
+        if name == "read-query":
+            if not arguments["query"].strip().upper().startswith("SELECT"):
+                raise ValueError("Only SELECT queries are allowed for read-query")
+            page = await db.run_paged_query(
+                arguments["query"],
+                page_token=arguments.get("page_token"),
+                max_rows=arguments.get("max_rows", DEFAULT_PAGE_ROWS),
+                max_bytes=arguments.get("max_bytes", DEFAULT_MAX_BYTES),
+                timeout=arguments.get("timeout"),
+            )
+            return format_page(page, arguments.get("format", "json"))
 
-            if not arguments:
-                raise ValueError("Missing arguments")
+        elif name == "write-query":
+            if arguments["query"].strip().upper().startswith("SELECT"):
+                raise ValueError("SELECT queries are not allowed for write-query")
+            results = await db.run_query(arguments["query"])
+            return [types.TextContent(type="text", text=str(results))]
 
-            if name == "read-query":
-                if not arguments["query"].strip().upper().startswith("SELECT"):
-                    raise ValueError("Only SELECT queries are allowed for read-query")
-                results = db._execute_query(arguments["query"])
-                return [types.TextContent(type="text", text=str(results))]
+        elif name == "create-table":
+            if not arguments["query"].strip().upper().startswith("CREATE TABLE"):
+                raise ValueError("Only CREATE TABLE statements are allowed")
+            await db.run_query(arguments["query"])
+            return [types.TextContent(type="text", text="Table created successfully")]
 
-            elif name == "write-query":
-                if arguments["query"].strip().upper().startswith("SELECT"):
-                    raise ValueError("SELECT queries are not allowed for write-query")
-                results = db._execute_query(arguments["query"])
-                return [types.TextContent(type="text", text=str(results))]
+        elif name == "explain-query":
+            if not arguments["query"].strip().upper().startswith("SELECT"):
+                raise ValueError("Only SELECT queries can be explained")
+            plan = await db.explain_query(arguments["query"])
+            return [types.TextContent(type="text", text=json.dumps(plan, ensure_ascii=False, separators=(",", ":")))]
 
-            elif name == "create-table":
-                if not arguments["query"].strip().upper().startswith("CREATE TABLE"):
-                    raise ValueError("Only CREATE TABLE statements are allowed")
-                db._execute_query(arguments["query"])
-                return [types.TextContent(type="text", text="Table created successfully")]
+        elif name == "bulk-insert":
+            if "table" not in arguments:
+                raise ValueError("Missing table argument")
+            results = await db.bulk_insert(
+                arguments["table"],
+                columns=arguments.get("columns"),
+                rows=arguments.get("rows"),
+                data=arguments.get("data"),
+                file_path=arguments.get("file_path"),
+                batch_size=arguments.get("batch_size", DEFAULT_BULK_BATCH_SIZE),
+                timeout=arguments.get("timeout"),
+            )
+            return [types.TextContent(type="text", text=str(results))]
 
-            else:
-                raise ValueError(f"Unknown tool: {name}")
+        else:
+            raise ValueError(f"Unknown tool: {name}")
 
+    @server.call_tool()
+    async def handle_call_tool(
+        name: str, arguments: dict[str, Any] | None
+    ) -> list[types.TextContent | types.ImageContent | types.EmbeddedResource]:
+        """Handle tool execution requests"""
+        start = time.perf_counter()
+        error = True
+        try:
+            content = await dispatch_tool(name, arguments)
+            error = False
         except sqlite3.Error as e:
-            return [types.TextContent(type="text", text=f"Database error: {str(e)}")]
+            content = [types.TextContent(type="text", text=f"Database error: {str(e)}")]
         except Exception as e:
-            return [types.TextContent(type="text", text=f"Error: {str(e)}")]
-
-    async with mcp.server.stdio.stdio_server() as (read_stream, write_stream):
-        logger.info("Server running with stdio transport")
-        await server.run(
-            read_stream,
-            write_stream,
-            InitializationOptions(
-                server_name="sqlite",
-                server_version="0.1.0",
-                capabilities=server.get_capabilities(
-                    notification_options=NotificationOptions(),
-                    experimental_capabilities={},
+            content = [types.TextContent(type="text", text=f"Error: {str(e)}")]
+
+        size = sum(len(item.text.encode()) for item in content if isinstance(item, types.TextContent))
+        db.metrics.record_tool(name, (time.perf_counter() - start) * 1000, size, error)
+        return content
+
+    try:
+        async with mcp.server.stdio.stdio_server() as (read_stream, write_stream):
+            logger.info("Server running with stdio transport")
+            await server.run(
+                read_stream,
+                write_stream,
+                InitializationOptions(
+                    server_name="sqlite",
+                    server_version="0.1.0",
+                    capabilities=server.get_capabilities(
+                        notification_options=NotificationOptions(),
+                        experimental_capabilities={},
+                    ),
                 ),
-            ),
-        )
+            )
+    finally:
+        db.close()
@@ -0,0 +1,67 @@
+import asyncio
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+# 各目录下的模块使用平铺的同级导入，测试时把这些目录加入搜索路径
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for directory in ("agent", "kg_risk_control", "mcp"):
+    path = os.path.join(ROOT, directory)
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+
+class FakeClient:
+    """按预设脚本回放流式响应的LLMClient替身，每次astream取出一条回复"""
+
+    def __init__(self):
+        self.replies = []
+        self.requests = []
+        self.options = []
+
+    def reply_text(self, *pieces):
+        """追加一条分块到达的文本回复"""
+        self.replies.append([self._chunk(content=piece) for piece in pieces] + [self._chunk(finish_reason="stop")])
+
+    def reply_tool_calls(self, *calls, content=None):
+        """追加一条工具调用回复，calls为(调用id, 函数名, 参数JSON)"""
+        chunks = [self._chunk(content=content)] if content else []
+        chunks += [self._chunk(tool_calls=[SimpleNamespace(
+            index=i, id=call_id, function=SimpleNamespace(name=name, arguments=arguments))])
+            for i, (call_id, name, arguments) in enumerate(calls)]
+        self.replies.append(chunks + [self._chunk(finish_reason="tool_calls")])
+
+    @staticmethod
+    def _chunk(content=None, tool_calls=None, finish_reason=None):
+        delta = SimpleNamespace(content=content, function_call=None, tool_calls=tool_calls)
+        return SimpleNamespace(choices=[SimpleNamespace(delta=delta, finish_reason=finish_reason)])
+
+    async def astream(self, messages, **kwargs):
+        self.requests.append([dict(message) for message in messages])
+        self.options.append(kwargs)
+        for chunk in self.replies.pop(0):
+            yield chunk
+
+    def run(self, coro):
+        return asyncio.run(coro)
+
+    def iterate(self, agen):
+        loop = asyncio.new_event_loop()
+        try:
+            while True:
+                try:
+                    yield loop.run_until_complete(agen.__anext__())
+                except StopAsyncIteration:
+                    return
+        finally:
+            loop.close()
+
+    def spawn(self, coro):
+        coro.close()
+
+
+@pytest.fixture
+def fake_client():
+    return FakeClient()
@@ -0,0 +1,133 @@
+import random
+
+import pytest
+
+from compact_graph import CompactFinancialKnowledgeGraph
+
+
+def _sample(ids):
+    kg = CompactFinancialKnowledgeGraph()
+    kg.add_entity(ids[0], "account", {"risk": "high", "score": 3})
+    kg.add_entity(ids[1], "account", {"risk": None, "score": 1.5})
+    kg.add_entity(ids[2], "address", {})
+    kg.add_relation(ids[0], ids[1], "transfer", {"amount": 100, "timestamp": 10, "memo": "rent"})
+    kg.add_relation(ids[1], ids[0], "transfer", {"amount": 95.5, "timestamp": 20})
+    kg.add_relation(ids[0], ids[2], "has_address", {})
+    kg.add_relation(ids[1], ids[2], "has_address", {"since": "2024-01-01"})
+    return kg
+
+
+def _snapshot(kg):
+    return (sorted(kg.entities(), key=repr), list(kg.relations()),
+            {entity: kg.get_relations(entity, "both") for entity in kg.node_ids})
+
+
+@pytest.mark.parametrize("ids", [["a", "b", "c"], [101, 7, 3]])
+@pytest.mark.parametrize("mmap", [True, False])
+def test_binary_round_trip(tmp_path, ids, mmap):
+    kg = _sample(ids)
+    expected = _snapshot(kg)
+    kg.save_binary(str(tmp_path))
+    loaded = CompactFinancialKnowledgeGraph.load_binary(str(tmp_path), mmap=mmap)
+    assert loaded.node_ids == ids
+    assert all(type(entity) is type(ids[0]) for entity in loaded.node_ids)
+    assert _snapshot(loaded) == expected
+    assert loaded.find_path(ids[0], ids[2], max_depth=2) == kg.find_path(ids[0], ids[2], max_depth=2)
+
+    # 加载后继续写入不影响文件，再次保存加载结果一致
+    loaded.add_relation(ids[2], ids[0], "transfer", {"amount": 1})
+    expected = _snapshot(loaded)
+    loaded.save_binary(str(tmp_path / "again"))
+    assert _snapshot(CompactFinancialKnowledgeGraph.load_binary(str(tmp_path / "again"), mmap=mmap)) == expected
+
+
+@pytest.mark.parametrize("mmap", [True, False])
+def test_binary_round_trip_keeps_large_ints_with_missing_values(tmp_path, mmap):
+    big = 2 ** 53 + 1
+    kg = CompactFinancialKnowledgeGraph()
+    kg.add_entity("a", "account", {"opened_ns": big})
+    kg.add_entity("b", "account", {})
+    kg.add_relation("a", "b", "transfer", {"timestamp_ns": big, "amount_cents": 1})
+    kg.add_relation("b", "a", "transfer", {"amount_cents": big + 2})
+    kg._build_index()
+    # 已构建的int64列上追加缺失值
+    kg.add_relation("a", "b", "transfer", {"timestamp_ns": big + 4})
+    expected = _snapshot(kg)
+    assert [data.get("timestamp_ns") for _, _, data in kg.relations()] == [big, None, big + 4]
+
+    kg.save_binary(str(tmp_path))
+    loaded = CompactFinancialKnowledgeGraph.load_binary(str(tmp_path), mmap=mmap)
+    assert _snapshot(loaded) == expected
+    assert loaded.get_entity("a")["opened_ns"] == big and "opened_ns" not in loaded.get_entity("b")
+    amounts = [data.get("amount_cents") for _, _, data in loaded.get_relations("a", "both")]
+    assert amounts == [1, None, big + 2]
+    assert all(type(amount) is int for amount in amounts if amount is not None)
+
+
+def test_binary_rejects_mixed_ids(tmp_path):
+    kg = _sample(["a", 2, "c"])
+    with pytest.raises(ValueError):
+        kg.save_binary(str(tmp_path))
+
+
+def _simple_paths(edges, source, target, max_depth):
+    """穷举source到target的简单路径(实体序列)，作为对照"""
+    out = {}
+    for u, v in edges:
+        out.setdefault(u, set()).add(v)
+    paths = []
+
+    def dfs(path):
+        for v in out.get(path[-1], ()):
+            if v == target:
+                paths.append(tuple(path + [v]))
+            elif v not in path and len(path) < max_depth:
+                dfs(path + [v])
+
+    dfs([source])
+    return paths
+
+
+@pytest.mark.parametrize("max_depth", [3, 5, None])
+def test_k_shortest_paths_match_brute_force(max_depth):
+    rng = random.Random(11)
+    for _ in range(20):
+        edges = [tuple(rng.sample(range(10), 2)) for _ in range(rng.randint(15, 35))]
+        kg = CompactFinancialKnowledgeGraph()
+        for i, (u, v) in enumerate(edges):
+            kg.add_relation(f"n{u}", f"n{v}", "transfer", {"seq": i})
+        for source, target in [(0, 1), (2, 7), (5, 3)]:
+            expected = _simple_paths(edges, source, target, max_depth or 9)
+            for k in (1, 4, 50):
+                paths = list(kg.k_shortest_paths(f"n{source}", f"n{target}", k, max_depth))
+                nodes = [tuple(int(hop[0][1:]) for hop in path) + (target,) for path in paths]
+                assert len(nodes) == min(k, len(expected)) == len(set(nodes))
+                assert set(nodes) <= set(expected)
+                assert [len(p) for p in nodes] == sorted(len(p) for p in expected)[:len(nodes)]
+                for path in paths:
+                    # 每一跳取该实体对之间最近添加的边
+                    for u, v, data in path:
+                        assert data["seq"] == max(i for i, edge in enumerate(edges) if edge == (int(u[1:]), int(v[1:])))
+
+
+def test_k_shortest_paths_respect_filters():
+    kg = CompactFinancialKnowledgeGraph()
+    kg.add_entity("m", "merchant")
+    kg.add_relation("a", "b", "transfer", {})
+    kg.add_relation("b", "d", "transfer", {})
+    kg.add_relation("a", "m", "transfer", {})
+    kg.add_relation("m", "d", "transfer", {})
+    kg.add_relation("a", "d", "guarantee", {})
+    paths = list(kg.k_shortest_paths("a", "d", 5, relation_types={"transfer"}, entity_types={"unknown"}))
+    assert [[hop[1] for hop in path] for path in paths] == [["b", "d"]]
+
+
+def test_flush_invalidates_index_for_streamed_edges():
+    kg = CompactFinancialKnowledgeGraph()
+    kg.add_relation("a", "b", "transfer", {"amount": 1})
+    kg.get_relations("a")
+    # 流式写入的边先进增量邻接表；relations()合并pending后索引必须重建，否则这条边查不到
+    kg.add_relation("a", "c", "transfer", {"amount": 2})
+    assert len(list(kg.relations())) == 2
+    assert [(other, data["amount"]) for _, other, data in kg.get_relations("a")] == [("b", 1), ("c", 2)]
+    assert [other for _, other, _ in kg.get_relations("c", "in")] == ["a"]
@@ -0,0 +1,59 @@
+from conversation_memory import ConversationMemory, message_tokens
+
+
+def _tool_call(call_id):
+    return {"id": call_id, "type": "function", "function": {"name": "calculate", "arguments": "{}"}}
+
+
+def _memory(fake_client, **kwargs):
+    options = dict(max_tokens=120, low_watermark=0.5, keep_recent=2, pinned_tool_results=0, summarize=False)
+    options.update(kwargs)
+    return ConversationMemory(fake_client, system_prompt="系统", **options)
+
+
+def _assert_groups_intact(messages):
+    """每条工具结果前面都是同组的带tool_calls的assistant消息或同组的其他工具结果"""
+    for previous, message in zip(messages, messages[1:]):
+        if message["role"] == "tool":
+            assert previous["role"] == "tool" or previous.get("tool_calls")
+    assert messages[0]["role"] != "tool"
+
+
+def test_tool_call_group_evicted_as_a_whole(fake_client):
+    memory = _memory(fake_client)
+    memory.append({"role": "user", "content": "问题" * 10})
+    memory.append({"role": "assistant", "content": None, "tool_calls": [_tool_call("a"), _tool_call("b")]})
+    memory.append({"role": "tool", "tool_call_id": "a", "content": "结果" * 10})
+    memory.append({"role": "tool", "tool_call_id": "b", "content": "结果" * 10})
+    for i in range(6):
+        memory.append({"role": "user" if i % 2 == 0 else "assistant", "content": f"第{i}条" * 6})
+        _assert_groups_intact(memory.messages()[1:])
+    messages = memory.messages()[1:]
+    assert not any(message.get("tool_calls") or message["role"] == "tool" for message in messages)
+    assert memory.total_tokens == sum(message_tokens(message) for message in messages)
+    assert memory.total_tokens <= memory.max_tokens
+
+
+def test_pinned_tool_result_keeps_its_group(fake_client):
+    memory = _memory(fake_client, pinned_tool_results=1)
+    memory.append({"role": "assistant", "content": None, "tool_calls": [_tool_call("a"), _tool_call("b")]})
+    memory.append({"role": "tool", "tool_call_id": "a", "content": "结果" * 10})
+    memory.append({"role": "tool", "tool_call_id": "b", "content": "结果" * 10})
+    for i in range(6):
+        memory.append({"role": "user", "content": f"第{i}条" * 6})
+    messages = memory.messages()[1:]
+    _assert_groups_intact(messages)
+    # 最近的工具结果被固定，与它同组的调用和另一条结果一起保留
+    assert [message.get("tool_call_id") for message in messages[:3]] == [None, "a", "b"]
+    assert messages[0]["tool_calls"]
+
+
+def test_evicted_messages_are_queued_for_summary(fake_client):
+    spawned = []
+    fake_client.spawn = spawned.append
+    memory = _memory(fake_client, summarize=True)
+    for i in range(8):
+        memory.append({"role": "user", "content": f"第{i}条" * 6})
+    assert len(spawned) == 1
+    assert memory._pending and memory._pending[0]["content"] == "第0条" * 6
+    spawned[0].close()
@@ -0,0 +1,51 @@
+import function_call_agent
+
+
+def _agent(monkeypatch, client, **kwargs):
+    monkeypatch.setattr(function_call_agent, "get_client", lambda: client)
+    return function_call_agent.SimpleAgent(**kwargs)
+
+
+def _roles(agent):
+    return [message["role"] for message in agent.conversation_history.messages()[1:]]
+
+
+def test_tool_results_are_fed_back(monkeypatch, fake_client):
+    agent = _agent(monkeypatch, fake_client)
+    fake_client.reply_tool_calls(("call_1", "calculate", '{"expression": "6 * 7"}'))
+    fake_client.reply_text("结果是", "42")
+    assert agent.think("6乘7") == "结果是42"
+    assert fake_client.requests[1][-1] == {"role": "tool", "tool_call_id": "call_1", "content": "计算结果：42"}
+    assert _roles(agent) == ["user", "assistant", "tool", "assistant"]
+
+
+def test_requests_keep_sampling_temperature(monkeypatch, fake_client):
+    agent = _agent(monkeypatch, fake_client, max_steps=1)
+    fake_client.reply_tool_calls(("call_1", "calculate", '{"expression": "1 + 1"}'))
+    fake_client.reply_text("2")
+    agent.think("1加1")
+    assert [options["temperature"] for options in fake_client.options] == [0.7, 0.7]
+    assert [options["tool_choice"] for options in fake_client.options] == ["auto", "none"]
+    # 带工具定义的请求不走响应缓存
+    assert not any(options.get("use_cache") for options in fake_client.options)
+
+
+def test_empty_final_answer_is_not_recorded(monkeypatch, fake_client):
+    agent = _agent(monkeypatch, fake_client)
+    fake_client.reply_text()
+    assert agent.think("你好") == ""
+    assert _roles(agent) == ["user"]
+
+
+def test_step_limit_reports_pending_tool_calls(monkeypatch, fake_client):
+    agent = _agent(monkeypatch, fake_client, max_steps=1)
+    fake_client.reply_tool_calls(("call_1", "calculate", '{"expression": "1 + 1"}'))
+    # 最后一轮禁止调用工具，模型仍返回了工具调用
+    fake_client.reply_tool_calls(("call_2", "get_current_weather", '{"location": "北京"}'), content="还需要查询天气")
+    answer = agent.think("算一下再查天气")
+    assert answer.startswith("还需要查询天气\n")
+    assert "工具调用轮数上限" in answer and "get_current_weather" in answer
+    assert fake_client.requests[1][-1]["content"] == "计算结果：2"
+    # 未执行的工具调用不写入历史，历史中不会出现没有结果的tool_calls
+    assert _roles(agent) == ["user", "assistant", "tool", "assistant"]
+    assert agent.conversation_history.messages()[-1] == {"role": "assistant", "content": answer}
@@ -0,0 +1,74 @@
+import random
+
+from knowledge_graph import FinancialKnowledgeGraph
+
+
+def _random_graph(rng, nodes, edges):
+    kg = FinancialKnowledgeGraph()
+    for _ in range(edges):
+        source, target = rng.sample(range(nodes), 2)
+        kg.add_relation(f"n{source}", f"n{target}", "transfer", {"amount": 1})
+    return kg
+
+
+def _fresh(kg):
+    copy = FinancialKnowledgeGraph()
+    copy.graph = kg.graph.copy()
+    return copy
+
+
+def test_writes_after_query_are_merged_without_rebuild():
+    rng = random.Random(5)
+    kg = _random_graph(rng, 60, 150)
+    kg.find_common_neighbors(["n0", "n1"])
+    matrix = kg._adjacency[0]
+    for _ in range(40):
+        source, target = rng.sample(range(70), 2)
+        kg.add_relation(f"n{source}", f"n{target}", "transfer", {"amount": 2})
+        kg.add_entity(f"n{source}", "account", {"risk": "low"})
+        entities = [f"n{i}" for i in rng.sample(range(70), 2)]
+        entities = [entity for entity in entities if entity in kg.graph]
+        fresh = _fresh(kg)
+        assert kg.find_common_neighbors(entities) == fresh.find_common_neighbors(entities)
+        assert set(kg.get_subgraph(entities, depth=2).graph.nodes) == set(fresh.get_subgraph(entities, depth=2).graph.nodes)
+    # 少量新增边只记在增量里，矩阵未被重建
+    assert kg._adjacency[0] is matrix
+    assert kg._adjacency_delta
+
+
+def test_global_consumers_fold_delta_into_matrix():
+    rng = random.Random(9)
+    kg = _random_graph(rng, 30, 60)
+    kg.get_subgraph(["n0"], depth=1)
+    kg.add_relation("n0", "new", "transfer", {"amount": 1})
+    adjacency, nodes, index = kg._undirected_adjacency()
+    assert not kg._adjacency_delta
+    assert adjacency.shape == (len(nodes), len(nodes))
+    assert adjacency[index["new"], index["n0"]] == 1
+    fresh, _, _ = _fresh(kg)._undirected_adjacency()
+    assert adjacency.nnz == fresh.nnz
+
+
+def test_subgraph_is_writable_without_touching_parent():
+    kg = FinancialKnowledgeGraph()
+    kg.add_relation("a", "b", "transfer", {"amount": 1})
+    kg.add_relation("b", "c", "transfer", {"amount": 2})
+    sub = kg.get_subgraph(["a"], depth=1)
+    assert set(sub.graph.nodes) == {"a", "b"}
+    sub.add_entity("x", "merchant")
+    sub.add_relation("a", "x", "refund", {"amount": 3})
+    assert "merchant" in sub.entity_types and "refund" in sub.relation_types
+    assert sub.find_common_neighbors(["b", "x"]) == {"b": {"a"}, "x": {"a"}}
+    assert sub.get_entities_by_type("merchant") == ["x"]
+    # 原图不受影响
+    assert "x" not in kg.graph and "merchant" not in kg.entity_types and "refund" not in kg.relation_types
+
+
+def test_invalidate_after_direct_graph_mutation():
+    kg = FinancialKnowledgeGraph()
+    kg.add_relation("a", "b", "transfer", {})
+    assert kg.find_common_neighbors(["a"]) == {"a": {"b"}}
+    kg.graph.add_edge("a", "c", relation_type="transfer")
+    kg.invalidate()
+    assert kg.find_common_neighbors(["a"]) == {"a": {"b", "c"}}
+    assert set(kg.get_subgraph(["a"]).graph.nodes) == {"a", "b", "c"}
@@ -0,0 +1,10 @@
+import pytest
+
+import llm_client
+from llm_client import LLMClient
+
+
+def test_missing_api_key_raises(monkeypatch):
+    monkeypatch.setattr(llm_client, "DEFAULT_API_KEY", None)
+    with pytest.raises(ValueError, match="LLM_API_KEY"):
+        LLMClient(base_url="http://127.0.0.1:9/v1")
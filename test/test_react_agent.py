@@ -0,0 +1,38 @@
+import json
+
+import pytest
+
+import react_agent
+from react_agent import JsonFieldStream
+
+REPLY = {"thought": "分析\"问题\"", "action": "查询", "observation": "无", "response": "答案：\\n第一行\n😀 \"完\" é"}
+
+
+@pytest.mark.parametrize("ensure_ascii", [True, False])
+@pytest.mark.parametrize("size", [1, 3, 1000])
+def test_field_stream_decodes_split_chunks(ensure_ascii, size):
+    text = json.dumps(REPLY, ensure_ascii=ensure_ascii)
+    stream = JsonFieldStream("response")
+    pieces = [stream.feed(text[i:i + size]) for i in range(0, len(text), size)]
+    assert stream.started
+    assert "".join(pieces) == REPLY["response"]
+
+
+def test_field_stream_ignores_text_without_field():
+    stream = JsonFieldStream("response")
+    assert stream.feed("普通回答，其中提到 response 一词") == ""
+    assert not stream.started
+
+
+def test_stream_prints_answer_only(monkeypatch, fake_client):
+    monkeypatch.setattr(react_agent, "get_client", lambda: fake_client)
+    agent = react_agent.SimpleAgent()
+    text = json.dumps(REPLY, ensure_ascii=False)
+    fake_client.reply_text(*[text[i:i + 7] for i in range(0, len(text), 7)])
+    assert "".join(agent.think_stream("你好")) == REPLY["response"]
+    # 对话历史中仍记录完整的思考过程
+    history = agent.conversation_history.messages()[-1]["content"]
+    assert history.startswith("思考过程：") and history.endswith(REPLY["response"])
+
+    fake_client.reply_text("不是", "JSON")
+    assert list(agent.think_stream("再来")) == ["不是JSON"]
@@ -0,0 +1,97 @@
+import pytest
+
+from response_cache import ResponseCache
+
+SYSTEM = {"role": "system", "content": "你是一个专业的 SQL 转换助手。"}
+QUESTION = "查询 orders 表中状态为已发货的订单"
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.db"))
+    cache.put([SYSTEM, {"role": "user", "content": QUESTION}], "m", 0, "SELECT * FROM orders WHERE status = '已发货'")
+    yield cache
+    cache.close()
+
+
+def test_exact_hit_ignores_whitespace(cache):
+    assert cache.get([SYSTEM, {"role": "user", "content": f"  {QUESTION} "}], "m", 0) is not None
+    assert cache.stats()["exact_hits"] == 1
+
+
+@pytest.mark.parametrize("question", [
+    "查询 orders 表中状态为已取消的订单",
+    "查询 users 表中状态为已发货的订单",
+    "删除 orders 表中状态为已发货的订单",
+    "查询 orders 表中状态为已发货的订单数量",
+])
+def test_semantic_tier_rejects_different_questions(cache, question):
+    assert cache.get([SYSTEM, {"role": "user", "content": question}], "m", 0, semantic=True) is None
+    assert cache.stats()["semantic_hits"] == 0
+
+
+def test_semantic_tier_matches_punctuation_variant(cache):
+    messages = [SYSTEM, {"role": "user", "content": QUESTION + "。"}]
+    assert cache.get(messages, "m", 0) is None
+    assert cache.get(messages, "m", 0, semantic=True) is not None
+
+
+def test_semantic_tier_requires_same_context(cache):
+    variant = {"role": "user", "content": QUESTION + "。"}
+    history = [{"role": "user", "content": "你好"}, {"role": "assistant", "content": "你好！"}]
+    assert cache.get([SYSTEM] + history + [variant], "m", 0, semantic=True) is None
+    assert cache.get([{"role": "system", "content": "另一个助手"}, variant], "m", 0, semantic=True) is None
+    assert cache.get([SYSTEM, variant], "other-model", 0, semantic=True) is None
+    assert cache.get([SYSTEM, variant], "m", 0.7, semantic=True) is None
+
+
+def test_semantic_tier_is_opt_in(cache):
+    assert cache.get([SYSTEM, {"role": "user", "content": QUESTION + "。"}], "m", 0) is None
+
+
+def test_lru_eviction_and_ttl(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.db"), max_entries=2)
+    for i in range(3):
+        cache.put([{"role": "user", "content": f"问题{i}"}], "m", 0, f"回答{i}")
+    assert cache.get([{"role": "user", "content": "问题0"}], "m", 0) is None
+    assert cache.get([{"role": "user", "content": "问题2"}], "m", 0) == "回答2"
+    cache.ttl = -1
+    assert cache.get([{"role": "user", "content": "问题2"}], "m", 0) is None
+    cache.close()
+
+
+def test_persists_across_instances(tmp_path):
+    path = str(tmp_path / "cache.db")
+    first = ResponseCache(path)
+    first.put([{"role": "user", "content": "问题"}], "m", 0, "回答")
+    first.close()
+    second = ResponseCache(path)
+    assert second.get([{"role": "user", "content": "问题"}], "m", 0) == "回答"
+    second.close()
+
+
+def test_client_serves_cache_keyed_on_temperature(tmp_path):
+    from openai import APIConnectionError
+    from llm_client import LLMClient
+
+    cache = ResponseCache(str(tmp_path / "cache.db"))
+    messages = [{"role": "user", "content": "问题"}]
+    cache.put(messages, "m", 0, "回答")
+    # 不可达的接入点：命中缓存时不会发起请求
+    client = LLMClient(api_key="test", base_url="http://127.0.0.1:9/v1", model="m", cache=cache, max_retries=0)
+    try:
+        assert client.chat(messages, temperature=0, use_cache=True).choices[0].message.content == "回答"
+        assert "".join(chunk.choices[0].delta.content for chunk in
+                       client.stream(messages, temperature=0, use_cache=True)) == "回答"
+        # 不同温度的缓存项互不命中，未开启use_cache时不读缓存
+        with pytest.raises(APIConnectionError):
+            client.chat(messages, temperature=0.7, use_cache=True)
+        cache.put(messages, "m", 0.7, "采样回答")
+        assert client.chat(messages, temperature=0.7, use_cache=True).choices[0].message.content == "采样回答"
+        with pytest.raises(APIConnectionError):
+            client.chat(messages, temperature=0)
+        with pytest.raises(APIConnectionError):
+            client.chat(messages, temperature=0, tools=[{"type": "function", "function": {"name": "f"}}],
+                        use_cache=True)
+    finally:
+        client.close()
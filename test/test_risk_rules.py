@@ -0,0 +1,111 @@
+import itertools
+import random
+
+import pytest
+
+from benchmark import build_graph, generate_synthetic_graph
+from compact_graph import CompactFinancialKnowledgeGraph
+from knowledge_graph import FinancialKnowledgeGraph
+from risk_rules import CircularTransactionRule, find_anchored_cycles, find_closing_cycles
+
+BACKENDS = ["networkx", "compact"]
+WINDOW = 86400
+
+
+def _brute_force_cycles(edges, anchor, max_length, min_length, time_window=None, amount_tolerance=None):
+    """穷举经过anchor的简单环路，作为对照"""
+    out = {}
+    for source, target, data in edges:
+        out.setdefault(source, []).append((target, data))
+    found = set()
+
+    def dfs(path, hops):
+        for target, data in out.get(path[-1], []):
+            chain = hops + [data]
+            if time_window is not None:
+                times = [hop["timestamp"] for hop in chain]
+                if times != sorted(times) or times[-1] - times[0] > time_window:
+                    continue
+            if amount_tolerance is not None and any(
+                    abs(b["amount"] - a["amount"]) > amount_tolerance * abs(a["amount"]) for a, b in zip(chain, chain[1:])):
+                continue
+            if target == anchor:
+                if len(chain) >= min_length:
+                    found.add(tuple(path))
+            elif target not in path and len(chain) < max_length:
+                dfs(path + [target], chain)
+
+    dfs([anchor], [])
+    return found
+
+
+def _graph(backend, edges):
+    kg = FinancialKnowledgeGraph() if backend == "networkx" else CompactFinancialKnowledgeGraph()
+    for source, target, data in edges:
+        kg.add_relation(source, target, "transfer", dict(data))
+    return kg
+
+
+def _random_edges(rng, nodes, count):
+    pairs = rng.sample(list(itertools.permutations(range(nodes), 2)), count)
+    return [(f"a{u}", f"a{v}", {"timestamp": rng.randint(0, 100), "amount": rng.choice([100, 98, 95, 90, 50])})
+            for u, v in pairs]
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+@pytest.mark.parametrize("time_window, amount_tolerance, max_length, min_length", [
+    (None, None, 6, 3),
+    (40, None, 5, 2),
+    (None, 0.06, 6, 3),
+    (50, 0.1, 4, 3),
+])
+def test_anchored_cycles_match_brute_force(backend, time_window, amount_tolerance, max_length, min_length):
+    rng = random.Random(7)
+    for _ in range(15):
+        edges = _random_edges(rng, 9, rng.randint(12, 36))
+        kg = _graph(backend, edges)
+        for anchor in {source for source, _, _ in edges}:
+            cycles, truncated = find_anchored_cycles(kg, anchor, max_length=max_length, min_length=min_length,
+                                                     time_window=time_window, amount_tolerance=amount_tolerance,
+                                                     max_cycles=10 ** 6)
+            assert not truncated
+            assert {tuple(cycle) for cycle in cycles} == _brute_force_cycles(
+                edges, anchor, max_length, min_length, time_window, amount_tolerance)
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_planted_cycles_recalled(backend):
+    data = generate_synthetic_graph(20000, seed=3)
+    kg = build_graph(data, backend)
+    rule = CircularTransactionRule(time_window=WINDOW, amount_tolerance=0.1, time_budget=None)
+    for members in data["truth"]["cycles"][:50]:
+        result = rule.evaluate({"knowledge_graph": kg, "account_id": members[0]})
+        assert result["triggered"]
+        assert list(members) in result["details"]["cycles"]
+
+
+def test_closing_cycle_found_on_last_edge():
+    kg = CompactFinancialKnowledgeGraph()
+    kg.add_relation("a", "b", "transfer", {"timestamp": 10, "amount": 100})
+    kg.add_relation("b", "c", "transfer", {"timestamp": 20, "amount": 99})
+    # 窗口之外的旧边不应参与
+    kg.add_relation("b", "c", "transfer", {"timestamp": -500, "amount": 99})
+    closing = {"relation_type": "transfer", "timestamp": 30, "amount": 98}
+    kg.add_relation("c", "a", "transfer", closing)
+    cycles, truncated = find_closing_cycles(kg, "c", "a", closing, min_length=3, time_window=60,
+                                            amount_tolerance=0.05)
+    assert cycles == [["a", "b", "c"]]
+    assert not truncated
+
+
+def test_rule_reports_truncation_instead_of_absence():
+    kg = FinancialKnowledgeGraph()
+    for i in range(6):
+        for j in range(6):
+            if i != j:
+                kg.add_relation(f"a{i}", f"a{j}", "transfer", {})
+    rule = CircularTransactionRule(max_length=6, time_budget=0)
+    result = rule.evaluate({"knowledge_graph": kg, "account_id": "a0"})
+    assert not result["triggered"]
+    assert result["truncated"]
+    assert result["details"] != "未检测到环形交易"
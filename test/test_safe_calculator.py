@@ -0,0 +1,151 @@
+import math
+
+import numpy as np
+import pytest
+
+import safe_calculator
+from safe_calculator import CalculationError, SafeCalculator, compile_expression
+
+
+@pytest.fixture
+def calculator():
+    return SafeCalculator()
+
+
+def test_arithmetic_functions_and_variables(calculator):
+    assert calculator.evaluate("(1 + 2) * 3 - 4 / 2") == 7.0
+    assert calculator.evaluate("7 // 2 + 7 % 2 + 2 ** 10") == 1028
+    assert calculator.evaluate("sqrt(x) + max(1, y, 3)", x=16, y=5) == 9.0
+    assert calculator.evaluate("round(pi, 2) + floor(e)") == pytest.approx(5.14)
+
+
+@pytest.mark.parametrize("expression", [
+    "__import__('os')",
+    "(1).__class__",
+    "x[0]",
+    "[1, 2]",
+    "open('f')",
+    "abs(x=1)",
+    "lambda: 1",
+    "'a' * 3",
+    "_pow(2, 3)",
+    "1 if 1 else 2",
+    "1 < 2",
+])
+def test_rejects_unsupported_syntax(calculator, expression):
+    with pytest.raises(CalculationError):
+        calculator.evaluate(expression, x=1)
+
+
+def test_max_length():
+    calculator = SafeCalculator(max_length=10)
+    assert calculator.evaluate("1+2+3+4+5") == 15
+    with pytest.raises(CalculationError, match="过长"):
+        calculator.evaluate("1+2+3+4+5+6")
+
+
+@pytest.mark.parametrize("expression", ["9 ** 9 ** 9", "10 ** 200", "2.0 ** 400", "(-3) ** 500"])
+def test_pow_checks_size_before_computing(calculator, expression):
+    with pytest.raises(CalculationError, match="乘方结果过大"):
+        calculator.evaluate(expression)
+
+
+def test_pow_allows_trivial_bases(calculator):
+    assert calculator.evaluate("1 ** 100000000") == 1
+    assert calculator.evaluate("(-1) ** 100000001") == -1
+    assert calculator.evaluate("0 ** 100000000") == 0
+    assert calculator.evaluate("2 ** -1000") == pytest.approx(0.0)
+
+
+def test_max_magnitude(calculator):
+    # 乘方的位数估算偏保守，略超上限的结果由结果检查拒绝
+    with pytest.raises(CalculationError, match="溢出"):
+        calculator.evaluate("10 ** 101")
+    calculator = SafeCalculator(max_magnitude=1e6)
+    assert calculator.evaluate("999 * 1000") == 999000
+    with pytest.raises(CalculationError, match="溢出"):
+        calculator.evaluate("1001 * 1000")
+    with pytest.raises(CalculationError, match="溢出"):
+        calculator.evaluate_batch("x * 1000", x=[1, 2000])
+
+
+def test_cpu_time_limit(monkeypatch):
+    clock = iter(range(1000))
+    # 每读一次CPU时间前进1秒，乘方和函数调用前都会检查
+    monkeypatch.setattr(safe_calculator.time, "thread_time", lambda: next(clock))
+    calculator = SafeCalculator(cpu_time_limit=2.5)
+    assert calculator.evaluate("abs(-1) + abs(2)") == 3
+    with pytest.raises(CalculationError, match="计算超时"):
+        calculator.evaluate("abs(-1) + abs(2) + abs(3)")
+    with pytest.raises(CalculationError, match="计算超时"):
+        calculator.evaluate_batch("x ** 2 + x ** 3 + x ** 4", x=[1, 2])
+    # 每次计算重新计时
+    assert calculator.evaluate("2 ** 3") == 8
+
+
+def test_errors_are_calculation_errors(calculator):
+    with pytest.raises(CalculationError, match="除数不能为零"):
+        calculator.evaluate("1 / 0")
+    with pytest.raises(CalculationError, match="未知的变量"):
+        calculator.evaluate("x + 1")
+    with pytest.raises(CalculationError, match="计算错误"):
+        calculator.evaluate("sqrt(-1)")
+    with pytest.raises(CalculationError, match="计算结果溢出"):
+        calculator.evaluate("exp(1000)")
+    with pytest.raises(CalculationError, match="不是数字"):
+        calculator.evaluate("x", x="1")
+    with pytest.raises(CalculationError, match="不合法的变量名"):
+        calculator.evaluate("1", _pow=1)
+    assert issubclass(CalculationError, ValueError)
+
+
+def test_evaluate_batch(calculator):
+    result = calculator.evaluate_batch("price * (1 + rate) ** years", price=[100, 200], rate=0.1, years=[1, 2])
+    assert isinstance(result, np.ndarray) and result.dtype == np.float64
+    np.testing.assert_allclose(result, [110.0, 242.0])
+    np.testing.assert_allclose(calculator.evaluate_batch("max(x, 0) + abs(y)", x=[-1, 2], y=[-3, 4]), [3, 6])
+    with pytest.raises(CalculationError, match="长度不一致"):
+        calculator.evaluate_batch("x + y", x=[1, 2], y=[1, 2, 3])
+    with pytest.raises(CalculationError, match="不是数字"):
+        calculator.evaluate_batch("sqrt(x)", x=[1, -1])
+    with pytest.raises(CalculationError, match="数字或数字数组"):
+        calculator.evaluate_batch("x", x=["a"])
+
+
+def test_evaluate_batch_integer_powers(calculator):
+    # 整数常量的乘方按float64计算，不会按int64溢出或因负指数报错
+    np.testing.assert_allclose(calculator.evaluate_batch("2 ** 100 * x", x=[1.0]), [2.0 ** 100])
+    np.testing.assert_allclose(calculator.evaluate_batch("x + 2 ** 64", x=[1.0]), [2.0 ** 64 + 1])
+    np.testing.assert_allclose(calculator.evaluate_batch("2 ** -1 + x", x=[1, 2]), [1.5, 2.5])
+
+
+def test_round_digits_are_limited(calculator):
+    assert calculator.evaluate("round(1234, -2)") == 1200
+    np.testing.assert_allclose(calculator.evaluate_batch("round(x, 10 ** 0)", x=[1.26]), [1.3])
+    for expression in ("round(1, -10 ** 7)", "round(1.5, 10 ** 7)"):
+        with pytest.raises(CalculationError, match="小数位数超出范围"):
+            calculator.evaluate(expression)
+    with pytest.raises(CalculationError, match="小数位数必须是整数"):
+        calculator.evaluate("round(1.5, 0.5)")
+    with pytest.raises(CalculationError, match="小数位数必须是整数"):
+        calculator.evaluate_batch("round(x, x)", x=[1, 2])
+
+
+def test_deep_nesting_is_calculation_error(calculator):
+    with pytest.raises(CalculationError, match="嵌套过深"):
+        calculator.evaluate("-" * 490 + "1")
+
+
+def test_max_elements():
+    calculator = SafeCalculator(max_elements=100)
+    assert calculator.evaluate_batch("x * y", x=np.ones(10), y=np.ones((10, 1))).shape == (10, 10)
+    with pytest.raises(CalculationError, match="元素过多"):
+        calculator.evaluate_batch("x * y", x=np.ones(11), y=np.ones((10, 1)))
+
+
+def test_compiled_expressions_are_cached(calculator):
+    compile_expression.cache_clear()
+    for x in range(5):
+        assert calculator.evaluate("x * 2", x=x) == x * 2
+    assert compile_expression.cache_info().hits == 4
+    assert math.isclose(calculator.evaluate("log(e)"), 1.0)
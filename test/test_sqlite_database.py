@@ -0,0 +1,210 @@
+import asyncio
+import threading
+
+import pytest
+
+from SqliteDatabase import SqliteDatabase
+
+
+@pytest.fixture
+def db(tmp_path):
+    database = SqliteDatabase(str(tmp_path / "test.db"), pool_size=2)
+    database._execute_query("CREATE TABLE t (a INTEGER, b TEXT)")
+    database._execute_query("CREATE INDEX idx_t_a ON t (a)")
+    database._execute_query("INSERT INTO t VALUES (1, 'x'), (2, 'y')")
+    yield database
+    database.close()
+
+
+def _read_only(db, query, params=None):
+    return db._is_read_only(query, params, db._data_version()[1])
+
+
+@pytest.mark.parametrize("query", [
+    "SELECT * FROM t",
+    "  select a from t where a = 1 -- trailing comment",
+    "WITH x AS (SELECT a FROM t) SELECT * FROM x",
+    "PRAGMA user_version",
+    "PRAGMA table_info(t)",
+])
+def test_read_only_statements_classified_as_reads(db, query):
+    assert _read_only(db, query)
+
+
+def test_parameterized_read_is_read_only(db):
+    assert _read_only(db, "SELECT * FROM t WHERE a = :a", {"a": 1})
+
+
+@pytest.mark.parametrize("query", [
+    "WITH x AS (SELECT 3 AS a) INSERT INTO t (a) SELECT a FROM x",
+    "PRAGMA user_version = 7",
+    "PRAGMA cache_size = 100",
+    "VACUUM",
+    "REINDEX",
+    "ANALYZE",
+    "BEGIN",
+    "not even sql",
+])
+def test_statements_that_are_not_read_only(db, query):
+    assert not _read_only(db, query)
+
+
+def test_writes_behind_a_cte_or_pragma_reach_the_writer(db):
+    count = "SELECT COUNT(*) AS n FROM t"
+    assert asyncio.run(db.run_query(count)) == [{"n": 2}]
+    asyncio.run(db.run_query("WITH x AS (SELECT 3 AS a) INSERT INTO t (a) SELECT a FROM x"))
+    assert asyncio.run(db.run_query(count)) == [{"n": 3}]
+
+    asyncio.run(db.run_query("PRAGMA user_version = 7"))
+    assert asyncio.run(db.run_query("PRAGMA user_version")) == [{"user_version": 7}]
+    asyncio.run(db.run_query("VACUUM"))
+    asyncio.run(db.run_query("REINDEX"))
+
+
+def test_write_statements_are_never_cached(db):
+    insert = "INSERT INTO t (a) VALUES (9)"
+    asyncio.run(db.run_query(insert))
+    asyncio.run(db.run_query(insert))
+    assert asyncio.run(db.run_query("SELECT COUNT(*) AS n FROM t WHERE a = 9")) == [{"n": 2}]
+
+
+def test_read_cache_invalidated_by_writes(db):
+    query = "SELECT b FROM t WHERE a = 1"
+    assert asyncio.run(db.run_query(query)) == [{"b": "x"}]
+    hits = db.cache.hits
+    assert asyncio.run(db.run_query(query)) == [{"b": "x"}]
+    assert db.cache.hits == hits + 1
+    asyncio.run(db.run_query("UPDATE t SET b = 'z' WHERE a = 1"))
+    assert asyncio.run(db.run_query(query)) == [{"b": "z"}]
+
+
+def test_bulk_insert_ignores_default_query_timeout(tmp_path):
+    db = SqliteDatabase(str(tmp_path / "bulk.db"), pool_size=1, query_timeout=1e-6)
+    try:
+        db._execute_query("CREATE TABLE t (a INTEGER, b TEXT)")
+        rows = [[i, f"row {i}"] for i in range(50000)]
+        result = asyncio.run(db.bulk_insert("t", ["a", "b"], rows, batch_size=500))
+        assert result["inserted_rows"] == 50000
+        with pytest.raises(TimeoutError):
+            asyncio.run(db.bulk_insert("t", ["a", "b"], rows, batch_size=500, timeout=1e-6))
+        assert db._execute_query("SELECT COUNT(*) AS n FROM t") == [{"n": 50000}]
+    finally:
+        db.close()
+
+
+@pytest.mark.parametrize("query", [
+    "SELECT a FROM t ORDER BY a -- newest first",
+    "SELECT a FROM t ORDER BY a;",
+    "SELECT a FROM t ORDER BY a; -- done",
+    "SELECT a FROM t ORDER BY a /* trailing */ ;\n",
+    "SELECT a FROM t WHERE b != '--' ORDER BY a",
+])
+def test_paged_query_tolerates_trailing_comments_and_semicolons(db, query):
+    page = asyncio.run(db.run_paged_query(query))
+    assert page["rows"] == [[1], [2]]
+    assert not page["truncated"]
+
+
+def test_paged_query_resumes_from_token(db):
+    asyncio.run(db.bulk_insert("t", ["a"], [[i] for i in range(3, 11)]))
+    query = "SELECT a FROM t ORDER BY a -- all rows"
+    seen, token = [], None
+    while True:
+        page = asyncio.run(db.run_paged_query(query, page_token=token, max_rows=3))
+        seen += [row[0] for row in page["rows"]]
+        token = page["next_page_token"]
+        if token is None:
+            break
+    assert seen == list(range(1, 11))
+
+
+def test_cache_key_does_not_merge_comment_with_following_line(db):
+    filtered = "SELECT a FROM t -- only the first row\nWHERE a = 1"
+    unfiltered = "SELECT a FROM t -- only the first row WHERE a = 1"
+    assert asyncio.run(db.run_query(filtered)) == [{"a": 1}]
+    assert asyncio.run(db.run_query(unfiltered)) == [{"a": 1}, {"a": 2}]
+    assert asyncio.run(db.run_paged_query(filtered))["rows"] == [[1]]
+    assert asyncio.run(db.run_paged_query(unfiltered))["rows"] == [[1], [2]]
+
+
+def test_cache_key_ignores_formatting_but_not_literals(db):
+    assert asyncio.run(db.run_query("SELECT a FROM t WHERE b = 'x'")) == [{"a": 1}]
+    hits = db.cache.hits
+    assert asyncio.run(db.run_query("SELECT a  FROM t\n  WHERE b = 'x';  /* again */")) == [{"a": 1}]
+    assert db.cache.hits == hits + 1
+    assert asyncio.run(db.run_query("SELECT a FROM t WHERE b = 'x  '")) == []
+
+
+
+def test_schema_and_versions_are_read_off_the_event_loop(db, monkeypatch):
+    threads = []
+    for name in ("_data_version", "get_schema"):
+        original = getattr(db, name)
+
+        def wrapper(*args, _original=original, **kwargs):
+            threads.append(threading.current_thread().name)
+            return _original(*args, **kwargs)
+
+        monkeypatch.setattr(db, name, wrapper)
+
+    async def session():
+        assert "t" in await db.schema()
+        await db.run_paged_query("SELECT a FROM t")
+        await db.run_paged_query("SELECT a FROM t")
+        await db.run_query("SELECT a FROM t")
+
+    asyncio.run(session())
+    assert threads and all(name.startswith("sqlite-query") for name in threads)
+
+
+def test_plan_cache_invalidated_when_advisor_creates_index(db):
+    asyncio.run(db.run_query('CREATE TABLE "order" (id INTEGER PRIMARY KEY, customer INTEGER, total REAL)'))
+    asyncio.run(db.bulk_insert("order", ["customer", "total"], [[i % 50, i * 1.5] for i in range(2000)]))
+    query = 'SELECT total FROM "order" WHERE customer = 7'
+    assert asyncio.run(db.explain_query(query))["full_scans"] == ["order"]
+
+    asyncio.run(db.run_paged_query(query))
+    proposals = asyncio.run(db.advise_indexes(apply=True))
+    assert [proposal["table"] for proposal in proposals] == ["order"]
+    assert proposals[0]["created"]
+    assert 'ON "order"' in proposals[0]["sql"]
+
+    plan = asyncio.run(db.explain_query(query))
+    assert plan["full_scans"] == []
+    assert any("idx_advisor_order" in step["detail"] for step in plan["plan"])
+
+
+def _propose(monkeypatch, proposals):
+    monkeypatch.setattr("SqliteDatabase.IndexAdvisor.index_columns", staticmethod(lambda query, schema, tables: proposals))
+
+
+def test_failed_advisor_index_is_rolled_back(db, monkeypatch):
+    asyncio.run(db.run_paged_query("SELECT * FROM t WHERE b = 'x'"))
+    _propose(monkeypatch, {"missing": ["a"]})
+    proposals = asyncio.run(db.advise_indexes(apply=True))
+    assert proposals[0]["created"] is False
+    assert "missing" in proposals[0]["error"]
+    assert not db._writer.in_transaction
+    # 写连接仍然可用
+    assert asyncio.run(db.run_query("INSERT INTO t VALUES (3, 'z')")) == [{"affected_rows": 1}]
+
+
+def test_cancelled_advisor_index_build_is_rolled_back(db, monkeypatch):
+    db._execute_query("CREATE TABLE big (k INTEGER, v TEXT)")
+    db._bulk_insert("big", ["k", "v"], [[i, str(i)] for i in range(20000)])
+    query = "SELECT v FROM big WHERE k = 7"
+    db._execute_query(query)
+    db.advisor.observe(query)
+    _propose(monkeypatch, {"big": ["k", "v"]})
+    cancel = threading.Event()
+
+    def time_query(conn, query):
+        # 基准测完后取消，使取消发生在建索引的过程中
+        cancel.set()
+        return 0.0
+
+    monkeypatch.setattr(db, "_time_query", time_query)
+    with pytest.raises(asyncio.CancelledError):
+        db._advise_indexes(apply=True, cancel_event=cancel)
+    assert not db._writer.in_transaction
+    assert db._execute_query("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'big'") == []